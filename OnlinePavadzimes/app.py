@@ -1,22 +1,25 @@
 import streamlit as st
 import datetime
 import pandas as pd
-import json
 import os
 import io
-import requests
-import base64
+import uuid
 
 # --- Google Bibliotēkas ---
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
+
+from drive_client import get_drive_client
 
 from utils import scrape_lursoft, money_to_words_lv
-from pdf_generator import generate_pdf
-from docx_generator import generate_docx
+from render_cache import cached_render, cached_render_bundle
+from render_pool import render_bundle, PoolSaturated
+from render import bundle_zip, MIME_TYPES
+from invoice_model import InvoiceLayout
+from history_store import get_history_store, entry_items, history_month
+from history_shards import get_history_shards
+from invoice_numbers import get_invoice_numbers, parse_doc_id, format_doc_id
+from github_sync import (get_github_sync, fetch_file, forget_etag, history_path,
+                         FETCH_OK, FETCH_NOT_MODIFIED, FETCH_MISSING)
 
 # --- Konfigurācija ---
 st.set_page_config(page_title="SIA BRATUS Invoice Generator", layout="wide")
@@ -33,21 +36,13 @@ LOCAL_TEST_HIST_PATH  = os.path.join(BASE_DIR, "test_invoice_history.csv")
 # GitHub ceļi (repozitorijā)
 GITHUB_REPO            = "Andzhss/OnlinePavadzimes"
 GITHUB_PRESETS_PATH    = "OnlinePavadzimes/presets.csv"
-GITHUB_HISTORY_PATH    = "OnlinePavadzimes/invoice_history.csv"
-GITHUB_TEST_HIST_PATH  = "OnlinePavadzimes/test_invoice_history.csv"
+GITHUB_HISTORY_PATH    = history_path("OnlinePavadzimes/invoice_history.csv")
+GITHUB_TEST_HIST_PATH  = history_path("OnlinePavadzimes/test_invoice_history.csv")
 
 # Google Drive
 GOOGLE_DRIVE_FOLDER_ID = "1vqhkHGH9WAMaFnXtduyyjYdEzHMx0iX9"
 SCOPES = ['https://www.googleapis.com/auth/drive.file']
 
-# CSV kolonnas vēsturei — JAUNAIS FORMĀTS
-HISTORY_COLS = [
-    'kartas_nr', 'datums', 'pr_partneris', 'pr_pvn_nr',
-    'pr_datums', 'pr_numurs', 'darijuma_apraksts',
-    'vertiba_bez_pvn', 'dabas_resursi', 'atlaides', 'pvn_summa', 'kopeja_summa',
-    'due_date', 'client_reg_no', 'client_address', 'doc_type', 'items_json', 'comments', 'created_at'
-]
-
 # ---------------------------------------------------------------------------
 # GitHub palīgfunkcijas
 # ---------------------------------------------------------------------------
@@ -56,82 +51,52 @@ def get_github_token():
     token = st.secrets.get("GITHUB_TOKEN", "")
     return token.strip().strip('"').strip("'") if token else ""
 
-def fetch_csv_from_github(github_path):
-    token = get_github_token()
-    url = f"https://api.github.com/repos/{GITHUB_REPO}/contents/{github_path}"
-    headers = {"Accept": "application/vnd.github.v3+json"}
-    if token:
-        headers["Authorization"] = f"Bearer {token}"
-    try:
-        r = requests.get(url, headers=headers, timeout=10)
-        if r.status_code == 200:
-            content_b64 = r.json().get("content", "")
-            if content_b64:
-                return base64.b64decode(content_b64).decode("utf-8")
-    except Exception:
-        pass
-    return None
-
-def push_csv_to_github(df, github_path, commit_message="Update CSV via App"):
+def fetch_csv_from_github(github_path, local_path=None):
+    """
+    Nolasa CSV no GitHub. Atgriež (statuss, teksts): ja lokālā kopija
+    `local_path` jau atbilst GitHub versijai, statuss ir FETCH_NOT_MODIFIED.
+    """
+    return fetch_file(GITHUB_REPO, github_path, get_github_token(), local_path=local_path)
+
+def push_csv_to_github(content, github_path, commit_message="Update CSV via App", merge=None):
+    """
+    Ieplāno CSV nosūtīšanu uz GitHub. Fona pavediens (github_sync) apvieno
+    ātri secīgas izmaiņas vienā commit; `content` var būt DataFrame, teksts
+    vai funkcija, kas atgriež tekstu nosūtīšanas brīdī. Ja fails GitHub
+    pa to laiku mainīts, `merge(bāze, mūsu, attālā)` apvieno abas versijas.
+    """
     token = get_github_token()
     if not token:
         return False, "Nav GitHub Token"
-    try:
-        url = f"https://api.github.com/repos/{GITHUB_REPO}/contents/{github_path}"
-        headers = {
-            "Authorization": f"token {token}",
-            "Accept": "application/vnd.github.v3+json"
-        }
-        r = requests.get(url, headers=headers, timeout=10)
-        sha = r.json().get("sha", "") if r.status_code == 200 else ""
-        csv_content = df.to_csv(index=False)
-        encoded = base64.b64encode(csv_content.encode("utf-8")).decode("utf-8")
-        data = {"message": commit_message, "content": encoded, "branch": "main"}
-        if sha:
-            data["sha"] = sha
-        put_r = requests.put(url, headers=headers, json=data, timeout=15)
-        if put_r.status_code in [200, 201]:
-            return True, "Veiksmīgi saglabāts GitHub!"
-        else:
-            return False, f"GitHub kļūda ({put_r.status_code})"
-    except Exception as e:
-        return False, str(e)
+    if isinstance(content, pd.DataFrame):
+        content = content.to_csv(index=False)
+    sync = get_github_sync(GITHUB_REPO, token)
+    # Iepriekšējās nosūtīšanas kļūda tiek parādīta, bet izmaiņas paliek rindā
+    error = sync.last_error
+    sync.schedule(github_path, content, commit_message, merge)
+    if error:
+        return False, f"{error} (tiks mēģināts atkārtoti)"
+    return True, "Ieplānota saglabāšana GitHub"
 
 # ---------------------------------------------------------------------------
 # Google Drive funkcijas
 # ---------------------------------------------------------------------------
 
 def get_drive_service():
-    creds = None
-    if os.path.exists(TOKEN_FILE):
-        try:
-            creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-        except Exception:
-            os.remove(TOKEN_FILE)
-            creds = None
-    if creds and creds.expired and creds.refresh_token:
-        try:
-            creds.refresh(Request())
-            with open(TOKEN_FILE, 'w') as f:
-                f.write(creds.to_json())
-        except Exception:
-            if os.path.exists(TOKEN_FILE):
-                os.remove(TOKEN_FILE)
-            creds = None
-    if creds and creds.valid:
-        return build('drive', 'v3', credentials=creds)
-    return None
+    return get_drive_client(TOKEN_FILE, SCOPES).get_service()
 
 def upload_to_drive(file_buffer, filename, mime_type):
     try:
-        service = get_drive_service()
-        if not service:
-            return False
-        file_metadata = {'name': filename, 'parents': [GOOGLE_DRIVE_FOLDER_ID]}
-        file_buffer.seek(0)
-        media = MediaIoBaseUpload(file_buffer, mimetype=mime_type, resumable=True)
-        service.files().create(body=file_metadata, media_body=media, fields='id').execute()
-        file_buffer.seek(0)
+        get_drive_client(TOKEN_FILE, SCOPES).upload(file_buffer, filename, mime_type, GOOGLE_DRIVE_FOLDER_ID)
+        return True
+    except Exception as e:
+        st.error(f"❌ Kļūda Google Drive: {e}")
+        return False
+
+def upload_bundle_to_drive(files):
+    """Augšupielādē visus rēķina failus [(buferis, nosaukums, mime), ...] vienā reizē."""
+    try:
+        get_drive_client(TOKEN_FILE, SCOPES).upload_many(files, GOOGLE_DRIVE_FOLDER_ID)
         return True
     except Exception as e:
         st.error(f"❌ Kļūda Google Drive: {e}")
@@ -141,175 +106,122 @@ def upload_to_drive(file_buffer, filename, mime_type):
 # Vēstures funkcijas (CSV bāzētas)
 # ---------------------------------------------------------------------------
 
-def _fmt(val):
-    try:
-        return f"{float(val):,.2f}".replace(",", "X").replace(".", ",").replace("X", " ")
-    except Exception:
-        return str(val)
-
-def _migrate_old_history(df):
-    records = []
-    for i, (_, row) in enumerate(df.iterrows(), 1):
-        items_str = row.get('items', '[]')
-        try:
-            items_list = json.loads(items_str) if pd.notna(items_str) and items_str else []
-        except Exception:
-            items_list = []
-        base = sum(
-            float(it.get('raw_qty', 0) or 0) * float(it.get('raw_price', 0) or 0)
-            for it in items_list
-        )
-        try:
-            total_val = float(str(row.get('total', '0')).replace('\u00a0', '').replace(' ', '').replace(',', '.'))
-        except Exception:
-            total_val = 0.0
-        vat = round(total_val - base, 2)
-        descriptions = [it.get('name', '') for it in items_list if it.get('name')]
-        rec = {
-            'kartas_nr':         i,
-            'datums':            row.get('date', ''),
-            'pr_partneris':      row.get('client_name', ''),
-            'pr_pvn_nr':         row.get('client_vat_no', row.get('client_reg_no', '')),
-            'pr_datums':         row.get('date', ''),
-            'pr_numurs':         row.get('doc_id', ''),
-            'darijuma_apraksts': '; '.join(descriptions),
-            'vertiba_bez_pvn':   _fmt(base),
-            'dabas_resursi':     '',
-            'atlaides':          _fmt(0),
-            'pvn_summa':         _fmt(vat),
-            'kopeja_summa':      row.get('total', ''),
-            'due_date':          row.get('due_date', ''),
-            'client_reg_no':     row.get('client_reg_no', ''),
-            'client_address':    row.get('client_address', ''),
-            'doc_type':          row.get('doc_type', ''),
-            'items_json':        items_str if pd.notna(items_str) else '[]',
-            'comments':          row.get('comments', ''),
-            'created_at':        row.get('created_at', ''),
-            'items':             items_list,
-            'doc_id':            row.get('doc_id', ''),
-            'client_name':       row.get('client_name', ''),
-            'client_vat_no':     row.get('client_vat_no', ''),
-            'date':              row.get('date', ''),
-            'total':             row.get('total', ''),
-        }
-        records.append(rec)
-    return records
-
 def load_history(local_path):
-    if not os.path.exists(local_path):
-        return []
-    try:
-        df = pd.read_csv(local_path, dtype=str)
-        if df.empty:
-            return []
-        if 'doc_id' in df.columns and 'kartas_nr' not in df.columns:
-            return _migrate_old_history(df)
-        records = []
-        for _, row in df.iterrows():
-            rec = row.to_dict()
-            items_str = rec.get('items_json', '[]')
-            try:
-                rec['items'] = json.loads(items_str) if pd.notna(items_str) and items_str else []
-            except Exception:
-                rec['items'] = []
-            rec['doc_id']        = rec.get('pr_numurs', '')
-            rec['client_name']   = rec.get('pr_partneris', '')
-            rec['client_vat_no'] = rec.get('pr_pvn_nr', '')
-            rec['date']          = rec.get('datums', '')
-            rec['total']         = rec.get('kopeja_summa', '')
-            records.append(rec)
-        return records
-    except Exception:
-        return []
+    # Kešots procesa līmenī; tiek pārlasīts tikai tad, kad mainās vēstures faili
+    return get_history_store(local_path).load()
 
-def _history_to_df(history):
-    rows = []
-    for entry in history:
-        row = {col: entry.get(col, '') for col in HISTORY_COLS}
-        items_val = entry.get('items_json', entry.get('items', []))
-        if isinstance(items_val, list):
-            row['items_json'] = json.dumps(items_val, ensure_ascii=False)
-        else:
-            row['items_json'] = items_val if items_val else '[]'
-        rows.append(row)
-    return pd.DataFrame(rows, columns=HISTORY_COLS) if rows else pd.DataFrame(columns=HISTORY_COLS)
+def push_history_to_github(local_path, github_path, months, commit_message):
+    """Nosūta uz GitHub tikai norādīto mēnešu vēstures daļas un manifestu (sk. history_shards)."""
+    result = (True, "Veiksmīgi saglabāts GitHub!")
+    for path, content, merge in get_history_shards(local_path, github_path).update(months):
+        result = push_csv_to_github(content, path, commit_message, merge)
+    return result
 
 def save_to_history(invoice_data, local_path, github_path):
-    history = load_history(local_path)
-    items        = invoice_data.get('items', [])
-    raw_total    = float(invoice_data.get('raw_total', 0) or 0)
-    raw_discount = float(invoice_data.get('raw_discount_eur', 0) or 0)
-    base_amount  = round(raw_total / 1.21, 2)
-    vat_amount   = round(raw_total - base_amount, 2)
-    descriptions = [it.get('name', '') for it in items if it.get('name')]
-    pr_numurs    = invoice_data.get('doc_id', '')
-    existing_nums = [int(str(e.get('kartas_nr', 0)).strip() or 0) for e in history]
-    next_kartas   = max(existing_nums, default=0) + 1
-    new_entry = {
-        'kartas_nr':         next_kartas,
-        'datums':            invoice_data.get('date', ''),
-        'pr_partneris':      invoice_data.get('client_name', ''),
-        'pr_pvn_nr':         invoice_data.get('client_vat_no', ''),
-        'pr_datums':         invoice_data.get('date', ''),
-        'pr_numurs':         pr_numurs,
-        'darijuma_apraksts': '; '.join(descriptions),
-        'vertiba_bez_pvn':   _fmt(base_amount),
-        'dabas_resursi':     '',
-        'atlaides':          _fmt(raw_discount),
-        'pvn_summa':         _fmt(vat_amount),
-        'kopeja_summa':      invoice_data.get('total', ''),
-        'due_date':          invoice_data.get('due_date', ''),
-        'client_reg_no':     invoice_data.get('client_reg_no', ''),
-        'client_address':    invoice_data.get('client_address', ''),
-        'doc_type':          invoice_data.get('doc_type', ''),
-        'items_json':        json.dumps(items, ensure_ascii=False),
-        'comments':          invoice_data.get('comments', ''),
-        'created_at':        datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        'items':             items,
-        'doc_id':            pr_numurs,
-        'client_name':       invoice_data.get('client_name', ''),
-        'client_vat_no':     invoice_data.get('client_vat_no', ''),
-        'date':              invoice_data.get('date', ''),
-        'total':             invoice_data.get('total', ''),
-    }
-    updated = False
-    for i, entry in enumerate(history):
-        if entry.get('pr_numurs') == pr_numurs or entry.get('doc_id') == pr_numurs:
-            new_entry['kartas_nr'] = entry.get('kartas_nr', next_kartas)
-            history[i] = new_entry
-            updated = True
-            break
-    if not updated:
-        history.append(new_entry)
-    df = _history_to_df(history)
-    # Šīs ir save_to_history beigas
-    df.to_csv(local_path, index=False, encoding='utf-8')
+    store = get_history_store(local_path)
+    pr_numurs = invoice_data.get('doc_id', '')
+    # Numurs ir izmantots tikai īstajā vēsturē (proformas numuru nepatērē)
+    prefix, number = parse_doc_id(pr_numurs)
+    uses_number = local_path == LOCAL_HISTORY_PATH and number is not None
+    # Lietotājs var numuru labot — pirms saglabāšanas tas jārezervē šai sesijai
+    if uses_number and not get_invoice_numbers().claim(prefix, number, number_holder()):
+        return False, f"Numurs {pr_numurs} ir rezervēts citā sesijā, izvēlieties citu numuru"
+    # Ja esošam ierakstam mainīts datums, jāatjauno arī iepriekšējā mēneša daļa
+    months = {history_month(e.get('datums')) for e in store.load() if e.get('pr_numurs') == pr_numurs}
+    # Lokāli tiek saglabāts tikai viens ieraksts (upsert pēc pr_numurs)
+    entry = store.save(invoice_data)
+    months.add(history_month(entry['datums']))
+    if uses_number:
+        get_invoice_numbers().commit(prefix, number, number_holder())
+        # commit atceļ arī šīs sesijas rezervāciju sērijā
+        if st.session_state.get('reserved_number', (None,))[0] == prefix:
+            del st.session_state['reserved_number']
     if get_github_token():
-        success, msg = push_csv_to_github(df, github_path, f"Pievieno {pr_numurs}")
-        return success, msg
+        return push_history_to_github(local_path, github_path, months, f"Pievieno {pr_numurs}")
     else:
         return False, "Sistēmā nav ievadīts GITHUB_TOKEN"
 
 def sync_history_from_github(local_path, github_path):
-    content = fetch_csv_from_github(github_path)
-    if content and ('doc_id' in content or 'kartas_nr' in content):
+    # Mēnešu daļas: tiek lejupielādēts manifests un tikai mainītie mēneši
+    status = get_history_shards(local_path, github_path).pull(fetch_csv_from_github)
+    if status == FETCH_OK:
+        update_invoice_numbers(local_path)
+    if status in (FETCH_OK, FETCH_NOT_MODIFIED):
+        return True
+    if status != FETCH_MISSING:
+        return False
+    # GitHub vēl nav mēnešu daļu — vecais viena faila CSV
+    status, content = fetch_csv_from_github(github_path, local_path)
+    if status == FETCH_NOT_MODIFIED:
+        # GitHub versija nav mainījusies — lokālā vēsture jau ir aktuāla
+        return True
+    if status == FETCH_OK and ('doc_id' in content or 'kartas_nr' in content):
         with open(local_path, 'w', encoding='utf-8') as f:
             f.write(content)
+        get_history_store(local_path).import_csv(local_path, replace=True)
+        update_invoice_numbers(local_path)
         return True
+    if status == FETCH_OK:
+        forget_etag(GITHUB_REPO, github_path)
     return False
 
-def get_next_invoice_number(history):
-    if not history:
-        return 49
-    max_num = 0
+def update_invoice_numbers(local_path, reset=False):
+    """Pēc vēstures maiņas no ārpuses (GitHub, dzēšana) saskaņo numuru skaitītājus ar vēsturi."""
+    if local_path == LOCAL_HISTORY_PATH:
+        doc_ids = [e.get('pr_numurs', '') for e in get_history_store(local_path).load()]
+        get_invoice_numbers().rebuild(doc_ids, reset=reset)
+
+def history_options(history):
+    """Sānjoslas izvēlne: uzraksts -> ieraksts (jaunākie pirmie)."""
+    return {
+        f"{e.get('pr_numurs', e.get('doc_id',''))} — {e.get('pr_partneris', e.get('client_name',''))} ({e.get('datums', e.get('date',''))})": e
+        for e in reversed(history)
+    }
+
+def history_table(history):
+    """Vēstures tabulas DataFrame (Rēķinu vēsture sadaļai)."""
+    hist_data = []
     for entry in history:
-        doc = str(entry.get('pr_numurs', entry.get('doc_id', '')))
-        parts = doc.split()
-        if len(parts) > 1 and parts[-1].isdigit():
-            num = int(parts[-1])
-            if num > max_num:
-                max_num = num
-    return max_num + 1
+        hist_data.append({
+            "Kārtas Nr.": entry.get('kartas_nr', ''),
+            "Datums": entry.get('datums', entry.get('date', '')),
+            "Darījuma partneris": entry.get('pr_partneris', entry.get('client_name', '')),
+            "Reģ./PVN Nr.": entry.get('pr_pvn_nr', entry.get('client_vat_no', '')),
+            "PR datums": entry.get('pr_datums', entry.get('date', '')),
+            "PR numurs": entry.get('pr_numurs', entry.get('doc_id', '')),
+            "Darījuma apraksts": entry.get('darijuma_apraksts', ''),
+            "Vērtība (bez PVN)": entry.get('vertiba_bez_pvn', ''),
+            "Dabas resursi": entry.get('dabas_resursi', '') or '—',
+            "Atlaides": entry.get('atlaides', '') or '—',
+            "PVN summa": entry.get('pvn_summa', ''),
+            "Kopējā summa": entry.get('kopeja_summa', entry.get('total', '')),
+        })
+    return pd.DataFrame(hist_data)
+
+def number_holder():
+    """Šīs sesijas identifikators dokumentu numuru rezervācijām."""
+    if 'number_holder' not in st.session_state:
+        st.session_state.number_holder = uuid.uuid4().hex
+    return st.session_state.number_holder
+
+def reserve_number(series):
+    """
+    Rezervē nākamo numuru sērijā vienreiz (glabājas st.session_state, nevis
+    katrā pārzīmēšanā); iepriekšējās sērijas rezervācija tiek atcelta.
+    """
+    held = st.session_state.get('reserved_number')
+    if held and held[0] == series:
+        return held[1]
+    release_number()
+    number = get_invoice_numbers().reserve(series, number_holder())
+    st.session_state.reserved_number = (series, number)
+    return number
+
+def release_number():
+    """Atceļ šīs sesijas numura rezervāciju (sērijas maiņa vai melnraksta atcelšana)."""
+    held = st.session_state.pop('reserved_number', None)
+    if held:
+        get_invoice_numbers().release(held[0], held[1], number_holder())
 
 # ---------------------------------------------------------------------------
 # Pavadzīmes ielāde formā
@@ -317,16 +229,19 @@ def get_next_invoice_number(history):
 
 def load_invoice_into_form(entry):
     doc_id = str(entry.get('pr_numurs', entry.get('doc_id', '')))
-    parts = doc_id.split()
-    if len(parts) > 1 and parts[-1].isdigit():
-        st.session_state.doc_number_input = int(parts[-1])
+    prefix, number = parse_doc_id(doc_id)
+    if number is not None:
+        # Tiek labots esošs dokuments — jaunajam rezervētais numurs vairs nav vajadzīgs
+        release_number()
+        st.session_state.doc_series = prefix
+        st.session_state.doc_number_input = number
     st.session_state.client_data = {
         'name':    entry.get('pr_partneris', entry.get('client_name', '')),
         'address': entry.get('client_address', ''),
         'reg_no':  entry.get('client_reg_no', ''),
         'vat_no':  entry.get('pr_pvn_nr', entry.get('client_vat_no', ''))
     }
-    items_raw = entry.get('items', [])
+    items_raw = entry_items(entry)
     items_list = []
     for item in items_raw:
         try:
@@ -361,11 +276,40 @@ def load_invoice_into_form(entry):
     except Exception:
         pass
 
+# ---------------------------------------------------------------------------
+# Dokumentu ģenerēšana (pēc pieprasījuma)
+# ---------------------------------------------------------------------------
+
+def invoice_document(invoice_data, file_type):
+    """
+    Viens formāts rēķinam: (baiti, faila nosaukums, mime, vai_trāpījums).
+    Ģenerē tikai pieprasīto formātu (kešots tāpat kā invoice_documents).
+    """
+    return cached_render(file_type, InvoiceLayout(invoice_data))
+
+def invoice_documents(invoice_data):
+    """
+    PDF un Word rēķinam: {formāts: (baiti, faila nosaukums, mime, vai_trāpījums)}.
+    Tiek izsaukts tikai lejupielādes brīdī; rezultāts kešots pēc rēķina datu
+    hash (render_cache), tāpēc atkārtota lejupielāde vai Drive augšupielāde
+    tos pašus datus vairs neģenerē.
+    """
+    # Abi formāti tiek ģenerēti vienlaikus baseina procesos (forkoti no
+    # forkserver, nevis no Streamlit procesa); ja baseins pilns — šajā procesā
+    layout = InvoiceLayout(invoice_data)
+    try:
+        return render_bundle(layout)
+    except PoolSaturated:
+        return cached_render_bundle(layout)
+
+def invoice_zip(invoice_data):
+    return bundle_zip([(content, name) for content, name, _, _ in invoice_documents(invoice_data).values()])
+
 # ---------------------------------------------------------------------------
 # Lejupielādes callback
 # ---------------------------------------------------------------------------
 
-def handle_download(invoice_data, file_buffer, filename, mime_type, is_proforma):
+def handle_download(invoice_data, file_type, is_proforma):
     if is_proforma:
         success, msg = save_to_history(invoice_data, LOCAL_TEST_HIST_PATH, GITHUB_TEST_HIST_PATH)
         if success:
@@ -380,7 +324,12 @@ def handle_download(invoice_data, file_buffer, filename, mime_type, is_proforma)
             st.error(f"⚠️ Kļūda saglabājot vēsturi GitHub: {msg}")
             
         if get_drive_service():
-            success_drive = upload_to_drive(file_buffer, filename, mime_type)
+            try:
+                content, filename, mime_type, _ = invoice_document(invoice_data, file_type)
+            except Exception as e:
+                st.error(f"Kļūda ģenerējot dokumentus: {e}")
+                return
+            success_drive = upload_to_drive(io.BytesIO(content), filename, mime_type)
             if success_drive:
                 st.toast(f"✅ Saglabāts Drive: {filename}", icon="☁️")
             else:
@@ -388,6 +337,36 @@ def handle_download(invoice_data, file_buffer, filename, mime_type, is_proforma)
         else:
             st.toast("Nav pieslēgts Google Drive (tikai lejupielādēts)", icon="⚠️")
 
+def handle_bundle_download(invoice_data, is_proforma):
+    """Abu formātu lejupielāde: vēsturē saglabā vienreiz, Drive augšupielādē abus kopā."""
+    if is_proforma:
+        success, msg = save_to_history(invoice_data, LOCAL_TEST_HIST_PATH, GITHUB_TEST_HIST_PATH)
+        if success:
+            st.toast("✅ Proformas dokuments saglabāts vēsturē (GitHub)", icon="💾")
+        else:
+            st.error(f"⚠️ Kļūda saglabājot GitHub: {msg}")
+        return
+
+    success, msg = save_to_history(invoice_data, LOCAL_HISTORY_PATH, GITHUB_HISTORY_PATH)
+    if success:
+        st.toast("✅ Dokuments saglabāts vēsturē (GitHub)", icon="💾")
+    else:
+        st.error(f"⚠️ Kļūda saglabājot vēsturi GitHub: {msg}")
+
+    if get_drive_service():
+        try:
+            files = [(io.BytesIO(content), name, mime)
+                     for content, name, mime, _ in invoice_documents(invoice_data).values()]
+        except Exception as e:
+            st.error(f"Kļūda ģenerējot dokumentus: {e}")
+            return
+        if upload_bundle_to_drive(files):
+            st.toast(f"✅ Saglabāts Drive: {', '.join(name for _, name, _ in files)}", icon="☁️")
+        else:
+            st.toast("⚠️ Kļūda saglabājot Drive", icon="❌")
+    else:
+        st.toast("Nav pieslēgts Google Drive (tikai lejupielādēts)", icon="⚠️")
+
 # ---------------------------------------------------------------------------
 # Sagataves
 # ---------------------------------------------------------------------------
@@ -526,14 +505,18 @@ def render_presets_app():
         st.session_state.preset_editor_key = 0
 
     if st.button("⬇️ Importēt no GitHub (Atjaunot)"):
-        content = fetch_csv_from_github(GITHUB_PRESETS_PATH)
-        if content and "NOSAUKUMS" in content and "CENA (EUR)" in content:
+        status, content = fetch_csv_from_github(GITHUB_PRESETS_PATH, LOCAL_PRESETS_PATH)
+        if status == FETCH_NOT_MODIFIED:
+            st.success("Sagataves jau atbilst GitHub versijai.")
+        elif status == FETCH_OK and "NOSAUKUMS" in content and "CENA (EUR)" in content:
             with open(LOCAL_PRESETS_PATH, "w", encoding='utf-8') as f:
                 f.write(content)
             st.success("Sagataves veiksmīgi ielādētas no GitHub!")
             st.session_state.preset_editor_key += 1
             st.rerun()
         else:
+            if status == FETCH_OK:
+                forget_etag(GITHUB_REPO, GITHUB_PRESETS_PATH)
             st.error("Neizdevās ielādēt sagataves no GitHub (pārbaudiet Token un faila esamību).")
 
     presets_df = load_presets()
@@ -562,9 +545,15 @@ def render_presets_app():
 # ---------------------------------------------------------------------------
 
 def render_invoice_app():
-    history      = load_history(LOCAL_HISTORY_PATH)
-    test_history = load_history(LOCAL_TEST_HIST_PATH)
-    next_number  = get_next_invoice_number(history)
+    # Vēsture un no tās atvasinātie dati tiek kešoti starp sesijām (history_store),
+    # tāpēc pārzīmēšana nav atkarīga no vēstures apjoma
+    history_store = get_history_store(LOCAL_HISTORY_PATH)
+    test_store    = get_history_store(LOCAL_TEST_HIST_PATH)
+    history       = history_store.load()
+    test_history  = test_store.load()
+    numbers       = get_invoice_numbers()
+    # Skaitītāji tiek aizpildīti no vēstures tikai pirmajā reizē
+    numbers.ensure_initialized(lambda: [e.get('pr_numurs', '') for e in history])
 
     st.sidebar.header("Rēķina iestatījumi")
 
@@ -577,18 +566,28 @@ def render_invoice_app():
         else:
             st.sidebar.warning("Neizdevās sinhronizēt (tukša vēsture vai nav Token)")
 
-    if 'doc_number_input' not in st.session_state:
-        st.session_state.doc_number_input = next_number
+    series_options = numbers.series()
+    current_series = st.session_state.get('doc_series', series_options[0])
+    if current_series not in series_options:
+        series_options.append(current_series)
+    doc_series = st.sidebar.selectbox("Sērija", series_options, index=series_options.index(current_series))
+
+    # Rezervācija ir atomāra — vienlaicīgas sesijas nesaņem vienu numuru. Numurs
+    # tiek rezervēts tikai mainot sēriju (ne katrā pārzīmēšanā); labotais numurs
+    # tiek rezervēts saglabājot (save_to_history)
+    if 'doc_number_input' not in st.session_state or st.session_state.get('doc_series') != doc_series:
+        st.session_state.doc_series = doc_series
+        st.session_state.doc_number_input = reserve_number(doc_series)
 
     doc_number_input = st.sidebar.number_input(
         "Dokumenta Nr.", min_value=1, value=st.session_state.doc_number_input, step=1
     )
-    doc_id = f"BR {doc_number_input:04d}"
+    doc_id = format_doc_id(doc_series, doc_number_input)
     st.sidebar.markdown(f"**Dokumenta ID:** {doc_id}")
 
-    if history:
-        last_num = get_next_invoice_number(history) - 1
-        st.sidebar.info(f"📋 Pēdējā pavadzīme: **BR {last_num:04d}**")
+    last_num = numbers.last(doc_series)
+    if history and last_num:
+        st.sidebar.info(f"📋 Pēdējā pavadzīme: **{format_doc_id(doc_series, last_num)}**")
 
     default_doc_date = st.session_state.get('loaded_doc_date', datetime.date.today())
     doc_date = st.sidebar.date_input("Datums", default_doc_date)
@@ -600,10 +599,7 @@ def render_invoice_app():
 
     st.sidebar.subheader("📂 Atvērt iepriekšējo pavadzīmi")
     if history:
-        hist_options = {
-            f"{e.get('pr_numurs', e.get('doc_id',''))} — {e.get('pr_partneris', e.get('client_name',''))} ({e.get('datums', e.get('date',''))})": e
-            for e in reversed(history)
-        }
+        hist_options = history_store.cached('options', history_options)
         selected_hist_label = st.sidebar.selectbox(
             "Izvēlies dokumentu", list(hist_options.keys()), key="hist_select"
         )
@@ -617,10 +613,7 @@ def render_invoice_app():
 
     st.sidebar.subheader("🔄 Testa pavadzīmju ielāde")
     if test_history:
-        test_options = {
-            f"{t.get('pr_numurs', t.get('doc_id',''))} — {t.get('pr_partneris', t.get('client_name',''))} ({t.get('datums', t.get('date',''))})": t
-            for t in reversed(test_history)
-        }
+        test_options = test_store.cached('options', history_options)
         selected_test_label = st.sidebar.selectbox("Izvēlies testa dokumentu", list(test_options.keys()))
         if st.sidebar.button("Ielādēt izvēlēto", key="load_test_btn"):
             load_invoice_into_form(test_options[selected_test_label])
@@ -680,9 +673,15 @@ def render_invoice_app():
         st.sidebar.error("Vai tiešām dzēst visu vēsturi? Nevar atsaukt.")
         col_del_1, col_del_2 = st.sidebar.columns(2)
         if col_del_1.button("Jā, dzēst"):
-            for p in [LOCAL_HISTORY_PATH, LOCAL_TEST_HIST_PATH]:
+            for p, gh in [(LOCAL_HISTORY_PATH, GITHUB_HISTORY_PATH), (LOCAL_TEST_HIST_PATH, GITHUB_TEST_HIST_PATH)]:
+                get_history_store(p).clear()
+                get_history_shards(p, gh).clear_local()
                 if os.path.exists(p):
                     os.remove(p)
+            get_invoice_numbers().clear()
+            # Rezervācijas izdzēstas — numurs tiks rezervēts no jauna
+            st.session_state.pop('reserved_number', None)
+            st.session_state.pop('doc_number_input', None)
             st.session_state.confirm_delete_history = False
             st.rerun()
         if col_del_2.button("Atcelt"):
@@ -969,38 +968,41 @@ def render_invoice_app():
         }
         invoice_data['doc_type'] = type_map.get(doc_type, doc_type)
 
-    d_col1, d_col2 = st.columns(2)
+    d_col1, d_col2, d_col3 = st.columns(3)
 
-    try:
-        pdf_file      = generate_pdf(invoice_data)
-        file_name_pdf = f"{invoice_data['doc_type'].replace(' ', '_')}_{doc_id.replace(' ', '_')}.pdf"
-        with d_col1:
-            st.download_button(
-                label="📄 Lejupielādēt PDF",
-                data=pdf_file,
-                file_name=file_name_pdf,
-                mime="application/pdf",
-                on_click=handle_download,
-                args=(invoice_data, pdf_file, file_name_pdf, "application/pdf", is_proforma)
-            )
-    except Exception as e:
-        st.error(f"Kļūda PDF: {e}")
+    # Dokumenti netiek ģenerēti katrā pārzīmēšanā (rakstot laukos) — Streamlit
+    # izsauc `data` funkciju tikai tad, kad lietotājs nospiež lejupielādi.
+    file_stem = f"{invoice_data['doc_type'].replace(' ', '_')}_{doc_id.replace(' ', '_')}"
 
-    try:
-        docx_file      = generate_docx(invoice_data)
-        file_name_docx = f"{invoice_data['doc_type'].replace(' ', '_')}_{doc_id.replace(' ', '_')}.docx"
-        with d_col2:
-            st.download_button(
-                label="📝 Lejupielādēt Word",
-                data=docx_file,
-                file_name=file_name_docx,
-                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                on_click=handle_download,
-                args=(invoice_data, docx_file, file_name_docx,
-                      "application/vnd.openxmlformats-officedocument.wordprocessingml.document", is_proforma)
-            )
-    except Exception as e:
-        st.error(f"Kļūda Word: {e}")
+    with d_col1:
+        st.download_button(
+            label="📄 Lejupielādēt PDF",
+            data=lambda: invoice_document(invoice_data, 'pdf')[0],
+            file_name=f"{file_stem}.pdf",
+            mime=MIME_TYPES['pdf'],
+            on_click=handle_download,
+            args=(invoice_data, 'pdf', is_proforma)
+        )
+
+    with d_col2:
+        st.download_button(
+            label="📝 Lejupielādēt Word",
+            data=lambda: invoice_document(invoice_data, 'docx')[0],
+            file_name=f"{file_stem}.docx",
+            mime=MIME_TYPES['docx'],
+            on_click=handle_download,
+            args=(invoice_data, 'docx', is_proforma)
+        )
+
+    with d_col3:
+        st.download_button(
+            label="🗂️ Lejupielādēt abus (ZIP)",
+            data=lambda: invoice_zip(invoice_data),
+            file_name=f"{file_stem}.zip",
+            mime="application/zip",
+            on_click=handle_bundle_download,
+            args=(invoice_data, is_proforma)
+        )
 
     # -----------------------------------------------------------------------
     # Vēstures tabula
@@ -1009,7 +1011,7 @@ def render_invoice_app():
     st.markdown("---")
     with st.expander("🗄️ Rēķinu vēsture (Izrakstītie)", expanded=False):
         if history:
-            excel_bytes = generate_history_excel(history)
+            excel_bytes = history_store.cached('excel', generate_history_excel)
             st.download_button(
                 label="📥 Lejupielādēt kā Excel",
                 data=excel_bytes,
@@ -1019,23 +1021,7 @@ def render_invoice_app():
             st.markdown("---")
 
             # Veidojam DataFrame no vēstures datiem
-            hist_data = []
-            for entry in history:
-                hist_data.append({
-                    "Kārtas Nr.": entry.get('kartas_nr', ''),
-                    "Datums": entry.get('datums', entry.get('date', '')),
-                    "Darījuma partneris": entry.get('pr_partneris', entry.get('client_name', '')),
-                    "Reģ./PVN Nr.": entry.get('pr_pvn_nr', entry.get('client_vat_no', '')),
-                    "PR datums": entry.get('pr_datums', entry.get('date', '')),
-                    "PR numurs": entry.get('pr_numurs', entry.get('doc_id', '')),
-                    "Darījuma apraksts": entry.get('darijuma_apraksts', ''),
-                    "Vērtība (bez PVN)": entry.get('vertiba_bez_pvn', ''),
-                    "Dabas resursi": entry.get('dabas_resursi', '') or '—',
-                    "Atlaides": entry.get('atlaides', '') or '—',
-                    "PVN summa": entry.get('pvn_summa', ''),
-                    "Kopējā summa": entry.get('kopeja_summa', entry.get('total', '')),
-                })
-            hist_df = pd.DataFrame(hist_data)
+            hist_df = history_store.cached('table', history_table)
 
             edited_hist_df = st.data_editor(
                 hist_df,
@@ -1052,13 +1038,17 @@ def render_invoice_app():
                 st.warning(f"⚠️ {deleted_count} rinda(s) atzīmēta(s) dzēšanai.")
                 if st.button("💾 Apstiprināt dzēšanu", type="primary"):
                     kept_nums = set(edited_hist_df["PR numurs"].tolist())
-                    new_history = [e for e in history
-                                   if e.get('pr_numurs', e.get('doc_id', '')) in kept_nums]
-                    df = _history_to_df(new_history)
-                    df.to_csv(LOCAL_HISTORY_PATH, index=False, encoding='utf-8')
+                    removed = [e.get('pr_numurs', e.get('doc_id', '')) for e in history
+                               if e.get('pr_numurs', e.get('doc_id', '')) not in kept_nums]
+                    removed_set = set(removed)
+                    removed_months = {history_month(e.get('datums')) for e in history
+                                      if e.get('pr_numurs', e.get('doc_id', '')) in removed_set}
+                    history_store.delete(removed)
+                    update_invoice_numbers(LOCAL_HISTORY_PATH, reset=True)
                     if get_github_token():
-                        success, msg = push_csv_to_github(df, GITHUB_HISTORY_PATH,
-                                                          f"Dzēsti {deleted_count} ieraksti no vēstures")
+                        success, msg = push_history_to_github(
+                            LOCAL_HISTORY_PATH, GITHUB_HISTORY_PATH, removed_months,
+                            f"Dzēsti {deleted_count} ieraksti no vēstures")
                         if success:
                             st.success("✅ Vēsture atjaunināta un saglabāta GitHub!")
                         else:
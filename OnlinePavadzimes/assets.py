@@ -0,0 +1,76 @@
+"""
+assets.py — kopīgi, vienreiz sagatavoti resursi abiem ģeneratoriem.
+
+Oriģinālais logo fails ir 1563x1563 px, bet dokumentā tas tiek drukāts
+35 mm platumā. Logo tiek nolasīts vienreiz, samazināts līdz drukas
+izmēram ar LOGO_DPI izšķirtspēju, saspiests no jauna un glabāts atmiņā
+gan kā PNG baiti (python-docx), gan kā ReportLab ImageReader (PDF).
+"""
+
+import io
+import os
+import threading
+
+from PIL import Image
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+LOGO_PATH = os.path.join(CURRENT_DIR, "BRATUS MELNS LOGO PNG.png")
+
+LOGO_WIDTH_MM = 35
+LOGO_DPI = int(os.environ.get("LOGO_DPI", 300))
+
+_lock = threading.Lock()
+_logo_bytes = None
+_logo_loaded = False
+
+
+def _prepare_logo(path, width_mm, dpi):
+    img = Image.open(path)
+    img.load()
+    target_px = max(1, int(round(width_mm / 25.4 * dpi)))
+    if max(img.size) > target_px:
+        img.thumbnail((target_px, target_px), Image.LANCZOS)
+    # Melnbalts logo: ja visi pikseļi ir pelēki, pietiek ar vienu kanālu
+    if img.mode == "RGB":
+        r, g, b = img.split()
+        if r.tobytes() == g.tobytes() == b.tobytes():
+            img = r
+    out = io.BytesIO()
+    img.save(out, format="PNG", optimize=True)
+    return out.getvalue()
+
+
+def logo_bytes():
+    """Samazinātais logo PNG formātā vai None, ja logo faila nav."""
+    global _logo_bytes, _logo_loaded
+    if not _logo_loaded:
+        with _lock:
+            if not _logo_loaded:
+                try:
+                    _logo_bytes = _prepare_logo(LOGO_PATH, LOGO_WIDTH_MM, LOGO_DPI)
+                except Exception as e:
+                    print(f"Neizdevās ielādēt logo: {e}")
+                    _logo_bytes = None
+                _logo_loaded = True
+    return _logo_bytes
+
+
+def logo_stream():
+    """Jauns BytesIO ar logo (python-docx add_picture to nolasa līdz galam)."""
+    data = logo_bytes()
+    return io.BytesIO(data) if data else None
+
+
+_logo_reader = None
+
+
+def logo_image_reader():
+    """ReportLab ImageReader, kopīgs visiem PDF dokumentiem."""
+    global _logo_reader
+    data = logo_bytes()
+    if _logo_reader is None and data:
+        from reportlab.lib.utils import ImageReader
+        with _lock:
+            if _logo_reader is None:
+                _logo_reader = ImageReader(io.BytesIO(data))
+    return _logo_reader
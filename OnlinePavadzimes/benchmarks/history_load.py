@@ -0,0 +1,139 @@
+"""
+Vēstures CSV ielādes etalons.
+
+Salīdzina iepriekšējo ielādi (iterrows + items_json atkodēšana katrai
+rindai) ar pašreizējo read_history_csv (kolonnu operācijas, pozīcijas tiek
+atkodētas tikai pēc pieprasījuma ar entry_items). Mēra laiku un maksimālo
+atmiņas patēriņu (tracemalloc) jaunā un vecā formāta CSV failiem.
+
+Palaišana no OnlinePavadzimes mapes:
+    python benchmarks/history_load.py [rindu skaits]
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history_store import HISTORY_COLS, history_entry, history_to_df, read_history_csv, _fmt
+
+DEFAULT_ROWS = 100_000
+
+
+def make_history(n_rows):
+    """n_rows jaunā formāta ieraksti ar 1-5 pozīcijām katrā."""
+    history = []
+    for i in range(n_rows):
+        n_items = i % 5 + 1
+        items = [{'seq': j + 1, 'name': f"Pakalpojums {j + 1}", 'unit': 'gab', 'qty': '2.0',
+                  'price': '12,50', 'total': '25,00', 'raw_qty': 2.0, 'raw_price': 12.5}
+                 for j in range(n_items)]
+        data = {
+            'doc_id': f"BR {i + 1:06d}", 'doc_type': 'Rēķins', 'date': '01.01.2026',
+            'due_date': '15.01.2026', 'client_name': f"SIA Klients {i % 500}", 'client_address': 'Rīga',
+            'client_reg_no': '40000000000', 'client_vat_no': 'LV40000000000', 'items': items,
+            'raw_subtotal': 25.0 * n_items, 'raw_vat': 5.25 * n_items, 'raw_total': 30.25 * n_items,
+            'total': _fmt(30.25 * n_items), 'comments': '',
+        }
+        history.append(history_entry(data, i + 1))
+    return history
+
+
+def make_old_format(df):
+    """Tie paši ieraksti vecajā formātā (doc_id, client_name, items, ...)."""
+    return pd.DataFrame({
+        'doc_id': df['pr_numurs'], 'date': df['datums'], 'due_date': df['due_date'],
+        'client_name': df['pr_partneris'], 'client_address': df['client_address'],
+        'client_reg_no': df['client_reg_no'], 'client_vat_no': df['pr_pvn_nr'],
+        'doc_type': df['doc_type'], 'total': df['kopeja_summa'], 'items': df['items_json'],
+        'comments': df['comments'], 'created_at': df['created_at'],
+    })
+
+
+# --- Iepriekšējā ielāde (salīdzinājumam) -----------------------------------
+
+def _legacy_items(items_str):
+    try:
+        return json.loads(items_str) if pd.notna(items_str) and items_str else []
+    except Exception:
+        return []
+
+
+def legacy_read_history_csv(path):
+    df = pd.read_csv(path, dtype=str)
+    if 'doc_id' in df.columns and 'kartas_nr' not in df.columns:
+        records = []
+        for i, (_, row) in enumerate(df.iterrows(), 1):
+            items_str = row.get('items', '[]')
+            items_list = _legacy_items(items_str)
+            base = sum(float(it.get('raw_qty', 0) or 0) * float(it.get('raw_price', 0) or 0)
+                       for it in items_list)
+            try:
+                total_val = float(str(row.get('total', '0')).replace('\u00a0', '').replace(' ', '').replace(',', '.'))
+            except Exception:
+                total_val = 0.0
+            records.append({
+                'kartas_nr': i, 'datums': row.get('date', ''), 'pr_partneris': row.get('client_name', ''),
+                'pr_pvn_nr': row.get('client_vat_no', ''), 'pr_datums': row.get('date', ''),
+                'pr_numurs': row.get('doc_id', ''),
+                'darijuma_apraksts': '; '.join(it.get('name', '') for it in items_list if it.get('name')),
+                'vertiba_bez_pvn': _fmt(base), 'dabas_resursi': '', 'atlaides': _fmt(0),
+                'pvn_summa': _fmt(round(total_val - base, 2)), 'kopeja_summa': row.get('total', ''),
+                'due_date': row.get('due_date', ''), 'client_reg_no': row.get('client_reg_no', ''),
+                'client_address': row.get('client_address', ''), 'doc_type': row.get('doc_type', ''),
+                'items_json': items_str, 'comments': row.get('comments', ''),
+                'created_at': row.get('created_at', ''), 'items': items_list,
+                'doc_id': row.get('doc_id', ''), 'client_name': row.get('client_name', ''),
+                'client_vat_no': row.get('client_vat_no', ''), 'date': row.get('date', ''),
+                'total': row.get('total', ''),
+            })
+        return records
+    records = []
+    for _, row in df.iterrows():
+        rec = row.to_dict()
+        rec['items'] = _legacy_items(rec.get('items_json', '[]'))
+        rec['doc_id'] = rec.get('pr_numurs', '')
+        rec['client_name'] = rec.get('pr_partneris', '')
+        rec['client_vat_no'] = rec.get('pr_pvn_nr', '')
+        rec['date'] = rec.get('datums', '')
+        rec['total'] = rec.get('kopeja_summa', '')
+        records.append(rec)
+    return records
+
+
+def measure(loader, path):
+    start = time.perf_counter()
+    history = loader(path)
+    elapsed = time.perf_counter() - start
+    del history
+    # Atmiņa tiek mērīta atsevišķā izsaukumā — tracemalloc būtiski palēnina darbu
+    tracemalloc.start()
+    loader(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def run(n_rows):
+    df = history_to_df(make_history(n_rows))
+    assert list(df.columns) == HISTORY_COLS
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {'jaunais': os.path.join(tmp, 'new.csv'), 'vecais': os.path.join(tmp, 'old.csv')}
+        df.to_csv(paths['jaunais'], index=False)
+        make_old_format(df).to_csv(paths['vecais'], index=False)
+        print(f"{n_rows} rindas, CSV {os.path.getsize(paths['jaunais']) / 1e6:.1f} MB")
+        print(f"{'formāts':>8} {'ielāde':>10} {'laiks, s':>10} {'atmiņa, MB':>11}")
+        for fmt, path in paths.items():
+            for name, loader in (('iepriekš', legacy_read_history_csv), ('tagad', read_history_csv)):
+                elapsed, peak = measure(loader, path)
+                print(f"{fmt:>8} {name:>10} {elapsed:>10.2f} {peak / 1e6:>11.1f}")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS)
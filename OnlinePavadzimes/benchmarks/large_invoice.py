@@ -0,0 +1,59 @@
+"""
+Lielo rēķinu ('large' režīma) ģenerēšanas etalons.
+
+Mēra PDF ģenerēšanas laiku un maksimālo atmiņas patēriņu (tracemalloc)
+dažādiem pozīciju skaitiem un parāda laiku/atmiņu uz vienu pozīciju —
+tiem jāpaliek aptuveni nemainīgiem (lineāra mērogošanās).
+
+Palaišana no OnlinePavadzimes mapes:
+    python benchmarks/large_invoice.py [pozīciju skaiti...]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf_generator import generate_pdf
+
+DEFAULT_SIZES = (100, 500, 1000, 2500, 5000)
+
+
+def make_invoice(n_items):
+    items = []
+    for i in range(n_items):
+        name = f"Pozīcija {i + 1}"
+        if i % 10 == 0:
+            name += " ar garāku aprakstu, kas tabulas šūnā jālauž vairākās rindās"
+        items.append({'seq': i + 1, 'name': name, 'unit': 'Gab.', 'qty': '2.0',
+                      'price': '12,50', 'total': '25,00'})
+    return {
+        'doc_id': 'BR 9999', 'doc_type': 'Rēķins', 'date': '01.01.2026', 'due_date': '15.01.2026',
+        'client_name': 'SIA Etalons', 'client_address': 'Rīga', 'client_reg_no': '40000000000',
+        'client_vat_no': 'LV40000000000', 'items': items,
+        'subtotal': '0,00', 'vat': '0,00', 'total': '0,00', 'raw_discount_eur': 0,
+        'amount_words': '-', 'comments': '',
+    }
+
+
+def run(sizes):
+    generate_pdf(make_invoice(10), mode='large')  # fontu un logo iesildīšana
+    print(f"{'pozīcijas':>10} {'laiks, s':>10} {'ms/poz.':>9} {'atmiņa, MB':>11} {'KB/poz.':>8} {'PDF, KB':>9}")
+    for n in sizes:
+        data = make_invoice(n)
+        start = time.perf_counter()
+        pdf = generate_pdf(data, mode='large').getvalue()
+        elapsed = time.perf_counter() - start
+        # Atmiņa tiek mērīta atsevišķā izsaukumā — tracemalloc būtiski palēnina darbu
+        tracemalloc.start()
+        generate_pdf(data, mode='large')
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{n:>10} {elapsed:>10.2f} {elapsed / n * 1000:>9.2f} {peak / 1e6:>11.1f} "
+              f"{peak / n / 1024:>8.1f} {len(pdf) / 1024:>9.0f}")
+
+
+if __name__ == "__main__":
+    run([int(a) for a in sys.argv[1:]] or DEFAULT_SIZES)
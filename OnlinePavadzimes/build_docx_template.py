@@ -0,0 +1,228 @@
+"""
+build_docx_template.py — izveido templates/invoice_template.docx.
+
+Veidne satur visu nemainīgo DOCX daļu (apmales, stilus, logo, SIA Bratus un
+bankas rekvizītus, līnijas, tabulu noformējumu) un vietturus, kurus
+docx_generator aizpilda katram rēķinam:
+
+  {{lauks}}              — tiek aizstāts ar vērtību (vietturim jābūt vienā "run";
+                           Word rediģējot, labāk pārrakstīt visu vietturi uzreiz)
+  {{#bloks}} / {{/bloks}} — atsevišķas rindkopas, kas iezīmē bloku; bloks tiek
+                           atstāts vai izņemts atkarībā no rēķina (skat.
+                           docx_generator.BLOCKS), marķieri vienmēr tiek izņemti
+  preču tabulas rinda ar {{name}} — prototips, kas tiek nokopēts katrai pozīcijai
+
+Veidni var labot arī Word, tikai jāsaglabā vietturi un bloku marķieri.
+Pēc logo vai izkārtojuma izmaiņām kodā palaist:  python build_docx_template.py
+"""
+
+import os
+
+from docx import Document
+from docx.shared import Pt, Cm, RGBColor
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml.ns import nsdecls
+from docx.oxml import parse_xml
+
+from assets import logo_stream
+from docx_generator import add_horizontal_line, add_supplier_runs, add_bank_runs, TEMPLATE_PATH
+
+
+def _marker(doc, text):
+    doc.add_paragraph(text)
+
+
+def _two_col_table(doc, widths=(8.5, 8.5)):
+    table = doc.add_table(rows=1, cols=2)
+    table.autofit = False
+    table.columns[0].width = Cm(widths[0])
+    table.columns[1].width = Cm(widths[1])
+    return table
+
+
+def _totals_table(doc, rows, labels_bold, last_value_bold):
+    table = doc.add_table(rows=len(rows), cols=3)
+    table.autofit = False
+    table.columns[0].width = Cm(8.5)
+    table.columns[1].width = Cm(5.5)
+    table.columns[2].width = Cm(3)
+    for i, (label, value) in enumerate(rows):
+        p = table.cell(i, 1).paragraphs[0]
+        p.add_run(label).bold = labels_bold
+        p.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+        p = table.cell(i, 2).paragraphs[0]
+        p.add_run(f"{value} €").bold = last_value_bold and i == len(rows) - 1
+        p.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+
+
+TOTALS_DISCOUNT = [
+    ("KOPĀ (bez PVN un atlaides)", "{{subtotal}}"),
+    ("Atlaides apjoms ({{discount_percent}}%)", "-{{discount_eur}}"),
+    ("Kopā ar atlaidi (bez PVN)", "{{subtotal_after_discount}}"),
+    ("PVN", "{{vat}}"),
+    ("KOPUMĀ APMAKSAI", "{{total}}"),
+]
+TOTALS_PLAIN = [
+    ("KOPĀ", "{{subtotal}}"),
+    ("PVN", "{{vat}}"),
+    ("Kopumā", "{{total}}"),
+]
+
+
+def build_template():
+    doc = Document()
+
+    style = doc.styles['Normal']
+    style.font.name = 'Arial'
+    style.font.size = Pt(10)
+    for section in doc.sections:
+        section.top_margin = Cm(1.5)
+        section.bottom_margin = Cm(1.5)
+        section.left_margin = Cm(2)
+        section.right_margin = Cm(2)
+
+    # 1. Logo un dokumenta info
+    table = _two_col_table(doc)
+    paragraph = table.cell(0, 0).paragraphs[0]
+    logo = logo_stream()
+    if logo is not None:
+        paragraph.add_run().add_picture(logo, width=Cm(3.5))
+    else:
+        paragraph.add_run("LOGO").bold = True
+    p = table.cell(0, 1).paragraphs[0]
+    p.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+    run = p.add_run("{{title}}\n")
+    run.bold = True
+    run.font.size = Pt(14)
+    p.add_run("\nDatums: {{date}}\n")
+    p.add_run("Apmaksāt līdz: {{due_date}}")
+    doc.add_paragraph()
+    add_horizontal_line(doc)
+
+    # 2a. E-rēķina saņēmējs un pasūtītājs
+    _marker(doc, "{{#e_invoice}}")
+    table = _two_col_table(doc)
+    table.style = 'Table Grid'
+    for cell in table.rows[0].cells:
+        cell._tc.get_or_add_tcPr().append(parse_xml(r'''
+            <w:tcBorders xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">
+                <w:top w:val="single" w:sz="12" w:space="0" w:color="FF0000"/>
+                <w:left w:val="single" w:sz="12" w:space="0" w:color="FF0000"/>
+                <w:bottom w:val="single" w:sz="12" w:space="0" w:color="FF0000"/>
+                <w:right w:val="single" w:sz="12" w:space="0" w:color="FF0000"/>
+            </w:tcBorders>
+        '''))
+    p = table.cell(0, 0).paragraphs[0]
+    p.add_run("Saņēmējs\n\n").bold = True
+    p.add_run("{{receiver_name}}\n").bold = True
+    p.add_run("Reģ. Nr.: ").bold = True
+    p.add_run("{{receiver_reg_no}}")
+    p = table.cell(0, 1).paragraphs[0]
+    p.add_run("Pasūtītājs\n\n").bold = True
+    p.add_run("{{customer_name}}\n").bold = True
+    p.add_run("Reģistrācijas nr.: ").bold = True
+    p.add_run("{{customer_reg_no}}\n")
+    p.add_run("Juridiskā adrese: ").bold = True
+    p.add_run("{{customer_address}}")
+    doc.add_paragraph()
+    add_horizontal_line(doc)
+    doc.add_paragraph().add_run("Nosūtītājs").bold = True
+    _marker(doc, "{{/e_invoice}}")
+
+    # 2b. Klients
+    _marker(doc, "{{#client}}")
+    doc.add_paragraph().add_run("KLIENTS").bold = True
+    p = doc.add_paragraph()
+    p.add_run("{{client_name}}").bold = True
+    p.add_run("\nAdrese: {{client_address}}").italic = True
+    p.add_run("\nReģ. Nr.: {{client_reg_no}}").italic = True
+    p.add_run("\nPVN Nr.: {{client_vat_no}}").italic = True
+    doc.add_paragraph()
+    add_horizontal_line(doc)
+    _marker(doc, "{{/client}}")
+
+    # 3. Piegādātājs un banka
+    table = _two_col_table(doc)
+    add_supplier_runs(table.cell(0, 0).paragraphs[0])
+    add_bank_runs(table.cell(0, 1).paragraphs[0])
+    doc.add_paragraph()
+
+    # 4. Preču tabula: galvene un viena prototipa rinda
+    headers = ["NOSAUKUMS", "Mērvienība", "DAUDZUMS", "CENA (EUR)", "KOPĀ (EUR)"]
+    table = doc.add_table(rows=1, cols=5)
+    table.style = 'Table Grid'
+    for i, width in enumerate((6.5, 2.5, 2.5, 2.5, 3.0)):
+        table.columns[i].width = Cm(width)
+    table.add_row()  # rinda pārņem kolonnu platumus
+    for i, h in enumerate(headers):
+        cell = table.rows[0].cells[i]
+        cell.text = h
+        cell._element.tcPr.append(parse_xml(r'<w:shd {} w:fill="CDBF96"/>'.format(nsdecls('w'))))
+        p = cell.paragraphs[0]
+        p.runs[0].bold = True
+        p.runs[0].font.color.rgb = RGBColor(255, 255, 255)
+        p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    alignments = [None, WD_ALIGN_PARAGRAPH.CENTER, WD_ALIGN_PARAGRAPH.CENTER,
+                  WD_ALIGN_PARAGRAPH.RIGHT, WD_ALIGN_PARAGRAPH.RIGHT]
+    for i, field in enumerate(("name", "unit", "qty", "price", "total")):
+        cell = table.rows[1].cells[i]
+        cell.text = "{{" + field + "}}"
+        if alignments[i] is not None:
+            cell.paragraphs[0].alignment = alignments[i]
+    doc.add_paragraph()
+
+    # 5. Kopsummas (četri varianti: avansa rēķins / citi, ar atlaidi / bez)
+    _marker(doc, "{{#totals_discount}}")
+    _totals_table(doc, TOTALS_DISCOUNT, labels_bold=True, last_value_bold=True)
+    _marker(doc, "{{/totals_discount}}")
+    _marker(doc, "{{#totals}}")
+    _totals_table(doc, TOTALS_PLAIN, labels_bold=True, last_value_bold=True)
+    _marker(doc, "{{/totals}}")
+    _marker(doc, "{{#advance_totals_discount}}")
+    _totals_table(doc, TOTALS_DISCOUNT, labels_bold=False, last_value_bold=False)
+    _marker(doc, "{{/advance_totals_discount}}")
+    _marker(doc, "{{#advance_totals}}")
+    _totals_table(doc, TOTALS_PLAIN, labels_bold=False, last_value_bold=False)
+    _marker(doc, "{{/advance_totals}}")
+
+    # 6. Avanss un summa vārdiem
+    _marker(doc, "{{#advance}}")
+    doc.add_paragraph()
+    p = doc.add_paragraph()
+    p.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+    p.add_run("APMAKSĀJAMAIS AVANSS ({{advance_percent}}%): {{advance}} €").bold = True
+    _marker(doc, "{{/advance}}")
+    doc.add_paragraph()
+    p = doc.add_paragraph()
+    p.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+    p.add_run("Vārdiem: {{amount_words}}").italic = True
+    doc.add_paragraph()
+    add_horizontal_line(doc)
+
+    # 7. Papildinformācija un paraksti
+    _marker(doc, "{{#comments}}")
+    p = doc.add_paragraph()
+    p.add_run("Papildus informācija:").bold = True
+    p.add_run("\n{{comments}}")
+    _marker(doc, "{{/comments}}")
+    doc.add_paragraph()
+    doc.add_paragraph()
+    table = doc.add_table(rows=2, cols=2)
+    table.autofit = False
+    table.columns[0].width = Cm(10)
+    table.columns[1].width = Cm(7)
+    p = table.cell(0, 0).paragraphs[0]
+    p.add_run("{{prepared_label}}")
+    p.add_run("{{signatory}}").italic = True
+    for row in (0, 1):
+        p = table.cell(row, 1).paragraphs[0]
+        p.add_run("__________________________")
+        p.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+    table.cell(1, 0).paragraphs[0].add_run("{{received_label}}")
+    return doc
+
+
+if __name__ == "__main__":
+    os.makedirs(os.path.dirname(TEMPLATE_PATH), exist_ok=True)
+    build_template().save(TEMPLATE_PATH)
+    print(f"Veidne saglabāta: {TEMPLATE_PATH}")
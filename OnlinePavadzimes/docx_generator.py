@@ -2,13 +2,32 @@ from docx import Document
 from docx.shared import Pt, Cm, RGBColor
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.enum.table import WD_ALIGN_VERTICAL
-from docx.oxml.ns import nsdecls
+from docx.oxml.ns import nsdecls, qn
 from docx.oxml import parse_xml
+from lxml import etree
+from xml.sax.saxutils import escape as xml_escape
+import copy
 import io
 import os
+import re
+import threading
 
-def fmt_curr(val):
-    return f"{val:,.2f}".replace(",", "X").replace(".", ",").replace("X", " ")
+from assets import logo_stream
+from invoice_model import (
+    invoice_layout, SUPPLIER_NAME, SUPPLIER_DETAILS, BANK_NAME, BANK_DETAILS, BANK_ACCOUNT_LABEL, BANK_ACCOUNT,
+)
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Veidni izveido build_docx_template.py; dizaineri to var labot arī Word
+TEMPLATE_PATH = os.environ.get("DOCX_TEMPLATE", os.path.join(CURRENT_DIR, "templates", "invoice_template.docx"))
+
+# Bieži lietotie XML fragmenti tiek parsēti vienreiz un katrā vietā nokopēti
+_LINE_SHADING = parse_xml(r'<w:shd {} w:val="clear" w:color="auto" w:fill="CDBF96"/>'.format(nsdecls('w')))
+_LINE_HEIGHT = parse_xml(r'<w:trHeight {} w:val="20" w:hRule="exact"/>'.format(nsdecls('w')))
+_HEADER_SHADING = parse_xml(r'<w:shd {} w:fill="CDBF96"/>'.format(nsdecls('w')))
+
+_PLACEHOLDER = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+_ITEM_FIELDS = ("name", "unit", "qty", "price", "total")
 
 def add_horizontal_line(doc):
     """Izveido horizontālu līniju Word dokumentā, izmantojot krāsotu 1x1 tabulu."""
@@ -18,18 +37,32 @@ def add_horizontal_line(doc):
     
     # Iestatām fona krāsu
     cell = table.cell(0, 0)
-    tcPr = cell._tc.get_or_add_tcPr()
-    shd = parse_xml(r'<w:shd {} w:val="clear" w:color="auto" w:fill="CDBF96"/>'.format(nsdecls('w')))
-    tcPr.append(shd)
+    cell._tc.get_or_add_tcPr().append(copy.deepcopy(_LINE_SHADING))
     
     # Iestatām ļoti mazu augstumu
-    trPr = table.rows[0]._tr.get_or_add_trPr()
-    trHeight = parse_xml(r'<w:trHeight {} w:val="20" w:hRule="exact"/>'.format(nsdecls('w')))
-    trPr.append(trHeight)
+    table.rows[0]._tr.get_or_add_trPr().append(copy.deepcopy(_LINE_HEIGHT))
     
     doc.add_paragraph() # Atstarpe pēc līnijas
 
-def generate_docx(data):
+def add_supplier_runs(p):
+    """Piegādātāja rekvizīti vienā rindkopā (arī build_docx_template veidnei)."""
+    p.add_run(SUPPLIER_NAME).bold = True
+    for line in SUPPLIER_DETAILS:
+        p.add_run(f"\n{line}").italic = True
+
+def add_bank_runs(p):
+    """Bankas rekvizīti vienā rindkopā; konta numurs treknrakstā."""
+    run = p.add_run(BANK_NAME)
+    run.bold = True
+    run.italic = True
+    for line in BANK_DETAILS:
+        p.add_run(f"\n{line}").italic = True
+    p.add_run(f"\n{BANK_ACCOUNT_LABEL} ").italic = True
+    p.add_run(BANK_ACCOUNT).bold = True
+
+def _generate_docx_classic(data):
+    """Dokuments tiek būvēts no tukša Document() (ja veidnes nav)."""
+    inv = invoice_layout(data)
     doc = Document()
     
     # Iestatām noklusējuma fontu uz Montserrat
@@ -63,12 +96,8 @@ def generate_docx(data):
     cell_logo = table.cell(0, 0)
     paragraph = cell_logo.paragraphs[0]
     
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    logo_filename = "BRATUS MELNS LOGO PNG.png"
-    logo_path = os.path.join(current_dir, logo_filename)
-
     try:
-        paragraph.add_run().add_picture(logo_path, width=Cm(3.5))
+        paragraph.add_run().add_picture(logo_stream(), width=Cm(3.5))
     except Exception as e:
         paragraph.add_run("LOGO").bold = True
         
@@ -76,19 +105,13 @@ def generate_docx(data):
     p = cell_info.paragraphs[0]
     p.alignment = WD_ALIGN_PARAGRAPH.RIGHT
     
-    doc_type = data.get('doc_type', 'Pavadzīme')
-    display_doc_type = "Rēķins" if "e-rēķins" in doc_type.lower() else doc_type
-    doc_id = data.get('doc_id', 'BR 0000')
-    date = data.get('date', '')
-    due_date = data.get('due_date', '')
-    
     # Virsraksts 14pt un Treknrakstā
-    run = p.add_run(f"{display_doc_type} Nr. {doc_id}\n")
+    run = p.add_run(f"{inv.title}\n")
     run.bold = True
     run.font.size = Pt(14)
     
-    p.add_run(f"\nDatums: {date}\n")
-    p.add_run(f"Apmaksāt līdz: {due_date}")
+    p.add_run(f"\nDatums: {inv.date}\n")
+    p.add_run(f"Apmaksāt līdz: {inv.due_date}")
     
     doc.add_paragraph()
     add_horizontal_line(doc)
@@ -96,7 +119,7 @@ def generate_docx(data):
     # ==========================================
     # 2. KLIENTS VAI E-RĒĶINA INFO
     # ==========================================
-    if "e-rēķins" in doc_type.lower():
+    if inv.is_e_invoice:
         table = doc.add_table(rows=1, cols=2)
         table.style = 'Table Grid'
         table.autofit = False
@@ -122,19 +145,19 @@ def generate_docx(data):
         cell_recv = table.cell(0, 0)
         p_recv = cell_recv.paragraphs[0]
         p_recv.add_run("Saņēmējs\n\n").bold = True
-        p_recv.add_run(f"{data.get('receiver_name', '')}\n").bold = True
+        p_recv.add_run(f"{inv.receiver_name}\n").bold = True
         p_recv.add_run(f"Reģ. Nr.: ").bold = True
-        p_recv.add_run(f"{data.get('receiver_reg_no', '')}")
+        p_recv.add_run(f"{inv.receiver_reg_no}")
 
         # Customer
         cell_cust = table.cell(0, 1)
         p_cust = cell_cust.paragraphs[0]
         p_cust.add_run("Pasūtītājs\n\n").bold = True
-        p_cust.add_run(f"{data.get('customer_name', '')}\n").bold = True
+        p_cust.add_run(f"{inv.customer_name}\n").bold = True
         p_cust.add_run(f"Reģistrācijas nr.: ").bold = True
-        p_cust.add_run(f"{data.get('customer_reg_no', '')}\n")
+        p_cust.add_run(f"{inv.customer_reg_no}\n")
         p_cust.add_run(f"Juridiskā adrese: ").bold = True
-        p_cust.add_run(f"{data.get('customer_address', '')}")
+        p_cust.add_run(f"{inv.customer_address}")
 
         doc.add_paragraph()
         add_horizontal_line(doc)
@@ -146,10 +169,10 @@ def generate_docx(data):
         p.add_run("KLIENTS").bold = True
 
         p = doc.add_paragraph()
-        p.add_run(data.get('client_name', '')).bold = True
-        p.add_run(f"\nAdrese: {data.get('client_address', '')}").italic = True
-        p.add_run(f"\nReģ. Nr.: {data.get('client_reg_no', '')}").italic = True
-        p.add_run(f"\nPVN Nr.: {data.get('client_vat_no', '')}").italic = True
+        p.add_run(inv.client_name).bold = True
+        p.add_run(f"\nAdrese: {inv.client_address}").italic = True
+        p.add_run(f"\nReģ. Nr.: {inv.client_reg_no}").italic = True
+        p.add_run(f"\nPVN Nr.: {inv.client_vat_no}").italic = True
 
         doc.add_paragraph()
         add_horizontal_line(doc)
@@ -165,22 +188,12 @@ def generate_docx(data):
     # Sender
     cell = table.cell(0, 0)
     p = cell.paragraphs[0]
-    p.add_run("SIA Bratus").bold = True
-    p.add_run("\nAdrese: Ķekavas nov., Ķekava,").italic = True
-    p.add_run("\nDārzenieku iela 42, LV-2123").italic = True
-    p.add_run("\nReģ. Nr.: 40203628316").italic = True
-    p.add_run("\nPVN Nr.: LV40203628316").italic = True
-    p.add_run("\nTālrunis: +371 24424434").italic = True
+    add_supplier_runs(p)
     
     # Bank
     cell = table.cell(0, 1)
     p = cell.paragraphs[0]
-    run_bank = p.add_run("AS Swedbank")
-    run_bank.bold = True
-    run_bank.italic = True
-    p.add_run("\nSWIFT/BIC: HABALV22").italic = True
-    p.add_run("\nBankas konta numurs: ").italic = True
-    p.add_run("LV64HABA0551060367591").bold = True
+    add_bank_runs(p)
     
     doc.add_paragraph()
     
@@ -188,8 +201,6 @@ def generate_docx(data):
     # 4. PREČU TABULA
     # ==========================================
     headers = ["NOSAUKUMS", "Mērvienība", "DAUDZUMS", "CENA (EUR)", "KOPĀ (EUR)"]
-    items = data.get('items', [])
-    
     table = doc.add_table(rows=1, cols=5)
     table.style = 'Table Grid'
     
@@ -202,103 +213,58 @@ def generate_docx(data):
     hdr_cells = table.rows[0].cells
     for i, h in enumerate(headers):
         hdr_cells[i].text = h
-        tcPr = hdr_cells[i]._element.tcPr
-        shd = parse_xml(r'<w:shd {} w:fill="CDBF96"/>'.format(nsdecls('w')))
-        tcPr.append(shd)
+        hdr_cells[i]._element.tcPr.append(copy.deepcopy(_HEADER_SHADING))
         p = hdr_cells[i].paragraphs[0]
         run = p.runs[0]
         run.bold = True
         run.font.color.rgb = RGBColor(255, 255, 255)
         p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            
-    for item in items:
-        row_cells = table.add_row().cells
-        seq_num = item.get('seq', '')
-        row_cells[0].text = f"{seq_num}. {item['name']}" if seq_num else item['name']
-        row_cells[1].text = item['unit']
-        row_cells[2].text = str(item['qty'])
-        row_cells[3].text = str(item['price'])
-        row_cells[4].text = str(item['total'])
-        
-        row_cells[1].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
-        row_cells[2].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
-        row_cells[3].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
-        row_cells[4].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
+
+    # Viena prototipa rinda ar vietturiem, pārējās tiek kopētas no tās
+    proto_cells = table.add_row().cells
+    for i, field in enumerate(_ITEM_FIELDS):
+        proto_cells[i].text = "{{" + field + "}}"
+    for i, alignment in ((1, WD_ALIGN_PARAGRAPH.CENTER), (2, WD_ALIGN_PARAGRAPH.CENTER),
+                         (3, WD_ALIGN_PARAGRAPH.RIGHT), (4, WD_ALIGN_PARAGRAPH.RIGHT)):
+        proto_cells[i].paragraphs[0].alignment = alignment
+    proto = table.rows[-1]._tr
+    _insert_item_rows(proto, _ItemRowPrototype(proto), inv.items)
         
     doc.add_paragraph()
     
     # ==========================================
     # 5. KOPSUMMAS
     # ==========================================
-    subtotal = data.get('subtotal', '0.00')
-    vat = data.get('vat', '0.00')
-    total = data.get('total', '0.00')
-    raw_discount_eur = data.get('raw_discount_eur', 0.0)
-    
-    is_advance_doc = ("avansa" in doc_type.lower())
-    
-    num_rows = 5 if raw_discount_eur > 0 else 3
-
     # Veidojam tabulu BEZ apmalēm (Table Normal stils to nodrošina automātiski)
-    table = doc.add_table(rows=num_rows, cols=3)
+    table = doc.add_table(rows=len(inv.totals), cols=3)
     table.autofit = False
     table.columns[0].width = Cm(8.5)
     table.columns[1].width = Cm(5.5)
     table.columns[2].width = Cm(3)
 
-    def set_total_row(row_idx, label, value, label_bold, val_bold):
-        cell_lbl = table.cell(row_idx, 1)
-        cell_val = table.cell(row_idx, 2)
-        p = cell_lbl.paragraphs[0]
+    for row_idx, (label, value, label_bold, val_bold) in enumerate(inv.totals):
+        p = table.cell(row_idx, 1).paragraphs[0]
         p.add_run(label).bold = label_bold
         p.alignment = WD_ALIGN_PARAGRAPH.RIGHT
         
-        p = cell_val.paragraphs[0]
-        p.add_run(f"{value} €").bold = val_bold
+        p = table.cell(row_idx, 2).paragraphs[0]
+        p.add_run(value).bold = val_bold
         p.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-
-    if is_advance_doc:
-        if raw_discount_eur > 0:
-            set_total_row(0, "KOPĀ (bez PVN un atlaides)", subtotal, False, False)
-            set_total_row(1, f"Atlaides apjoms ({data.get('discount_percent', 0):g}%)", f"-{data.get('discount_eur', '0.00')}", False, False)
-            set_total_row(2, "Kopā ar atlaidi (bez PVN)", data.get('subtotal_after_discount', '0.00'), False, False)
-            set_total_row(3, "PVN", vat, False, False)
-            set_total_row(4, "KOPUMĀ APMAKSAI", total, False, False)
-        else:
-            set_total_row(0, "KOPĀ", subtotal, False, False)
-            set_total_row(1, "PVN", vat, False, False)
-            set_total_row(2, "Kopumā", total, False, False)
-    else:
-        if raw_discount_eur > 0:
-            set_total_row(0, "KOPĀ (bez PVN un atlaides)", subtotal, True, False)
-            set_total_row(1, f"Atlaides apjoms ({data.get('discount_percent', 0):g}%)", f"-{data.get('discount_eur', '0.00')}", True, False)
-            set_total_row(2, "Kopā ar atlaidi (bez PVN)", data.get('subtotal_after_discount', '0.00'), True, False)
-            set_total_row(3, "PVN", vat, True, False)
-            set_total_row(4, "KOPUMĀ APMAKSAI", total, True, True)
-        else:
-            set_total_row(0, "KOPĀ", subtotal, True, False)
-            set_total_row(1, "PVN", vat, True, False)
-            set_total_row(2, "Kopumā", total, True, True)
     
     # ==========================================
     # 6. SUMMA VĀRDIEM UN AVANSS
     # ==========================================
-    if is_advance_doc:
+    if inv.advance_text:
         doc.add_paragraph()
-        raw_advance = data.get('raw_advance', 0.0)
-        formatted_advance = fmt_curr(raw_advance)
-        percent_val = int(round(data.get('advance_percent', 0)))
-        
         p = doc.add_paragraph()
         p.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-        p.add_run(f"APMAKSĀJAMAIS AVANSS ({percent_val}%): {formatted_advance} €").bold = True
+        p.add_run(inv.advance_text).bold = True
 
     doc.add_paragraph()
     
     p = doc.add_paragraph()
     p.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-    prefix = "Vārdiem: "
-    p.add_run(f"{prefix}{data.get('amount_words', '')}").italic = True
+    p.add_run(inv.words_text).italic = True
     
     doc.add_paragraph()
     add_horizontal_line(doc)
@@ -306,27 +272,14 @@ def generate_docx(data):
     # ==========================================
     # 7. PARAKSTI UN PAPILDINFO
     # ==========================================
-    comments = data.get('comments', '').strip()
-    if comments:
+    if inv.comments:
         p_info = doc.add_paragraph()
         p_info.add_run("Papildus informācija:").bold = True
-        p_info.add_run(f"\n{comments}")
+        p_info.add_run(f"\n{inv.comments}")
     
     doc.add_paragraph()
     doc.add_paragraph()
     
-    signatory = data.get('signatory', 'SIA Bratus valdes loceklis Adrians Stankevičs')
-    
-    if "pavadzīme" in doc_type.lower():
-        prepared_text = f"Pavadzīmi sagatavoja: "
-        received_text = "Pavadzīmi saņēma:"
-    elif "avansa rēķins" in doc_type.lower():
-        prepared_text = f"Avansa rēķinu sagatavoja: "
-        received_text = "Avansa rēķinu saņēma:"
-    else:
-        prepared_text = f"Rēķinu sagatavoja: "
-        received_text = "Rēķinu saņēma:"
-        
     table = doc.add_table(rows=2, cols=2)
     table.autofit = False
     table.columns[0].width = Cm(10)
@@ -334,8 +287,8 @@ def generate_docx(data):
     
     cell = table.cell(0, 0)
     p = cell.paragraphs[0]
-    p.add_run(prepared_text)
-    p.add_run(f"{signatory}").italic = True
+    p.add_run(inv.prepared_label)
+    p.add_run(inv.signatory).italic = True
     
     cell = table.cell(0, 1)
     p = cell.paragraphs[0]
@@ -344,7 +297,7 @@ def generate_docx(data):
     
     cell = table.cell(1, 0)
     p = cell.paragraphs[0]
-    p.add_run(received_text)
+    p.add_run(inv.received_label)
     
     cell = table.cell(1, 1)
     p = cell.paragraphs[0]
@@ -355,3 +308,222 @@ def generate_docx(data):
     doc.save(buffer)
     buffer.seek(0)
     return buffer
+
+
+# ==========================================
+# Preču rindas
+# ==========================================
+# Rindas netiek veidotas ar table.add_row() un šūnu īpašībām (katra ir
+# vairāki python-docx objekti un XML meklējumi). Prototipa rinda tiek
+# vienreiz pārvērsta XML teksta veidnē; visu pozīciju rindas tiek salīmētas
+# vienā virknē, parsētas vienā piegājienā un pārvietotas tabulā.
+# Namespace deklarācijas ir tikai ietverošajā elementā, nevis katrā rindā —
+# citādi lxml katras rindas pārvietošana un dokumenta izmešana ir ļoti lēna.
+
+_BR_IN_TEXT = '</w:t><w:br/><w:t xml:space="preserve">'
+
+def _xml_text(value):
+    """Vērtība <w:t> saturam; rindu pārnesumi kļūst par <w:br/>."""
+    return xml_escape(str(value)).replace("\n", _BR_IN_TEXT)
+
+
+def _set_text(t, text):
+    """Ieraksta tekstu <w:t>; rindu pārnesumi kļūst par <w:br/> tajā pašā run."""
+    parts = text.split("\n")
+    t.text = parts[0]
+    t.set(qn('xml:space'), 'preserve')
+    anchor = t
+    for part in parts[1:]:
+        br = t.makeelement(qn('w:br'), {})
+        anchor.addnext(br)
+        new_t = t.makeelement(qn('w:t'), {qn('xml:space'): 'preserve'})
+        new_t.text = part
+        br.addnext(new_t)
+        anchor = new_t
+
+
+class _ItemRowPrototype:
+    """Preču rindas <w:tr> ar {{name}}, {{unit}}, ... vietturiem <w:t> elementos."""
+
+    def __init__(self, tr):
+        proto = copy.deepcopy(tr)
+        for t in proto.iter(qn('w:t')):
+            if t.text and _PLACEHOLDER.search(t.text):
+                t.set(qn('xml:space'), 'preserve')
+        etree.cleanup_namespaces(proto)
+        xml = etree.tostring(proto, encoding='unicode')
+        open_tag_end = xml.index('>')
+        xml = re.sub(r'\sxmlns(:\w+)?="[^"]*"', '', xml[:open_tag_end]) + xml[open_tag_end:]
+        decls = " ".join(f'xmlns:{prefix}="{uri}"' for prefix, uri in proto.nsmap.items())
+        self._open = f'<w:tbl {decls}>'
+        # Pāra indeksi — XML teksts, nepāra — lauku nosaukumi
+        self._parts = _PLACEHOLDER.split(xml)
+
+    def _row_xml(self, item):
+        values = dict(zip(_ITEM_FIELDS, item))
+        parts = self._parts[:]
+        for i in range(1, len(parts), 2):
+            parts[i] = _xml_text(values.get(parts[i], ''))
+        return "".join(parts)
+
+    def rows(self, items):
+        """Visu pozīciju <w:tr> elementi (parsēti vienā piegājienā); items — InvoiceLayout.items."""
+        if not items:
+            return []
+        xml = self._open + "".join(self._row_xml(item) for item in items) + '</w:tbl>'
+        return list(parse_xml(xml))
+
+
+def _insert_item_rows(proto_tr, prototype, items):
+    """Aizvieto prototipa rindu tabulā ar aizpildītām rindām katrai pozīcijai."""
+    anchor = proto_tr
+    for row in prototype.rows(items):
+        anchor.addnext(row)
+        anchor = row
+    proto_tr.getparent().remove(proto_tr)
+
+
+# ==========================================
+# Ģenerēšana no veidnes
+# ==========================================
+# Veidne tiek ielādēta vienreiz katrā pavedienā (Document nav drošs vairākiem
+# pavedieniem). Katram rēķinam tiek nokopēts tikai dokumenta XML, aizpildīti
+# vietturi un preču rindas, un dokuments saglabāts — stili, logo attēls un
+# pārējās pakotnes daļas paliek no ielādētās veidnes.
+
+_BLOCK_MARKER = re.compile(r"^\{\{([#/])(\w+)\}\}$")
+
+_local = threading.local()
+
+
+def _template():
+    """(Document, nemainīgā <w:document> kopija, preču rindas prototips) šim pavedienam vai None."""
+    cached = getattr(_local, 'template', None)
+    if cached is None:
+        if not os.path.exists(TEMPLATE_PATH):
+            return None
+        doc = Document(TEMPLATE_PATH)
+        root = copy.deepcopy(doc.element)
+        proto = _item_prototype(root.body)
+        row_prototype = _ItemRowPrototype(proto) if proto is not None else None
+        cached = _local.template = (doc, root, row_prototype)
+    return cached
+
+
+def _template_values(inv):
+    return {
+        'title': inv.title,
+        'date': inv.date,
+        'due_date': inv.due_date,
+        'receiver_name': inv.receiver_name,
+        'receiver_reg_no': inv.receiver_reg_no,
+        'customer_name': inv.customer_name,
+        'customer_reg_no': inv.customer_reg_no,
+        'customer_address': inv.customer_address,
+        'client_name': inv.client_name,
+        'client_address': inv.client_address,
+        'client_reg_no': inv.client_reg_no,
+        'client_vat_no': inv.client_vat_no,
+        'subtotal': inv.subtotal,
+        'vat': inv.vat,
+        'total': inv.total,
+        'discount_percent': inv.discount_percent,
+        'discount_eur': inv.discount_eur,
+        'subtotal_after_discount': inv.subtotal_after_discount,
+        'advance_percent': inv.advance_percent,
+        'advance': inv.advance,
+        'amount_words': inv.amount_words,
+        'comments': inv.comments,
+        'signatory': inv.signatory,
+        'prepared_label': inv.prepared_label,
+        'received_label': inv.received_label,
+    }
+
+
+def _template_blocks(inv):
+    """Kuri {{#bloki}} paliek dokumentā."""
+    advance, discount = inv.is_advance, inv.has_discount
+    return {
+        'e_invoice': inv.is_e_invoice,
+        'client': not inv.is_e_invoice,
+        'totals_discount': not advance and discount,
+        'totals': not advance and not discount,
+        'advance_totals_discount': advance and discount,
+        'advance_totals': advance and not discount,
+        'advance': advance,
+        'comments': bool(inv.comments),
+    }
+
+
+def _fill(element, values):
+    for t in list(element.iter(qn('w:t'))):
+        if t.text and '{{' in t.text:
+            _set_text(t, _PLACEHOLDER.sub(lambda m: str(values.get(m.group(1), '')), t.text))
+
+
+def _paragraph_text(p):
+    return "".join(t.text or '' for t in p.iter(qn('w:t'))).strip()
+
+
+def _apply_blocks(body, blocks):
+    """Izņem bloku marķierus un blokus, kuriem nosacījums nav izpildīts."""
+    removing = []
+    for child in list(body):
+        marker = _BLOCK_MARKER.match(_paragraph_text(child)) if child.tag == qn('w:p') else None
+        if marker:
+            kind, name = marker.groups()
+            if kind == '#':
+                removing.append(not blocks.get(name, False))
+            elif removing:
+                removing.pop()
+            body.remove(child)
+        elif any(removing):
+            body.remove(child)
+
+
+def _item_prototype(body):
+    """Preču tabulas rinda ar {{name}} vietturi."""
+    for t in body.iter(qn('w:t')):
+        if t.text and "name" in _PLACEHOLDER.findall(t.text):
+            return next(t.iterancestors(qn('w:tr')))
+    return None
+
+
+def _generate_docx_template(inv, template):
+    doc, proto_root, row_prototype = template
+    # Tiek nomainīts viss <w:document> elements, nevis tikai <w:body>: izņemot
+    # lielu apakškoku no lxml dokumenta, tas tiek pārvietots mezglu pa mezglam,
+    # bet vesels iepriekšējā rēķina dokuments tiek vienkārši atbrīvots.
+    root = copy.deepcopy(proto_root)
+    doc.part._element = root
+    body = root.body
+    values = _template_values(inv)
+    _apply_blocks(body, _template_blocks(inv))
+
+    # Prototipa rindu izņemam pirms vietturu aizpildīšanas, lai pozīciju
+    # tekstā esošas {{...}} virknes netiktu aizstātas
+    proto = _item_prototype(body)
+    if proto is not None:
+        placeholder = proto.makeelement(qn('w:tr'), {})
+        proto.addprevious(placeholder)
+        proto.getparent().remove(proto)
+    _fill(body, values)
+    if proto is not None:
+        _insert_item_rows(placeholder, row_prototype, inv.items)
+
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def generate_docx(data):
+    """
+    Ģenerē DOCX un atgriež BytesIO (no veidnes, ja tā ir pieejama).
+    `data` — rēķina vārdnīca vai InvoiceLayout.
+    """
+    inv = invoice_layout(data)
+    template = _template()
+    if template is None:
+        return _generate_docx_classic(inv)
+    return _generate_docx_template(inv, template)
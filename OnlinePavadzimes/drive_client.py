@@ -0,0 +1,143 @@
+"""
+drive_client.py — viens, ilgdzīvojošs Google Drive klients procesam.
+
+Agrāk katrs get_drive_service() izsaukums lasīja token.json un no jauna
+veidoja 'drive' v3 servisu (discovery dokumenta parsēšana + jauns TLS
+savienojums). Šeit serviss tiek izveidots vienreiz un pārbūvēts tikai tad,
+ja token.json ir mainījies (jauna autorizācija vai atslēgšanās).
+
+  * discovery dokuments tiek ņemts no googleapiclient iebūvētās kopijas
+    (static_discovery) — bez tīkla pieprasījuma;
+  * piekļuves tokens tiek atjaunots uz vietas un saglabāts token.json;
+  * katram pavedienam ir savs httplib2 savienojums (httplib2.Http nav
+    drošs vairākiem pavedieniem), kas tiek atkārtoti izmantots.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import httplib2
+import google_auth_httplib2
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+from googleapiclient.http import MediaIoBaseUpload
+
+HTTP_TIMEOUT = 60
+
+
+class DriveClient:
+    def __init__(self, token_file, scopes):
+        self.token_file = token_file
+        self.scopes = scopes
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._creds = None
+        self._service = None
+        self._token_stamp = None
+
+    def _stamp(self):
+        try:
+            st = os.stat(self.token_file)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def _load_credentials(self):
+        try:
+            return Credentials.from_authorized_user_file(self.token_file, self.scopes)
+        except Exception:
+            # Bojāts token.json — dzēšam, lai lietotājs var autorizēties no jauna
+            if os.path.exists(self.token_file):
+                os.remove(self.token_file)
+            return None
+
+    def _refresh_if_needed(self):
+        creds = self._creds
+        if creds and creds.expired and creds.refresh_token:
+            try:
+                creds.refresh(Request())
+                with open(self.token_file, 'w') as f:
+                    f.write(creds.to_json())
+                self._token_stamp = self._stamp()
+            except Exception:
+                if os.path.exists(self.token_file):
+                    os.remove(self.token_file)
+                self.invalidate()
+
+    def invalidate(self):
+        """Aizmirst kešoto servisu un akreditācijas datus."""
+        with self._lock:
+            self._creds = None
+            self._service = None
+            self._token_stamp = None
+
+    def http(self):
+        """Pavediena savs autorizēts HTTP savienojums (tiek atkārtoti izmantots)."""
+        creds = self._creds
+        local_http = getattr(self._local, "http", None)
+        if local_http is None or local_http.credentials is not creds:
+            local_http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+            self._local.http = local_http
+        return local_http
+
+    def get_service(self):
+        """Atgriež Drive servisu vai None, ja nav derīgas autorizācijas."""
+        with self._lock:
+            stamp = self._stamp()
+            if stamp is None:
+                self.invalidate()
+                return None
+            if stamp != self._token_stamp or self._creds is None:
+                self._creds = self._load_credentials()
+                self._service = None
+                self._token_stamp = self._stamp()
+            self._refresh_if_needed()
+            if not (self._creds and self._creds.valid):
+                return None
+            if self._service is None:
+                self._service = build('drive', 'v3', http=self.http(), static_discovery=True,
+                                      cache_discovery=False)
+            return self._service
+
+    def upload(self, file_buffer, filename, mime_type, folder_id):
+        """Augšupielādē failu mapē `folder_id`, atgriež faila ID. Kļūdas gadījumā izmet izņēmumu."""
+        service = self.get_service()
+        if not service:
+            raise RuntimeError("Google Drive nav pieslēgts")
+        file_metadata = {'name': filename, 'parents': [folder_id]}
+        file_buffer.seek(0)
+        media = MediaIoBaseUpload(file_buffer, mimetype=mime_type, resumable=True)
+        request = service.files().create(body=file_metadata, media_body=media, fields='id')
+        created = request.execute(http=self.http())
+        file_buffer.seek(0)
+        return created.get('id')
+
+    def upload_many(self, files, folder_id):
+        """
+        Augšupielādē vairākus failus [(buferis, nosaukums, mime), ...] vienlaikus
+        (katrs savā pavedienā ar savu savienojumu). Atgriež faila ID sarakstu;
+        ja kāds neizdodas, izmet pirmo kļūdu.
+        """
+        if len(files) <= 1:
+            return [self.upload(buf, name, mime, folder_id) for buf, name, mime in files]
+        if not self.get_service():
+            raise RuntimeError("Google Drive nav pieslēgts")
+        with ThreadPoolExecutor(max_workers=len(files)) as executor:
+            futures = [executor.submit(self.upload, buf, name, mime, folder_id) for buf, name, mime in files]
+            return [f.result() for f in futures]
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_drive_client(token_file, scopes):
+    """Procesa kopīgais klients konkrētam token.json failam."""
+    key = (os.path.abspath(token_file), tuple(scopes))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = DriveClient(token_file, scopes)
+        return client
@@ -0,0 +1,244 @@
+"""
+drive_queue.py — Google Drive augšupielāžu fona rinda.
+
+HTTP pieprasījums tikai ieliek gatavo failu SQLite rindā un uzreiz atbild
+lietotājam; fona pavediens augšupielādē failus Drive ar atkārtojumiem
+(eksponenciāls backoff). Rinda glabājas diskā, tāpēc servera restarts
+neaizmirst neaugšupielādētos failus.
+
+Darbi tiek identificēti pēc satura hash (faila nosaukums, mime un baiti):
+ja tāds pats fails jau ir rindā, tiek augšupielādēts vai ir augšupielādēts,
+enqueue atgriež esošā darba ID un jaunu darbu neveido. Atkārtoti rindā
+tiek likts tikai fails, kura iepriekšējā augšupielāde galīgi neizdevās.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import io
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+QUEUE_DB = os.environ.get("DRIVE_QUEUE_DB", os.path.join(CURRENT_DIR, "drive_queue.db"))
+
+MAX_ATTEMPTS = 6
+BACKOFF_BASE = 2.0      # sekundes pirms 1. atkārtojuma
+BACKOFF_MAX = 300.0     # maksimālā pauze starp mēģinājumiem
+LEASE_SECONDS = 600     # cik ilgi darbs skaitās "aizņemts" (ja process nomirst)
+POLL_INTERVAL = 1.0
+
+STATUS_PENDING = "pending"
+STATUS_UPLOADING = "uploading"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    filename        TEXT NOT NULL,
+    mime_type       TEXT NOT NULL,
+    payload         BLOB,
+    status          TEXT NOT NULL,
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    lease_until     REAL,
+    last_error      TEXT,
+    file_id         TEXT,
+    content_hash    TEXT,
+    created_at      REAL NOT NULL,
+    updated_at      REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_uploads_due ON uploads (status, next_attempt_at);
+"""
+
+# Rindām, kas izveidotas pirms content_hash kolonnas
+_MIGRATIONS = {
+    "content_hash": "ALTER TABLE uploads ADD COLUMN content_hash TEXT",
+}
+_HASH_INDEX = "CREATE INDEX IF NOT EXISTS idx_uploads_hash ON uploads (content_hash)"
+
+
+def backoff_delay(attempts, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """Pauze pirms nākamā mēģinājuma: base, 2*base, 4*base ... līdz cap."""
+    return min(cap, base * (2 ** max(attempts - 1, 0)))
+
+
+def content_hash(data, filename, mime_type):
+    """Augšupielādes atslēga: vienāds fails ar vienādu nosaukumu => vienāds hash."""
+    h = hashlib.sha256(f"{filename}\0{mime_type}\0".encode("utf-8"))
+    h.update(data)
+    return h.hexdigest()
+
+
+class DriveUploadQueue:
+    """
+    Noturīga augšupielāžu rinda.
+
+    `uploader(file_buffer, filename, mime_type)` veic pašu augšupielādi un
+    atgriež Drive faila ID; kļūdas gadījumā tam jāizmet izņēmums.
+    """
+
+    def __init__(self, uploader, db_path=QUEUE_DB, max_attempts=MAX_ATTEMPTS,
+                 backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX):
+        self.uploader = uploader
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(uploads)")}
+            for column, ddl in _MIGRATIONS.items():
+                if column not in columns:
+                    conn.execute(ddl)
+            conn.execute(_HASH_INDEX)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # --- Rindas API ---
+
+    def _insert_once(self, conn, data, filename, mime_type, now):
+        """Atgriež (darba ID, vai jauns); esošu darbu ar tādu pašu saturu neatkārto."""
+        if hasattr(data, "getvalue"):
+            data = data.getvalue()
+        key = content_hash(data, filename, mime_type)
+        row = conn.execute(
+            "SELECT id FROM uploads WHERE content_hash = ? AND status != ? ORDER BY id DESC LIMIT 1",
+            (key, STATUS_FAILED)
+        ).fetchone()
+        if row:
+            return row["id"], False
+        cur = conn.execute(
+            "INSERT INTO uploads (filename, mime_type, payload, status, next_attempt_at, content_hash, "
+            "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (filename, mime_type, sqlite3.Binary(data), STATUS_PENDING, now, key, now, now)
+        )
+        return cur.lastrowid, True
+
+    def enqueue(self, data, filename, mime_type):
+        """Ieliek failu rindā (ja tas tur vēl nav) un atgriež darba ID."""
+        return self.enqueue_many([(data, filename, mime_type)])[0]
+
+    def enqueue_many(self, files):
+        """Ieliek vairākus failus [(dati, nosaukums, mime), ...] vienā transakcijā; atgriež darbu ID."""
+        now = time.time()
+        job_ids, added = [], False
+        with self._connect() as conn:
+            # Pārbaude un ievietošana vienā rakstīšanas transakcijā, lai vienlaicīgi
+            # pieprasījumi neieliktu vienu failu divreiz
+            conn.execute("BEGIN IMMEDIATE")
+            for data, filename, mime_type in files:
+                job_id, new = self._insert_once(conn, data, filename, mime_type, now)
+                job_ids.append(job_id)
+                added = added or new
+        if added:
+            self._wakeup.set()
+        return job_ids
+
+    def status(self, job_id):
+        """Atgriež darba statusu kā dict vai None, ja darbs nav atrasts."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, filename, status, attempts, next_attempt_at, last_error, file_id, created_at, updated_at "
+                "FROM uploads WHERE id = ?", (job_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def stats(self):
+        """Darbu skaits pa statusiem."""
+        counts = {STATUS_PENDING: 0, STATUS_UPLOADING: 0, STATUS_DONE: 0, STATUS_FAILED: 0}
+        with self._connect() as conn:
+            for row in conn.execute("SELECT status, COUNT(*) AS n FROM uploads GROUP BY status"):
+                counts[row["status"]] = row["n"]
+        return counts
+
+    # --- Apstrāde ---
+
+    def _claim_next(self):
+        """Atomāri paņem vienu izpildei gatavu darbu (drošs arī vairākiem procesiem)."""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id FROM uploads "
+                "WHERE (status = ? AND next_attempt_at <= ?) OR (status = ? AND lease_until < ?) "
+                "ORDER BY next_attempt_at LIMIT 1",
+                (STATUS_PENDING, now, STATUS_UPLOADING, now)
+            ).fetchone()
+            if not row:
+                return None
+            cur = conn.execute(
+                "UPDATE uploads SET status = ?, lease_until = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE id = ? AND (status = ? OR (status = ? AND lease_until < ?))",
+                (STATUS_UPLOADING, now + LEASE_SECONDS, now, row["id"],
+                 STATUS_PENDING, STATUS_UPLOADING, now)
+            )
+            if cur.rowcount != 1:
+                return None
+            return conn.execute("SELECT * FROM uploads WHERE id = ?", (row["id"],)).fetchone()
+
+    def process_once(self):
+        """Apstrādā vienu darbu. Atgriež True, ja kaut kas tika apstrādāts."""
+        job = self._claim_next()
+        if job is None:
+            return False
+        now = time.time()
+        try:
+            file_id = self.uploader(io.BytesIO(job["payload"]), job["filename"], job["mime_type"])
+        except Exception as e:
+            attempts = job["attempts"]
+            if attempts >= self.max_attempts:
+                new_status, next_at = STATUS_FAILED, now
+            else:
+                new_status = STATUS_PENDING
+                next_at = now + backoff_delay(attempts, self.backoff_base, self.backoff_max)
+            print(f"Drive Error ({job['filename']}, mēģinājums {attempts}): {e}")
+            with self._connect() as conn:
+                # Galīgi neizdevušos failu saturu vairs neglabājam (to var ielikt rindā no jauna)
+                conn.execute(
+                    "UPDATE uploads SET status = ?, next_attempt_at = ?, lease_until = NULL, "
+                    "payload = CASE WHEN ? THEN NULL ELSE payload END, last_error = ?, updated_at = ? WHERE id = ?",
+                    (new_status, next_at, new_status == STATUS_FAILED, str(e), now, job["id"])
+                )
+            return True
+        # Pēc veiksmīgas augšupielādes saturu vairs neglabājam
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE uploads SET status = ?, payload = NULL, lease_until = NULL, last_error = NULL, "
+                "file_id = ?, updated_at = ? WHERE id = ?",
+                (STATUS_DONE, str(file_id) if file_id else None, now, job["id"])
+            )
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                worked = self.process_once()
+            except Exception as e:
+                print(f"Drive rindas kļūda: {e}")
+                worked = False
+            if not worked:
+                self._wakeup.wait(POLL_INTERVAL)
+                self._wakeup.clear()
+
+    def start(self):
+        """Palaiž fona pavedienu (atkārtots vai vienlaicīgs izsaukums neko nedara)."""
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="drive-upload-worker", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
@@ -0,0 +1,426 @@
+"""
+github_sync.py — vēstures un sagatavju CSV nosūtīšana uz GitHub fonā.
+
+Agrāk katra saglabāšana (lejupielāde, dzēšana vēsturē, sagataves) izsauca
+contents API: GET faila sha + PUT ar visu CSV — divi bloķējoši pieprasījumi
+un viens commit katram failam. Šeit izmaiņas tikai tiek ieplānotas:
+fona pavediens nogaida `debounce` sekundes bez jaunām izmaiņām un visus
+gaidošos failus nosūta vienā commit caur Git Data API
+(blobs → tree → commit → ref).
+
+  * zara pēdējā commit un koka sha tiek kešoti — pēc pirmā commit pirms
+    rakstīšanas nav vajadzīgs neviens GET;
+  * faila saturs var būt funkcija — tā tiek izsaukta tikai nosūtīšanas
+    brīdī, tāpēc vairākas ātras saglabāšanas nosūta tikai jaunāko stāvokli;
+  * faili, kuru saturs kopš pēdējā commit nav mainījies, netiek sūtīti;
+  * ja zars GitHub ir pavirzījies (ref atjaunināšana neizdodas ar 422 —
+    optimistiskā bloķēšana), tiek nolasīts jaunais zara gals un commit
+    izveidots no jauna. Failiem ar `merge` funkciju (vēstures daļas) attālā
+    versija, ja tā kopš mūsu bāzes (pēdējās nolasītās vai nosūtītās
+    versijas) mainīta, tiek trīspusēji apvienota ar mūsējo;
+  * neveiksmes gadījumā izmaiņas paliek rindā un tiek atkārtotas ar
+    eksponenciālu backoff.
+
+fetch_file() nolasa failu ar raw media type (bez JSON/base64 apvalka un bez
+contents API 1 MB ierobežojuma) un sūta If-None-Match ar iepriekš saņemto
+ETag — ja fails GitHub nav mainījies, atbilde ir tukšs 304 un tiek
+izmantota lokālā kopija. Ceļi, kas beidzas ar ".gz", tiek glabāti GitHub
+gzip saspiesti (GITHUB_HISTORY_GZIP=1 to ieslēdz vēstures failiem).
+
+GITHUB_API_URL ļauj izmantot citu API adresi (GitHub Enterprise vai lokālu
+testa serveri).
+"""
+
+import atexit
+import base64
+import gzip
+import hashlib
+import os
+import threading
+import time
+
+import requests
+
+from drive_queue import backoff_delay
+
+GITHUB_API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+DEBOUNCE_SECONDS = float(os.environ.get("GITHUB_SYNC_DEBOUNCE", "3"))
+MAX_DELAY_SECONDS = float(os.environ.get("GITHUB_SYNC_MAX_DELAY", "30"))
+GITHUB_HISTORY_GZIP = os.environ.get("GITHUB_HISTORY_GZIP", "0") == "1"
+HTTP_TIMEOUT = 15
+REF_RETRIES = 5
+
+FETCH_OK = "ok"
+FETCH_NOT_MODIFIED = "not_modified"
+FETCH_MISSING = "missing"
+FETCH_ERROR = "error"
+
+
+class GithubSyncError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def git_blob_sha(data):
+    """Git blob sha (tāds pats kā `git hash-object`)."""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def history_path(path):
+    """GitHub ceļš vēstures failam (ar ".gz", ja ieslēgts GITHUB_HISTORY_GZIP)."""
+    return path + ".gz" if GITHUB_HISTORY_GZIP and not path.endswith(".gz") else path
+
+
+def _raw(content):
+    if callable(content):
+        content = content()
+    if content is None:
+        return None             # faila dzēšana
+    return content.encode("utf-8") if isinstance(content, str) else bytes(content)
+
+
+def _encode(path, data):
+    if data is None:
+        return None
+    # mtime=0 — vienāds saturs dod vienādu blob sha (nemainīti faili netiek sūtīti)
+    return gzip.compress(data, mtime=0) if path.endswith(".gz") else data
+
+
+def _decode(path, data):
+    return gzip.decompress(data) if path.endswith(".gz") else data
+
+
+# Bāzes versijas trīspusējai apvienošanai: pēdējā šajā procesā nolasītā
+# (fetch_file) vai nosūtītā faila versija.
+_bases = {}                 # (api, repo, zars, ceļš) -> (blob sha GitHub, saturs bez gzip)
+_bases_lock = threading.Lock()
+
+
+def _set_base(key, sha, raw):
+    with _bases_lock:
+        _bases[key] = (sha, raw)
+
+
+def _get_base(key):
+    with _bases_lock:
+        return _bases.get(key, ("", None))
+
+
+class GithubSync:
+    """
+    Viena repozitorija zara write-behind sinhronizācija.
+
+    `schedule(path, content, message, merge)` ieplāno faila saturu (teksts,
+    baiti vai funkcija, kas tos atgriež; None — izdzēst failu); `flush()`
+    nosūta gaidošās izmaiņas uzreiz un atgriež (izdevās, ziņojums).
+
+    `merge(base, ours, theirs)` tiek izsaukts, ja fails GitHub mainīts kopš
+    mūsu bāzes versijas (baiti bez gzip; None — nav zināma / faila nav) un
+    atgriež nosūtāmo saturu. Vienā commit apvienošanas funkcijas tiek
+    izsauktas failu ieplānošanas secībā.
+    """
+
+    def __init__(self, repo, token, branch="main", api_url=GITHUB_API_URL,
+                 debounce=DEBOUNCE_SECONDS, max_delay=MAX_DELAY_SECONDS):
+        self.repo = repo
+        self.branch = branch
+        self.api_url = api_url.rstrip("/")
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._session = requests.Session()
+        self._session.headers.update({
+            "Authorization": f"token {token}",
+            "Accept": "application/vnd.github.v3+json",
+        })
+        self._cond = threading.Condition()
+        self._push_lock = threading.Lock()
+        self._pending = {}          # ceļš -> (saturs, [commit ziņojumi], merge)
+        self._first_pending = None
+        self._deadline = None
+        self._failures = 0
+        self._thread = None
+        self._head = None           # (commit sha, koka sha)
+        self.last_error = None
+        self.last_commit = None
+
+    # --- Publiskais API ---
+
+    def schedule(self, path, content, message, merge=None):
+        """Ieplāno faila nosūtīšanu; ātri secīgi izsaukumi tiek apvienoti vienā commit."""
+        with self._cond:
+            messages = self._pending.pop(path)[1] if path in self._pending else []
+            if message and message not in messages:
+                messages = messages + [message]
+            self._pending[path] = (content, messages, merge)
+            now = time.monotonic()
+            if self._first_pending is None:
+                self._first_pending = now
+            if not self._failures or self._deadline is None:
+                self._deadline = min(now + self.debounce, self._first_pending + self.max_delay)
+            self._ensure_thread()
+            self._cond.notify()
+
+    def flush(self):
+        """Nosūta gaidošās izmaiņas tūlīt (bloķējoši). Atgriež (izdevās, ziņojums)."""
+        with self._push_lock:
+            batch = self._take_pending()
+            if batch:
+                self._push_batch(batch)
+        if self.last_error:
+            return False, self.last_error
+        return True, "Veiksmīgi saglabāts GitHub!"
+
+    def pending_paths(self):
+        with self._cond:
+            return sorted(self._pending)
+
+    # --- Fona pavediens ---
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="github-sync", daemon=True)
+            self._thread.start()
+
+    def _take_pending(self):
+        with self._cond:
+            batch, self._pending = self._pending, {}
+            self._first_pending = self._deadline = None
+            return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending or self._deadline is None:
+                    self._cond.wait()
+                delay = self._deadline - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+            try:
+                with self._push_lock:
+                    batch = self._take_pending()
+                    if batch:
+                        self._push_batch(batch)
+            except Exception as e:
+                # Pavediens nedrīkst apstāties — citādi ieplānotās izmaiņas netiktu sūtītas
+                print(f"GitHub sinhronizācijas kļūda: {e}")
+
+    def _push_batch(self, batch):
+        try:
+            self._commit(batch)
+        except GithubSyncError as e:
+            self.last_error = f"GitHub kļūda ({e.status})"
+            self._requeue(batch)
+        except requests.RequestException as e:
+            self.last_error = f"GitHub nav sasniedzams ({type(e).__name__})"
+            self._requeue(batch)
+        except Exception as e:
+            # Piem. faila saturu nolasošā funkcija (OSError) vai merge funkcija
+            self.last_error = f"GitHub sinhronizācija neizdevās ({type(e).__name__}: {e})"
+            self._requeue(batch)
+        else:
+            self.last_error = None
+            self._failures = 0
+
+    def _requeue(self, batch):
+        """Neizdevušās izmaiņas atpakaļ rindā; jaunāks saturs tam pašam ceļam paliek spēkā."""
+        with self._cond:
+            pending, self._pending = self._pending, dict(batch)
+            for path, (newer, newer_messages, merge) in pending.items():
+                messages = self._pending.pop(path)[1] if path in self._pending else []
+                self._pending[path] = (newer, messages + [m for m in newer_messages if m not in messages], merge)
+            self._failures += 1
+            now = time.monotonic()
+            self._first_pending = self._first_pending or now
+            self._deadline = now + backoff_delay(self._failures)
+            self._ensure_thread()
+            self._cond.notify()
+
+    # --- Git Data API ---
+
+    def _request(self, method, endpoint, **kwargs):
+        r = self._session.request(method, f"{self.api_url}/repos/{self.repo}/{endpoint}",
+                                  timeout=HTTP_TIMEOUT, **kwargs)
+        if r.status_code not in (200, 201):
+            raise GithubSyncError(f"{method} {endpoint}: {r.status_code}", r.status_code)
+        return r.json()
+
+    def _fetch_head(self):
+        branch = self._request("GET", f"branches/{self.branch}")
+        commit = branch["commit"]
+        self._head = (commit["sha"], commit["commit"]["tree"]["sha"])
+
+    def _base_key(self, path):
+        return (self.api_url, self.repo, self.branch, path)
+
+    def _remote_blobs(self, tree_sha):
+        tree = self._request("GET", f"git/trees/{tree_sha}", params={"recursive": "1"})
+        return {entry["path"]: entry["sha"] for entry in tree.get("tree", []) if entry.get("type") == "blob"}
+
+    def _merge_remote(self, batch, files, bases, tree_sha):
+        """
+        Failiem ar merge funkciju, kas GitHub mainīti kopš bāzes versijas,
+        apvieno attālo versiju ar mūsējo (`files` un `bases` tiek atjaunināti).
+        """
+        paths = [path for path in files if batch[path][2] is not None]
+        if not paths:
+            return
+        remote = self._remote_blobs(tree_sha)
+        for path in paths:
+            their_sha = remote.get(path)
+            ours = _encode(path, files[path])
+            if their_sha == bases[path][0] or their_sha == (ours and git_blob_sha(ours)):
+                continue
+            theirs = None
+            if their_sha is not None:
+                blob = self._request("GET", f"git/blobs/{their_sha}")
+                theirs = _decode(path, base64.b64decode(blob["content"]))
+            try:
+                files[path] = _raw(batch[path][2](bases[path][1], files[path], theirs))
+            except Exception as e:
+                raise GithubSyncError(f"{path}: apvienošana neizdevās ({e})", "merge")
+            bases[path] = (their_sha, theirs)
+
+    def _commit(self, batch):
+        files = {path: _raw(content) for path, (content, _, _) in batch.items()}
+        bases = {path: _get_base(self._base_key(path)) for path in files}
+        uploaded = {}               # blob sha -> augšupielādēts (atkārtojot netiek sūtīts vēlreiz)
+
+        for attempt in range(REF_RETRIES):
+            if self._head is None:
+                self._fetch_head()
+                self._merge_remote(batch, files, bases, self._head[1])
+            encoded = {path: _encode(path, data) for path, data in files.items()}
+            shas = {path: None if data is None else git_blob_sha(data) for path, data in encoded.items()}
+            changed = [path for path in files if bases[path][0] != shas[path]]
+            if not changed:
+                return
+            messages = [m for path in changed for m in batch[path][1]]
+            if len(messages) == 1:
+                message = messages[0]
+            else:
+                message = f"Atjaunināti {len(changed)} faili ({len(messages)} izmaiņas)\n\n" + "\n".join(messages)
+
+            # sha null kokā izdzēš failu
+            for path in changed:
+                if shas[path] is not None and shas[path] not in uploaded:
+                    self._request("POST", "git/blobs", json={
+                        "content": base64.b64encode(encoded[path]).decode("ascii"), "encoding": "base64",
+                    })
+                    uploaded[shas[path]] = True
+            entries = [{"path": path, "mode": "100644", "type": "blob", "sha": shas[path]}
+                       for path in sorted(changed)]
+
+            parent, base_tree = self._head
+            tree = self._request("POST", "git/trees", json={"base_tree": base_tree, "tree": entries})
+            commit = self._request("POST", "git/commits", json={
+                "message": message, "tree": tree["sha"], "parents": [parent],
+            })
+            try:
+                self._request("PATCH", f"git/refs/heads/{self.branch}",
+                              json={"sha": commit["sha"], "force": False})
+            except GithubSyncError as e:
+                # Zars ir pavirzījies (cits process vai lietotājs) — jānolasa jaunais
+                # gals un jāapvieno mainītie faili
+                if e.status != 422 or attempt == REF_RETRIES - 1:
+                    raise
+                self._head = None
+                continue
+            self._head = (commit["sha"], tree["sha"])
+            for path in changed:
+                _set_base(self._base_key(path), shas[path], files[path])
+            self.last_commit = commit["sha"]
+            return
+
+
+_syncs = {}
+_syncs_lock = threading.Lock()
+
+
+def get_github_sync(repo, token, branch="main"):
+    """Procesa kopīgā sinhronizācija konkrētam repozitorijam, zaram un tokenam."""
+    key = (repo, branch, token)
+    with _syncs_lock:
+        sync = _syncs.get(key)
+        if sync is None:
+            sync = _syncs[key] = GithubSync(repo, token, branch)
+        return sync
+
+
+@atexit.register
+def _flush_all():
+    # Procesa beigās nenosūtītās izmaiņas tiek nosūtītas uzreiz
+    for sync in list(_syncs.values()):
+        if sync.pending_paths():
+            sync.flush()
+
+
+# ---------------------------------------------------------------------------
+# Nolasīšana (nosacīta, raw media type)
+# ---------------------------------------------------------------------------
+
+_etags = {}                 # (api, repo, zars, ceļš) -> ETag
+_etags_lock = threading.Lock()
+_local = threading.local()
+
+
+def _session():
+    # Katram pavedienam savs savienojums, kas tiek atkārtoti izmantots
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+    return session
+
+
+def fetch_file(repo, path, token="", branch="main", local_path=None, api_url=GITHUB_API_URL):
+    """
+    Nolasa faila saturu no GitHub. Atgriež (statuss, teksts vai kļūdas ziņojums):
+
+      FETCH_OK            — saturs lejupielādēts (teksts);
+      FETCH_NOT_MODIFIED  — kopš iepriekšējās nolasīšanas nav mainījies,
+                            jāizmanto lokālā kopija (`local_path`);
+      FETCH_MISSING       — faila GitHub nav (ziņojums);
+      FETCH_ERROR         — kļūda (ziņojums).
+
+    If-None-Match tiek sūtīts tikai tad, ja lokālā kopija `local_path` eksistē.
+    Nolasītā versija kļūst par bāzi GithubSync trīspusējai apvienošanai.
+    """
+    api_url = api_url.rstrip("/")
+    key = (api_url, repo, branch, path)
+    headers = {"Accept": "application/vnd.github.v3.raw"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    with _etags_lock:
+        etag = _etags.get(key)
+    if etag and (local_path is None or os.path.exists(local_path)):
+        headers["If-None-Match"] = etag
+    try:
+        r = _session().get(f"{api_url}/repos/{repo}/contents/{path}",
+                           params={"ref": branch}, headers=headers, timeout=HTTP_TIMEOUT)
+    except requests.RequestException as e:
+        return FETCH_ERROR, f"GitHub nav sasniedzams ({type(e).__name__})"
+    if r.status_code == 304:
+        return FETCH_NOT_MODIFIED, None
+    if r.status_code == 404:
+        return FETCH_MISSING, f"GitHub kļūda ({r.status_code})"
+    if r.status_code != 200:
+        return FETCH_ERROR, f"GitHub kļūda ({r.status_code})"
+    try:
+        data = _decode(path, r.content)
+        text = data.decode("utf-8")
+    except (OSError, UnicodeDecodeError) as e:
+        return FETCH_ERROR, f"Nederīgs faila saturs ({e})"
+    with _etags_lock:
+        if r.headers.get("ETag"):
+            _etags[key] = r.headers["ETag"]
+        else:
+            _etags.pop(key, None)
+    _set_base(key, git_blob_sha(r.content), data)
+    return FETCH_OK, text
+
+
+def forget_etag(repo, path, branch="main", api_url=GITHUB_API_URL):
+    """Nākamā nolasīšana lejupielādēs failu pilnībā (piem., ja lokālā kopija nav derīga)."""
+    with _etags_lock:
+        _etags.pop((api_url.rstrip("/"), repo, branch, path), None)
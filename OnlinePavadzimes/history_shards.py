@@ -0,0 +1,311 @@
+"""
+history_shards.py — vēstures CSV sadalīšana pa mēnešiem (lokāli un GitHub).
+
+Viens arvien augošs invoice_history.csv nozīmēja, ka katra saglabāšana
+GitHub nosūta visu vēsturi un katra sinhronizācija to visu lejupielādē.
+Šeit vēsture glabājas mēnešu daļās blakus CSV failam un tādā pašā
+struktūrā GitHub:
+
+    invoice_history/2026/05.csv
+    invoice_history/2026/06.csv
+    invoice_history/manifest.json   {"version": 1, "shards": {"2026/06": {"rows": 12, "sha": "..."}}}
+
+  * update(months) pārraksta tikai norādīto mēnešu daļas un manifestu un
+    atgriež GitHub nosūtāmās izmaiņas (ceļš, saturs; None — dzēst, merge);
+  * pull(fetch) vispirms nolasa manifestu (ar ETag — nemainītas vēstures
+    gadījumā tukšs 304) un lejupielādē tikai tās daļas, kuru sha atšķiras
+    no lokālā manifesta, un aizvieto glabātuvē tikai šos mēnešus.
+
+`sha` ir daļas CSV teksta git blob sha (nav atkarīgs no gzip GitHub pusē).
+
+Vairāki lietotāji (procesi) var saglabāt vienlaicīgi: lokāli daļas un
+manifests tiek rakstīti zem starpprocesu slēdzenes, un, ja GitHub daļa kopš
+mūsu pēdējās versijas mainīta, github_sync izsauc `merge` — ieraksti tiek
+trīspusēji apvienoti pēc pr_numurs (history_store.merge_history), rezultāts
+saglabāts arī lokāli, un manifests apvienots pa mēnešiem.
+Ja GitHub vēl nav manifesta, pull() atgriež FETCH_MISSING un jāizmanto
+vecais viena faila CSV; pirmā update() pēc tam izveido visas daļas.
+"""
+
+import functools
+import json
+import os
+import threading
+
+from github_sync import FETCH_OK, FETCH_NOT_MODIFIED, FETCH_MISSING, GITHUB_HISTORY_GZIP, git_blob_sha
+from history_store import (InterProcessLock, _kartas_nr, get_history_store, merge_history, parse_history_csv,
+                           read_history_csv)
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def shards_root(csv_path):
+    """Daļu mape (lokāli vai GitHub): "…/invoice_history.csv[.gz]" -> "…/invoice_history"."""
+    if csv_path.endswith(".gz"):
+        csv_path = csv_path[:-3]
+    return os.path.splitext(csv_path)[0]
+
+
+class HistoryShards:
+    """
+    Vienas vēstures (glabātuves) mēnešu daļas. `local_dir` — mape uz diska,
+    `remote_dir` — ceļš GitHub repozitorijā (ar "/" atdalītājiem).
+    """
+
+    def __init__(self, store, local_dir, remote_dir, gzip_remote=GITHUB_HISTORY_GZIP):
+        self.store = store
+        self.local_dir = local_dir
+        self.remote_dir = remote_dir.rstrip("/")
+        self.gzip_remote = gzip_remote
+        self._lock = InterProcessLock(local_dir + ".lock")
+        self._dirty = set()         # lokāli mainītie mēneši, kas vēl nav redzami GitHub
+        self._remote_only = {}      # mēneši, kas ir GitHub manifestā, bet vēl nav nolasīti
+
+    # --- Ceļi un manifests ---
+
+    def local_path(self, month):
+        return os.path.join(self.local_dir, *month.split("/")) + ".csv"
+
+    def remote_path(self, month):
+        return f"{self.remote_dir}/{month}.csv" + (".gz" if self.gzip_remote else "")
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.local_dir, MANIFEST_NAME)
+
+    @property
+    def remote_manifest_path(self):
+        return f"{self.remote_dir}/{MANIFEST_NAME}"
+
+    def manifest(self):
+        """Lokālais manifests (mēnesis -> {"rows", "sha"}) vai None, ja daļu vēl nav."""
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                return json.load(f).get("shards", {})
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _parse_manifest(data):
+        try:
+            return json.loads(data).get("shards", {}) if data else None
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _manifest_text(shards):
+        return json.dumps({"version": MANIFEST_VERSION, "shards": dict(sorted(shards.items()))},
+                          ensure_ascii=False, indent=1) + "\n"
+
+    def _write_file(self, path, text):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def _remove_file(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    # --- Rakstīšana (lokāli + GitHub izmaiņas) ---
+
+    def _refresh(self, shards, month):
+        """Pārraksta mēneša daļu no glabātuves. Atgriež (mainīta, teksts vai None)."""
+        df = self.store.to_dataframe([month])
+        if df.empty:
+            if month not in shards:
+                return False, None
+            del shards[month]
+            self._remove_file(self.local_path(month))
+            return True, None
+        text = df.to_csv(index=False)
+        sha = git_blob_sha(text.encode("utf-8"))
+        if shards.get(month, {}).get("sha") == sha and os.path.exists(self.local_path(month)):
+            return False, text
+        self._write_file(self.local_path(month), text)
+        shards[month] = {"rows": len(df), "sha": sha}
+        return True, text
+
+    def _read_shard(self, month):
+        """Lokālās daļas pašreizējais saturs (None — daļas nav, jādzēš GitHub)."""
+        with self._lock:
+            try:
+                with open(self.local_path(month), "rb") as f:
+                    return f.read()
+            except OSError:
+                return None
+
+    def _remote_manifest(self):
+        # GitHub nosūtāmais manifests: lokālās daļas + tikai GitHub esošās
+        return {**self._remote_only, **(self.manifest() or {})}
+
+    def _read_manifest(self):
+        with self._lock:
+            return self._manifest_text(self._remote_manifest())
+
+    def update(self, months=None):
+        """
+        Pārraksta norādīto mēnešu daļas no glabātuves (visas, ja months=None
+        vai lokālā manifesta vēl nav). Atgriež GitHub nosūtāmās izmaiņas
+        [(ceļš, saturs, merge), ...] — mainītās daļas un manifestu (pēdējo,
+        jo tā apvienošana izmanto jau apvienotās daļas). Saturs ir funkcija,
+        kas nosūtīšanas brīdī nolasa pašreizējo lokālo versiju.
+        """
+        with self._lock:
+            shards = self.manifest()
+            if months is None or shards is None:
+                months = set(self.store.months()) | set(shards or {})
+                shards = shards or {}
+            changes = []
+            for month in sorted(set(months)):
+                if self._refresh(shards, month)[0]:
+                    self._dirty.add(month)
+                    changes.append((self.remote_path(month), functools.partial(self._read_shard, month),
+                                    functools.partial(self._merge_shard, month)))
+            if changes or not os.path.exists(self.manifest_path):
+                self._write_file(self.manifest_path, self._manifest_text(shards))
+                changes.append((self.remote_manifest_path, self._read_manifest, self._merge_manifest))
+            return changes
+
+    # --- Apvienošana ar GitHub versiju (izsauc github_sync) ---
+
+    def _merge_shard(self, month, base, ours, theirs):
+        """
+        Mēneša daļas trīspusēja apvienošana. Mūsu puse ir pašreizējā
+        glabātuve (`ours` var būt vecāks); rezultāts tiek saglabāts arī lokāli.
+        """
+        with self._lock:
+            # Pārnumurētie ieraksti nedrīkst sakrist arī ar citu mēnešu numuriem
+            next_number = max((_kartas_nr(e.get('kartas_nr')) for e in self.store.load()), default=0) + 1
+            records = merge_history(None if base is None else parse_history_csv(base),
+                                    self.store.load([month]),
+                                    [] if theirs is None else parse_history_csv(theirs), next_number)
+            self.store.replace_months({month: records})
+            shards = self.manifest() or {}
+            _, text = self._refresh(shards, month)
+            self._write_file(self.manifest_path, self._manifest_text(shards))
+            return text
+
+    def _merge_manifest(self, base, ours, theirs):
+        """
+        Manifesta apvienošana pa mēnešiem. Mūsu pusē jau ir apvienoto daļu
+        sha; mēneši, kuru lokāli nav (vēl nav nolasīti no GitHub), tiek
+        saglabāti nākamajām nosūtīšanām līdz pull().
+        """
+        with self._lock:
+            b = self._parse_manifest(base)
+            o = self._remote_manifest()
+            t = self._parse_manifest(theirs) or {}
+            merged = {}
+            for month in set(b or {}) | set(o) | set(t):
+                om, tm = o.get(month), t.get(month)
+                if b is None:
+                    # Bāze nav zināma — mūsējais tikai šeit mainītajiem mēnešiem
+                    entry = om if month in self._dirty else tm
+                elif om == b.get(month):
+                    entry = tm
+                elif tm == b.get(month):
+                    entry = om if om is not None or month in self._dirty else tm
+                else:
+                    entry = om or tm
+                if entry:
+                    merged[month] = entry
+            local = self.manifest() or {}
+            self._remote_only = {m: e for m, e in merged.items() if m not in local}
+            return self._manifest_text(merged)
+
+    # --- Nolasīšana no GitHub ---
+
+    def pull(self, fetch):
+        """
+        Atjauno no GitHub tikai mainītos mēnešus. `fetch(ceļš, lokālais ceļš)`
+        atgriež (statuss, teksts) kā github_sync.fetch_file. Atgriež statusu:
+        FETCH_OK (kaut kas atjaunots), FETCH_NOT_MODIFIED, FETCH_MISSING (GitHub
+        nav manifesta) vai kļūdas statusu.
+
+        Mēneši ar šeit veiktām, GitHub vēl neredzamām izmaiņām netiek
+        pārrakstīti — GitHub versija tiek apvienota ar lokālo.
+        """
+        with self._lock:
+            status, text = fetch(self.remote_manifest_path, self.manifest_path)
+            if status != FETCH_OK:
+                return status
+            remote = self._parse_manifest(text)
+            if remote is None:
+                return FETCH_MISSING
+            local = self.manifest() or {}
+            records_by_month = {}
+            for month, info in remote.items():
+                if local.get(month, {}).get("sha") == info.get("sha") and os.path.exists(self.local_path(month)):
+                    self._dirty.discard(month)      # mūsu izmaiņas jau ir GitHub
+                    continue
+                shard_status, shard_text = fetch(self.remote_path(month), self.local_path(month))
+                if shard_status == FETCH_NOT_MODIFIED:
+                    # Lokālā daļa atbilst GitHub versijai vai ir jaunāka par to
+                    if month not in self._dirty:
+                        local[month] = info
+                    continue
+                if shard_status != FETCH_OK:
+                    return shard_status
+                theirs = parse_history_csv(shard_text.encode("utf-8"))
+                if month in self._dirty:
+                    records_by_month[month] = merge_history(None, self.store.load([month]), theirs)
+                else:
+                    records_by_month[month] = theirs
+                    self._write_file(self.local_path(month), shard_text)
+                    local[month] = info
+            for month in set(local) - set(remote) - self._dirty:
+                records_by_month[month] = []
+                self._remove_file(self.local_path(month))
+                del local[month]
+            if records_by_month:
+                self.store.replace_months(records_by_month)
+            for month in set(records_by_month) & self._dirty:
+                self._refresh(local, month)
+            self._write_file(self.manifest_path, self._manifest_text(local))
+            self._remote_only = {}
+            return FETCH_OK if records_by_month else FETCH_NOT_MODIFIED
+
+    def clear_local(self):
+        """Izdzēš lokālās daļas un manifestu (GitHub netiek skarts)."""
+        with self._lock:
+            for month in self.manifest() or {}:
+                self._remove_file(self.local_path(month))
+            self._remove_file(self.manifest_path)
+
+
+def read_local_shards(csv_path):
+    """
+    Visi ieraksti no lokālajām mēnešu daļām vēstures failam `csv_path` vai
+    None, ja daļu nav vai kāda manifestā minētā daļa trūkst.
+    """
+    shards = HistoryShards(None, shards_root(csv_path), "")
+    months = shards.manifest()
+    if months is None:
+        return None
+    records = []
+    for month in sorted(months):
+        path = shards.local_path(month)
+        if not os.path.exists(path):
+            return None
+        records.extend(read_history_csv(path))
+    return records
+
+
+_shards = {}
+_shards_lock = threading.Lock()
+
+
+def get_history_shards(csv_path, github_path):
+    """Procesa kopīgās mēnešu daļas vēstures failam `csv_path` (GitHub: `github_path`)."""
+    key = (os.path.abspath(csv_path), github_path)
+    with _shards_lock:
+        shards = _shards.get(key)
+        if shards is None:
+            shards = _shards[key] = HistoryShards(get_history_store(csv_path),
+                                                  shards_root(csv_path), shards_root(github_path))
+        return shards
@@ -0,0 +1,840 @@
+"""
+history_store.py — rēķinu vēstures glabāšana (kopīga app.py un pages/viewer.py).
+
+Divas realizācijas ar vienādu API:
+  * SqliteHistoryStore — SQLite WAL režīmā ar indeksiem uz pr_numurs,
+    datums, pr_partneris un doc_type; saglabāšana ir vienas rindas upsert,
+    nevis visa faila pārrakstīšana. Datubāze tiek aizpildīta no esošā CSV
+    (import_csv), un GitHub joprojām glabājas CSV (to_dataframe()).
+  * CsvHistoryStore — CSV bāzes fails + papildinājumu žurnāls; saglabāšana
+    pieraksta vienu rindu žurnālā, fonā žurnāls tiek iestrādāts CSV.
+
+Nolasītā vēsture (un no tās atvasinātie dati, sk. cached()) tiek kešota
+procesa līmenī visām sesijām un pārlasīta tikai tad, kad mainās faili.
+Ierakstus var nolasīt un aizvietot pa mēnešiem (load(months),
+to_dataframe(months), replace_months) — to izmanto GitHub mēnešu daļas
+(history_shards.py) un skata mēneša filtrs.
+
+Konfigurācija (vides mainīgie):
+  HISTORY_BACKEND — "sqlite" (noklusēti) vai "csv"
+  HISTORY_DB_DIR  — kur glabāt .db failus (noklusēti blakus CSV)
+  HISTORY_COMPACT_EVERY — pēc cik žurnāla ierakstiem CSV tiek apvienots
+"""
+
+import io
+import os
+import re
+import json
+import sqlite3
+import datetime
+import threading
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:     # Windows — tikai procesa iekšējā slēdzene
+    fcntl = None
+
+HISTORY_BACKEND = os.environ.get("HISTORY_BACKEND", "sqlite")
+HISTORY_DB_DIR = os.environ.get("HISTORY_DB_DIR", "")
+
+# CSV kolonnas vēsturei — JAUNAIS FORMĀTS
+HISTORY_COLS = [
+    'kartas_nr', 'datums', 'pr_partneris', 'pr_pvn_nr',
+    'pr_datums', 'pr_numurs', 'darijuma_apraksts',
+    'vertiba_bez_pvn', 'dabas_resursi', 'atlaides', 'pvn_summa', 'kopeja_summa',
+    'due_date', 'client_reg_no', 'client_address', 'doc_type', 'items_json', 'comments', 'created_at'
+]
+
+# Vēstures mēnesis (GitHub daļas, skata filtrs): "dd.mm.YYYY" -> "YYYY/MM"
+UNDATED_MONTH = "bez_datuma"
+_DATE_RE = re.compile(r'\d{2}\.\d{2}\.\d{4}')
+
+# ---------------------------------------------------------------------------
+# Ierakstu veidošana
+# ---------------------------------------------------------------------------
+
+def history_month(datums):
+    """Ieraksta mēnesis "YYYY/MM" pēc datuma "dd.mm.YYYY" (citādi UNDATED_MONTH)."""
+    datums = datums if isinstance(datums, str) else ''
+    if _DATE_RE.fullmatch(datums):
+        return f"{datums[6:10]}/{datums[3:5]}"
+    return UNDATED_MONTH
+
+def _months_of(datums):
+    """history_month() visai kolonnai."""
+    datums = datums.fillna('').astype(str)
+    return (datums.str[6:10] + '/' + datums.str[3:5]).where(
+        datums.str.fullmatch(_DATE_RE.pattern), UNDATED_MONTH
+    )
+
+def _month_key(months):
+    return None if months is None else tuple(sorted(set(months)))
+
+def _fmt(val):
+    try:
+        return f"{float(val):,.2f}".replace(",", "X").replace(".", ",").replace("X", " ")
+    except Exception:
+        return str(val)
+
+# Vecā formāta lauki, kurus izmanto app.py un skats: aizstājvārds -> kolonna
+_ALIASES = {
+    'doc_id':        'pr_numurs',
+    'client_name':   'pr_partneris',
+    'client_vat_no': 'pr_pvn_nr',
+    'date':          'datums',
+    'total':         'kopeja_summa',
+}
+
+def _with_aliases(rec):
+    """Pievieno vecā formāta laukus (doc_id, client_name, ...). Pozīcijas sk. entry_items()."""
+    for alias, col in _ALIASES.items():
+        rec[alias] = rec.get(col, '')
+    return rec
+
+def _parse_items(items_str):
+    try:
+        return json.loads(items_str) if isinstance(items_str, str) and items_str else []
+    except ValueError:
+        return []
+
+def entry_items(entry):
+    """
+    Ieraksta pozīciju saraksts. Ielādējot vēsturi items_json netiek atkodēts —
+    tikai tad, kad konkrēts rēķins tiek atvērts vai eksportēts.
+    """
+    items = entry.get('items')
+    if isinstance(items, list):
+        return items
+    return _parse_items(entry.get('items_json', ''))
+
+def _records(df):
+    """Ierakstu saraksts no jaunā formāta DataFrame; aizstājvārdu kolonnas tiek veidotas vektorizēti."""
+    for col in HISTORY_COLS:
+        if col not in df.columns:
+            df[col] = ''
+    for alias, col in _ALIASES.items():
+        df[alias] = df[col]
+    return df.to_dict('records')
+
+def history_entry(invoice_data, kartas_nr):
+    """Vēstures ieraksts no rēķina datiem (kā to saglabā save_to_history)."""
+    items        = invoice_data.get('items', [])
+    raw_total    = float(invoice_data.get('raw_total', 0) or 0)
+    raw_discount = float(invoice_data.get('raw_discount_eur', 0) or 0)
+    base_amount  = round(raw_total / 1.21, 2)
+    vat_amount   = round(raw_total - base_amount, 2)
+    descriptions = [it.get('name', '') for it in items if it.get('name')]
+    pr_numurs    = invoice_data.get('doc_id', '')
+    return {
+        'kartas_nr':         kartas_nr,
+        'datums':            invoice_data.get('date', ''),
+        'pr_partneris':      invoice_data.get('client_name', ''),
+        'pr_pvn_nr':         invoice_data.get('client_vat_no', ''),
+        'pr_datums':         invoice_data.get('date', ''),
+        'pr_numurs':         pr_numurs,
+        'darijuma_apraksts': '; '.join(descriptions),
+        'vertiba_bez_pvn':   _fmt(base_amount),
+        'dabas_resursi':     '',
+        'atlaides':          _fmt(raw_discount),
+        'pvn_summa':         _fmt(vat_amount),
+        'kopeja_summa':      invoice_data.get('total', ''),
+        'due_date':          invoice_data.get('due_date', ''),
+        'client_reg_no':     invoice_data.get('client_reg_no', ''),
+        'client_address':    invoice_data.get('client_address', ''),
+        'doc_type':          invoice_data.get('doc_type', ''),
+        'items_json':        json.dumps(items, ensure_ascii=False),
+        'comments':          invoice_data.get('comments', ''),
+        'created_at':        datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'items':             items,
+        'doc_id':            pr_numurs,
+        'client_name':       invoice_data.get('client_name', ''),
+        'client_vat_no':     invoice_data.get('client_vat_no', ''),
+        'date':              invoice_data.get('date', ''),
+        'total':             invoice_data.get('total', ''),
+    }
+
+# ---------------------------------------------------------------------------
+# CSV nolasīšana / rakstīšana
+# ---------------------------------------------------------------------------
+
+def _migrate_old_history(df):
+    """Vecā formāta CSV (doc_id, client_name, items, ...) pārveide jaunajā formātā."""
+    def col(name, default=''):
+        return df[name] if name in df.columns else pd.Series(default, index=df.index)
+
+    items_str = col('items')
+    # Vecajā formātā nav summas bez PVN — tā jāaprēķina no pozīcijām
+    items = items_str.map(_parse_items)
+    base = items.map(lambda lst: sum(
+        float(it.get('raw_qty', 0) or 0) * float(it.get('raw_price', 0) or 0) for it in lst
+    ))
+    total_val = pd.to_numeric(
+        col('total').str.replace('\u00a0', '', regex=False).str.replace(' ', '', regex=False)
+                    .str.replace(',', '.', regex=False),
+        errors='coerce'
+    ).fillna(0.0)
+    vat = (total_val - base).map(lambda v: round(v, 2))
+    migrated = pd.DataFrame({
+        'kartas_nr':         range(1, len(df) + 1),
+        'datums':            col('date'),
+        'pr_partneris':      col('client_name'),
+        'pr_pvn_nr':         col('client_vat_no') if 'client_vat_no' in df.columns else col('client_reg_no'),
+        'pr_datums':         col('date'),
+        'pr_numurs':         col('doc_id'),
+        'darijuma_apraksts': items.map(lambda lst: '; '.join(it.get('name', '') for it in lst if it.get('name'))),
+        'vertiba_bez_pvn':   base.map(_fmt),
+        'dabas_resursi':     '',
+        'atlaides':          _fmt(0),
+        'pvn_summa':         vat.map(_fmt),
+        'kopeja_summa':      col('total'),
+        'due_date':          col('due_date'),
+        'client_reg_no':     col('client_reg_no'),
+        'client_address':    col('client_address'),
+        'doc_type':          col('doc_type'),
+        'items_json':        items_str.where(items_str != '', '[]'),
+        'comments':          col('comments'),
+        'created_at':        col('created_at'),
+    }, index=df.index)
+    return _records(migrated)
+
+def read_history_csv(path):
+    """Nolasa vēstures CSV (jauno vai veco formātu) kā ierakstu sarakstu (bez pozīciju atkodēšanas)."""
+    if not os.path.exists(path):
+        return []
+    return parse_history_csv(path)
+
+def parse_history_csv(source):
+    """Tas pats, kas read_history_csv(), no faila ceļa, bufera vai baitiem."""
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    try:
+        # na_filter=False: tukšas šūnas paliek '' (nevis NaN), un nolasīšana ir ātrāka
+        df = pd.read_csv(source, dtype=str, na_filter=False)
+        if df.empty:
+            return []
+        if 'doc_id' in df.columns and 'kartas_nr' not in df.columns:
+            return _migrate_old_history(df)
+        return _records(df)
+    except Exception:
+        return []
+
+def _initial_records(csv_path):
+    """
+    Jaunas glabātuves saturs: lokālās mēnešu daļas (history_shards), ja tās
+    ir, citādi vecais viena faila CSV. Daļas tiek atjauninātas katrā
+    saglabāšanā (arī GitHub), vecais CSV — vairs ne, tāpēc pēc izvietošanas
+    ar tukšu datubāzi tas var būt novecojis.
+    """
+    # history_shards importē šo moduli, tāpēc imports ir šeit
+    from history_shards import read_local_shards
+    records = read_local_shards(csv_path)
+    return read_history_csv(csv_path) if records is None else records
+
+def _sorted_records(records):
+    return sorted(records, key=lambda r: (_kartas_nr(r.get('kartas_nr')), str(r.get('pr_numurs', ''))))
+
+def history_to_df(history):
+    if not history:
+        return pd.DataFrame(columns=HISTORY_COLS)
+    df = pd.DataFrame.from_records(history)
+    for col in HISTORY_COLS:
+        if col not in df.columns:
+            df[col] = ''
+    # Ieraksti no history_entry() satur tikai pozīciju sarakstu, ielādētie — items_json
+    if 'items' in df.columns:
+        missing = df['items_json'].isna() | (df['items_json'] == '')
+        df.loc[missing, 'items_json'] = df.loc[missing, 'items'].map(
+            lambda v: json.dumps(v, ensure_ascii=False) if isinstance(v, list) else v
+        )
+    df['items_json'] = df['items_json'].fillna('').replace('', '[]')
+    return df[HISTORY_COLS].fillna('')
+
+def merge_history(base, ours, theirs, next_number=0):
+    """
+    Trīspusēja vēstures ierakstu apvienošana pēc pr_numurs (piem. GitHub
+    konflikts): base — kopīgā iepriekšējā versija (None, ja nav zināma),
+    ours — mūsu, theirs — attālā versija. Ieraksts, kas mainīts tikai vienā
+    pusē, ņem šīs puses versiju (arī dzēšanu); ja mainīts abās — jaunāko
+    pēc created_at. Mūsu jaunajiem ierakstiem, kuru kārtas numurs sakrīt ar
+    attālo, tiek piešķirts nākamais brīvais numurs (ne mazāks par
+    `next_number`, piem. ja apvieno tikai viena mēneša ierakstus).
+    """
+    def by_key(records):
+        return {r.get('pr_numurs'): {c: _db_value(r.get(c, '')) for c in HISTORY_COLS} for r in records or []}
+
+    base_rows, our_rows, their_rows = by_key(base), by_key(ours), by_key(theirs)
+    merged = {}
+    for key in list(their_rows) + [k for k in our_rows if k not in their_rows]:
+        b, o, t = base_rows.get(key), our_rows.get(key), their_rows.get(key)
+        if o == t or o == b:
+            row = t
+        elif t == b:
+            row = o
+        elif o is None or t is None:
+            row = o or t            # dzēsts vienā pusē, mainīts otrā — saglabājam
+        else:
+            row = o if o.get('created_at', '') >= t.get('created_at', '') else t
+        if row is not None:
+            merged[key] = row
+
+    their_numbers = {_kartas_nr(r['kartas_nr']) for k, r in merged.items() if k in their_rows}
+    next_number = max([next_number - 1] + [_kartas_nr(r['kartas_nr']) for r in merged.values()]) + 1
+    for key, row in merged.items():
+        if key not in their_rows and _kartas_nr(row['kartas_nr']) in their_numbers:
+            merged[key] = dict(row, kartas_nr=str(next_number))
+            next_number += 1
+    return sorted(merged.values(), key=lambda r: (_kartas_nr(r['kartas_nr']), r['pr_numurs']))
+
+# ---------------------------------------------------------------------------
+# Starpprocesu slēdzene
+# ---------------------------------------------------------------------------
+
+class InterProcessLock:
+    """
+    Slēdzene, kas darbojas gan starp pavedieniem, gan starp procesiem
+    (flock uz `path`). Tajā pašā pavedienā to var iegūt atkārtoti.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._rlock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self._rlock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                self._file = open(self.path, 'a')
+                fcntl.flock(self._file, fcntl.LOCK_EX)
+            except Exception:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._rlock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0 and self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._rlock.release()
+
+# ---------------------------------------------------------------------------
+# CSV realizācija (bāzes momentuzņēmums + papildinājumu žurnāls)
+# ---------------------------------------------------------------------------
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+
+class _LoadCache:
+    """
+    Procesa kopīga (visām Streamlit sesijām) nolasītās vēstures kešatmiņa.
+    Atslēga ir glabātuves failu mtime un izmērs (_stamp): kamēr faili nav
+    mainījušies, load() un cached() atgriež jau aprēķināto rezultātu bez
+    CSV/SQLite lasīšanas. Atgrieztos objektus nedrīkst mainīt uz vietas.
+    """
+
+    def _init_cache(self):
+        self._cache_lock = threading.RLock()
+        self._cache = {}
+
+    def load(self, months=None):
+        """Vēstures ieraksti; `months` (["2026/06", ...]) ierobežo tos līdz norādītajiem mēnešiem."""
+        months = _month_key(months)
+        return self._cached(('history', months), lambda: self._load(months))
+
+    def cached(self, name, build):
+        """build(vēsture) rezultāts, aprēķināts vienreiz katrai failu versijai."""
+        return self._cached(name, lambda: build(self.load()))
+
+    def _cached(self, name, compute):
+        stamp = self._stamp()
+        with self._cache_lock:
+            hit = self._cache.get(name)
+            if hit is not None and hit[0] == stamp:
+                return hit[1]
+            value = compute()
+            self._cache[name] = (stamp, value)
+            return value
+
+    def frame(self, months=None):
+        """history_frame(load(months)) — skatam paredzētais DataFrame."""
+        months = _month_key(months)
+        return self._cached(('frame', months), lambda: history_frame(self.load(months)))
+
+    def months(self):
+        """Mēneši ("YYYY/MM"), kuros ir ieraksti, augošā secībā."""
+        return self._cached('months', self._months)
+
+
+class CsvHistoryStore(_LoadCache):
+    """
+    Vēsture CSV failā, kuru saglabāšana nepārraksta.
+
+    Katra izmaiņa tiek pierakstīta žurnālā `<csv>.journal` kā viena JSON
+    rinda (ar fsync): {"op": "upsert", "entry": {...}} vai {"op": "delete",
+    "pr_numurs": ...}. Lasot bāzes CSV un žurnāls tiek apvienoti (upsert pēc
+    pr_numurs). Kad žurnālā sakrājas COMPACT_EVERY ieraksti, fona pavediens
+    to iestrādā jaunā CSV momentuzņēmumā un žurnālu iztukšo.
+    """
+
+    COMPACT_EVERY = int(os.environ.get("HISTORY_COMPACT_EVERY", 200))
+
+    def __init__(self, csv_path, compact_every=None):
+        self.csv_path = csv_path
+        self.journal_path = csv_path + ".journal"
+        if compact_every is not None:
+            self.COMPACT_EVERY = compact_every
+        # Saglabāšana no vairākiem procesiem (kārtas numurs, žurnāla apvienošana)
+        self._lock = InterProcessLock(csv_path + ".lock")
+        # Atmiņā: pr_numurs -> kartas_nr, lielākais kartas_nr un žurnāla ierakstu skaits.
+        # Derīgs, kamēr faili nav mainīti no ārpuses (salīdzina mtime/izmēru).
+        self._index = None
+        self._index_stamp = None
+        self._max_kartas = 0
+        self._journal_entries = 0
+        self._compacting = False
+        self._init_cache()
+        self._seed_from_shards()
+
+    def _seed_from_shards(self):
+        """
+        Bez žurnāla (piem. jauns process pēc izvietošanas) bāzes CSV var būt
+        vecāks par mēnešu daļām — tad bāze tiek pārrakstīta no daļām.
+        """
+        with self._lock:
+            if os.path.exists(self.journal_path):
+                return
+            records = _initial_records(self.csv_path)
+            current = read_history_csv(self.csv_path)
+            if not history_to_df(_sorted_records(records)).equals(history_to_df(_sorted_records(current))):
+                self._write(records)
+
+    # --- Žurnāls ---
+
+    @staticmethod
+    def _parse_ops(data):
+        ops = []
+        for line in data.decode('utf-8', errors='replace').splitlines():
+            try:
+                ops.append(json.loads(line))
+            except ValueError:
+                continue  # pusē pārtraukts pēdējais ieraksts (avārija rakstot)
+        return ops
+
+    def _read_journal(self):
+        try:
+            with open(self.journal_path, 'rb') as f:
+                return self._parse_ops(f.read())
+        except OSError:
+            return []
+
+    def _append(self, op):
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(op, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_entries += 1
+        self._index_stamp = self._stamp()
+
+    def _stamp(self):
+        return (_stat(self.csv_path), _stat(self.journal_path))
+
+    @staticmethod
+    def _replay(history, ops):
+        """Pielieto žurnāla operācijas bāzes ierakstiem (upsert / delete pēc pr_numurs)."""
+        positions = {e.get('pr_numurs', e.get('doc_id', '')): i for i, e in enumerate(history)}
+        for op in ops:
+            if op.get('op') == 'upsert':
+                entry = _with_aliases(dict(op['entry']))
+                entry['kartas_nr'] = str(entry['kartas_nr'])  # kā no CSV (dtype=str)
+                pos = positions.get(entry['pr_numurs'])
+                if pos is None:
+                    positions[entry['pr_numurs']] = len(history)
+                    history.append(entry)
+                else:
+                    history[pos] = entry
+            elif op.get('op') == 'delete':
+                pos = positions.pop(op.get('pr_numurs'), None)
+                if pos is not None:
+                    history[pos] = None
+        return [e for e in history if e is not None]
+
+    # --- Lasīšana ---
+
+    def _load_with_count(self):
+        ops = self._read_journal()
+        return self._replay(read_history_csv(self.csv_path), ops), len(ops)
+
+    def _load(self, months=None):
+        history = self._load_with_count()[0] if months is None else self.load()
+        if months is None or not history:
+            return history
+        wanted = set(months)
+        return [e for e in history if history_month(e.get('datums')) in wanted]
+
+    def _months(self):
+        return sorted({history_month(e.get('datums')) for e in self.load()})
+
+    def to_dataframe(self, months=None):
+        return history_to_df(self.load(months))
+
+    def _ensure_index(self):
+        stamp = self._stamp()
+        if self._index is None or stamp != self._index_stamp:
+            history, self._journal_entries = self._load_with_count()
+            self._index = {e.get('pr_numurs'): e.get('kartas_nr') for e in history}
+            self._max_kartas = max((_kartas_nr(e.get('kartas_nr', 0)) for e in history), default=0)
+            self._index_stamp = stamp
+
+    # --- Rakstīšana ---
+
+    def save(self, invoice_data):
+        """Pievieno vai aizvieto (pēc pr_numurs) ierakstu; atgriež saglabāto ierakstu."""
+        pr_numurs = invoice_data.get('doc_id', '')
+        with self._lock:
+            self._ensure_index()
+            kartas_nr = self._index.get(pr_numurs)
+            if kartas_nr is None:
+                kartas_nr = self._max_kartas + 1
+            entry = history_entry(invoice_data, kartas_nr)
+            self._append({'op': 'upsert', 'entry': {c: entry[c] for c in HISTORY_COLS}})
+            self._index[pr_numurs] = kartas_nr
+            self._max_kartas = max(self._max_kartas, _kartas_nr(kartas_nr))
+        self._maybe_compact()
+        return entry
+
+    def delete(self, pr_numurs_list):
+        with self._lock:
+            self._ensure_index()
+            for pr_numurs in pr_numurs_list:
+                self._append({'op': 'delete', 'pr_numurs': pr_numurs})
+                self._index.pop(pr_numurs, None)
+        self._maybe_compact()
+
+    def _write(self, history):
+        """Jauns bāzes momentuzņēmums (atomāri) un tukšs žurnāls."""
+        tmp_path = f"{self.csv_path}.{os.getpid()}.tmp"
+        history_to_df(history).to_csv(tmp_path, index=False, encoding='utf-8')
+        os.replace(tmp_path, self.csv_path)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self._index = None
+
+    def compact(self):
+        """
+        Iestrādā žurnālu bāzes CSV. Atgriež iestrādāto žurnāla ierakstu skaitu.
+        Jaunais CSV tiek veidots bez slēdzenes, tāpēc saglabāšana to negaida;
+        ieraksti, kas žurnālā pienāk pa to laiku, paliek žurnālā.
+        """
+        with self._lock:
+            base_stamp = _stat(self.csv_path)
+            journal_stat = _stat(self.journal_path)
+        if not journal_stat or not journal_stat[1]:
+            return 0
+        journal_size = journal_stat[1]
+        with open(self.journal_path, 'rb') as f:
+            ops = self._parse_ops(f.read(journal_size))
+        history = self._replay(read_history_csv(self.csv_path), ops)
+        tmp_path = f"{self.csv_path}.{os.getpid()}.tmp"
+        history_to_df(history).to_csv(tmp_path, index=False, encoding='utf-8')
+
+        with self._lock:
+            if _stat(self.csv_path) != base_stamp:
+                # Bāze tika aizvietota (piem. imports no GitHub) — šo rezultātu atmetam
+                os.remove(tmp_path)
+                return 0
+            # Indekss paliek derīgs tikai tad, ja tas atbilst failiem pirms aizvietošanas
+            index_valid = self._index is not None and self._index_stamp == self._stamp()
+            with open(self.journal_path, 'rb') as f:
+                f.seek(journal_size)
+                rest = f.read()
+            os.replace(tmp_path, self.csv_path)
+            if rest:
+                journal_tmp = f"{self.journal_path}.{os.getpid()}.tmp"
+                with open(journal_tmp, 'wb') as f:
+                    f.write(rest)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(journal_tmp, self.journal_path)
+            else:
+                os.remove(self.journal_path)
+            # Apvienotais saturs nav mainījies, tāpēc atmiņas indekss paliek derīgs
+            self._journal_entries = len(self._parse_ops(rest))
+            if index_valid:
+                self._index_stamp = self._stamp()
+            else:
+                self._index = None
+        return len(ops)
+
+    def _maybe_compact(self):
+        with self._lock:
+            if self._compacting or self._journal_entries < self.COMPACT_EVERY:
+                return
+            self._compacting = True
+
+        def run():
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"Vēstures žurnāla apvienošanas kļūda: {e}")
+            finally:
+                self._compacting = False
+
+        threading.Thread(target=run, name="history-compaction", daemon=True).start()
+
+    def replace_months(self, records_by_month):
+        """
+        Aizvieto norādīto mēnešu ierakstus (piem. no GitHub daļām):
+        {"2026/06": [ieraksts, ...], ...}. Izmaiņas tiek pierakstītas žurnālā.
+        """
+        with self._lock:
+            self._ensure_index()
+            incoming = {}
+            for records in records_by_month.values():
+                incoming.update({r.get('pr_numurs'): r for r in records})
+            for entry in self.load(list(records_by_month)):
+                if entry.get('pr_numurs') not in incoming:
+                    self._append({'op': 'delete', 'pr_numurs': entry.get('pr_numurs')})
+                    self._index.pop(entry.get('pr_numurs'), None)
+            for pr_numurs, rec in incoming.items():
+                self._append({'op': 'upsert', 'entry': {c: _db_value(rec.get(c, '')) for c in HISTORY_COLS}})
+                self._index[pr_numurs] = rec.get('kartas_nr')
+                self._max_kartas = max(self._max_kartas, _kartas_nr(rec.get('kartas_nr', 0)))
+        self._maybe_compact()
+
+    def import_csv(self, csv_path=None, replace=False):
+        """
+        Ielādē CSV. Ja tas ir pats bāzes fails (piem. tikko pārrakstīts no
+        GitHub), replace=True atmet žurnālu; cits fails tiek pārkopēts
+        (replace) vai apvienots ar esošo vēsturi.
+        """
+        with self._lock:
+            same = not csv_path or os.path.abspath(csv_path) == os.path.abspath(self.csv_path)
+            if same:
+                if replace and os.path.exists(self.journal_path):
+                    os.remove(self.journal_path)
+                self._index = None
+                return len(self.load())
+            records = read_history_csv(csv_path)
+            if not replace:
+                incoming = {r.get('pr_numurs') for r in records}
+                records = [e for e in self.load() if e.get('pr_numurs') not in incoming] + records
+            self._write(records)
+            return len(records)
+
+    def clear(self):
+        with self._lock:
+            for path in (self.csv_path, self.journal_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._index = None
+
+# ---------------------------------------------------------------------------
+# SQLite realizācija
+# ---------------------------------------------------------------------------
+
+_TEXT_COLS = [c for c in HISTORY_COLS if c != 'kartas_nr']
+
+# history_month() SQL izteiksmē (izmantota arī indeksā)
+_MONTH_SQL = (
+    "CASE WHEN datums GLOB '[0-9][0-9].[0-9][0-9].[0-9][0-9][0-9][0-9]' "
+    f"THEN substr(datums, 7, 4) || '/' || substr(datums, 4, 2) ELSE '{UNDATED_MONTH}' END"
+)
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS history (
+    kartas_nr INTEGER NOT NULL,
+    {", ".join(f"{c} TEXT NOT NULL DEFAULT ''" for c in _TEXT_COLS)},
+    UNIQUE (pr_numurs)
+);
+CREATE INDEX IF NOT EXISTS idx_history_datums ON history (datums);
+CREATE INDEX IF NOT EXISTS idx_history_partneris ON history (pr_partneris);
+CREATE INDEX IF NOT EXISTS idx_history_doc_type ON history (doc_type);
+CREATE INDEX IF NOT EXISTS idx_history_kartas_nr ON history (kartas_nr);
+CREATE INDEX IF NOT EXISTS idx_history_month ON history ({_MONTH_SQL});
+"""
+
+_UPSERT = (
+    f"INSERT INTO history ({', '.join(HISTORY_COLS)}) VALUES ({', '.join('?' for _ in HISTORY_COLS)}) "
+    f"ON CONFLICT (pr_numurs) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in _TEXT_COLS)}"
+)
+
+def _db_value(val):
+    if val is None or (isinstance(val, float) and pd.isna(val)):
+        return ''
+    return val if isinstance(val, str) else str(val)
+
+def _kartas_nr(val):
+    try:
+        return int(str(val).strip() or 0)
+    except ValueError:
+        return 0
+
+def _row_params(entry):
+    return [_kartas_nr(entry.get('kartas_nr', 0))] + [_db_value(entry.get(c, '')) for c in _TEXT_COLS]
+
+
+class SqliteHistoryStore(_LoadCache):
+    """
+    Vēsture SQLite datubāzē blakus CSV failam (invoice_history.csv ->
+    invoice_history.db). Ja datubāze ir tukša, tā tiek aizpildīta no
+    lokālajām mēnešu daļām vai, ja to nav, no CSV.
+    """
+
+    def __init__(self, csv_path, db_path=None):
+        self.csv_path = csv_path
+        if db_path is None:
+            name = os.path.splitext(os.path.basename(csv_path))[0] + ".db"
+            db_path = os.path.join(HISTORY_DB_DIR or os.path.dirname(os.path.abspath(csv_path)), name)
+        self.db_path = db_path
+        self._init_cache()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            empty = conn.execute("SELECT 1 FROM history LIMIT 1").fetchone() is None
+        if empty:
+            self._import(_initial_records(csv_path))
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _stamp(self):
+        # WAL režīmā ieraksti vispirms nonāk -wal failā
+        return (_stat(self.db_path), _stat(self.db_path + "-wal"))
+
+    def _select(self, months=None):
+        sql = f"SELECT {', '.join(HISTORY_COLS)} FROM history"
+        params = ()
+        if months is not None:
+            months = list(months)
+            sql += f" WHERE {_MONTH_SQL} IN ({', '.join('?' for _ in months)})"
+            params = months
+        with self._connect() as conn:
+            return pd.read_sql_query(sql + " ORDER BY kartas_nr, rowid", conn, params=params)
+
+    def _load(self, months=None):
+        return _records(self._select(months))
+
+    def _months(self):
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute(f"SELECT DISTINCT {_MONTH_SQL} AS m FROM history ORDER BY m")]
+
+    def to_dataframe(self, months=None):
+        df = self._select(months)
+        df['kartas_nr'] = df['kartas_nr'].astype(str)
+        return df
+
+    def save(self, invoice_data):
+        """Upsert pēc pr_numurs; esošam ierakstam saglabā kārtas numuru."""
+        pr_numurs = invoice_data.get('doc_id', '')
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT kartas_nr FROM history WHERE pr_numurs = ?", (pr_numurs,)).fetchone()
+                if row is not None:
+                    kartas_nr = row["kartas_nr"]
+                else:
+                    kartas_nr = conn.execute("SELECT COALESCE(MAX(kartas_nr), 0) + 1 FROM history").fetchone()[0]
+                entry = history_entry(invoice_data, kartas_nr)
+                conn.execute(_UPSERT, _row_params(entry))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return entry
+
+    def delete(self, pr_numurs_list):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("DELETE FROM history WHERE pr_numurs = ?", [(n,) for n in pr_numurs_list])
+            conn.execute("COMMIT")
+
+    def replace_months(self, records_by_month):
+        """Aizvieto norādīto mēnešu ierakstus (piem. no GitHub daļām): {"2026/06": [ieraksts, ...], ...}."""
+        months = list(records_by_month)
+        if not months:
+            return
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(f"DELETE FROM history WHERE {_MONTH_SQL} IN ({', '.join('?' for _ in months)})",
+                             months)
+                conn.executemany(_UPSERT, [_row_params(rec) for records in records_by_month.values()
+                                           for rec in records])
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def import_csv(self, csv_path=None, replace=False):
+        """Ielādē CSV (jauno vai veco formātu) ar upsert; replace=True vispirms izdzēš esošo."""
+        return self._import(read_history_csv(csv_path or self.csv_path), replace)
+
+    def _import(self, records, replace=False):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if replace:
+                    conn.execute("DELETE FROM history")
+                conn.executemany(_UPSERT, [_row_params(rec) for rec in records])
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return len(records)
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM history")
+
+# ---------------------------------------------------------------------------
+# Kopīgā piekļuve
+# ---------------------------------------------------------------------------
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_history_store(csv_path, backend=None):
+    """Procesa kopīgā glabātuve konkrētam vēstures failam."""
+    backend = backend or HISTORY_BACKEND
+    key = (os.path.abspath(csv_path), backend)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            if backend == "csv":
+                store = CsvHistoryStore(csv_path)
+            elif backend == "sqlite":
+                store = SqliteHistoryStore(csv_path)
+            else:
+                raise ValueError(f"Nezināms vēstures glabāšanas veids: {backend}")
+            _stores[key] = store
+        return store
+
+def history_frame(history):
+    """
+    Skatam paredzēts DataFrame ar vecā formāta kolonnām (doc_id, date,
+    client_name, total, ...). `items` ir neatkodēts items_json teksts.
+    """
+    columns = ['doc_id', 'date', 'due_date', 'client_name', 'client_address', 'client_reg_no',
+               'client_vat_no', 'doc_type', 'total', 'items', 'comments', 'created_at']
+    if not history:
+        return pd.DataFrame(columns=columns)
+    df = pd.DataFrame.from_records(history)
+    df['items'] = df['items_json']
+    return df.reindex(columns=columns).fillna('')
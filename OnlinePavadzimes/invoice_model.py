@@ -0,0 +1,128 @@
+"""
+invoice_model.py — kopīgs rēķina izkārtojuma modelis visiem formātiem.
+
+Rēķina vārdnīca (no app.py vai /generate) tiek vienreiz pārvērsta
+InvoiceLayout objektā: dokumenta tips un virsraksts, klienta vai e-rēķina
+bloks, preču rindas kā teksts, kopsummu rindas ar treknraksta pazīmēm,
+avansa un "Vārdiem" teksts, paraksta uzraksti. PDF un DOCX ģeneratori tikai
+attēlo šo modeli, tāpēc abi formāti vienmēr rāda to pašu, un, ģenerējot
+abus formātus, aprēķini notiek vienreiz.
+"""
+
+DEFAULT_DOC_TYPE = 'Pavadzīme'
+
+# Piegādātāja un bankas rekvizīti (vienādi visos dokumentos un formātos)
+SUPPLIER_NAME = 'SIA Bratus'
+SUPPLIER_DETAILS = (
+    'Adrese: Ķekavas nov., Ķekava,',
+    'Dārzenieku iela 42, LV-2123',
+    'Reģ. Nr.: 40203628316',
+    'PVN Nr.: LV40203628316',
+    'Tālrunis: +371 24424434',
+)
+BANK_NAME = 'AS Swedbank'
+BANK_DETAILS = (
+    'SWIFT/BIC: HABALV22',
+)
+BANK_ACCOUNT_LABEL = 'Bankas konta numurs:'
+BANK_ACCOUNT = 'LV64HABA0551060367591'
+
+DEFAULT_SIGNATORY = f'{SUPPLIER_NAME} valdes loceklis Adrians Stankevičs'
+
+
+def fmt_curr(val):
+    return f"{val:,.2f}".replace(",", "X").replace(".", ",").replace("X", " ")
+
+
+class InvoiceLayout:
+    """Viena rēķina attēlojamie dati (bez formāta specifiskā noformējuma)."""
+
+    def __init__(self, data):
+        self.data = data
+        self.doc_type = data.get('doc_type', DEFAULT_DOC_TYPE)
+        doc_type_lower = self.doc_type.lower()
+        self.is_e_invoice = "e-rēķins" in doc_type_lower
+        self.is_advance = "avansa" in doc_type_lower
+        self.is_waybill = "pavadzīme" in doc_type_lower
+
+        # E-rēķins dokumentā tiek saukts vienkārši par rēķinu
+        self.display_doc_type = "Rēķins" if self.is_e_invoice else self.doc_type
+        self.doc_id = data.get('doc_id', 'BR 0000')
+        self.title = f"{self.display_doc_type} Nr. {self.doc_id}"
+        self.date = data.get('date', '')
+        self.due_date = data.get('due_date', '')
+
+        # Klients vai e-rēķina saņēmējs un pasūtītājs
+        self.client_name = data.get('client_name', '')
+        self.client_address = data.get('client_address', '')
+        self.client_reg_no = data.get('client_reg_no', '')
+        self.client_vat_no = data.get('client_vat_no', '')
+        self.receiver_name = data.get('receiver_name', '')
+        self.receiver_reg_no = data.get('receiver_reg_no', '')
+        self.receiver_address = data.get('receiver_address', '')
+        self.customer_name = data.get('customer_name', '')
+        self.customer_reg_no = data.get('customer_reg_no', '')
+        self.customer_address = data.get('customer_address', '')
+
+        # Preču rindas: (nosaukums ar kārtas nr., mērvienība, daudzums, cena, kopā)
+        self.items = []
+        for item in data.get('items', []):
+            seq_num = item.get('seq', '')
+            name_str = f"{seq_num}. {item['name']}" if seq_num else item['name']
+            self.items.append((name_str, str(item['unit']), str(item['qty']),
+                               str(item['price']), str(item['total'])))
+
+        # Kopsummas (jau formatētas teksta vērtības)
+        self.subtotal = data.get('subtotal', '0.00')
+        self.vat = data.get('vat', '0.00')
+        self.total = data.get('total', '0.00')
+        self.has_discount = data.get('raw_discount_eur', 0.0) > 0
+        self.discount_percent = f"{data.get('discount_percent', 0):g}"
+        self.discount_eur = data.get('discount_eur', '0.00')
+        self.subtotal_after_discount = data.get('subtotal_after_discount', '0.00')
+        self.totals = self._totals_rows()
+
+        self.advance_percent = int(round(data.get('advance_percent', 0)))
+        self.advance = fmt_curr(data.get('raw_advance', 0.0))
+        self.advance_text = None
+        if self.is_advance:
+            self.advance_text = f"APMAKSĀJAMAIS AVANSS ({self.advance_percent}%): {self.advance} €"
+
+        self.amount_words = data.get('amount_words', '')
+        self.words_text = f"Vārdiem: {self.amount_words}"
+        self.comments = data.get('comments', '').strip()
+
+        self.signatory = data.get('signatory', DEFAULT_SIGNATORY)
+        if self.is_waybill:
+            self.prepared_label, self.received_label = "Pavadzīmi sagatavoja: ", "Pavadzīmi saņēma:"
+        elif "avansa rēķins" in doc_type_lower:
+            self.prepared_label, self.received_label = "Avansa rēķinu sagatavoja: ", "Avansa rēķinu saņēma:"
+        else:
+            self.prepared_label, self.received_label = "Rēķinu sagatavoja: ", "Rēķinu saņēma:"
+
+    def _totals_rows(self):
+        """Kopsummu rindas: (uzraksts, vērtība ar €, uzraksts treknrakstā, vērtība treknrakstā)."""
+        if self.has_discount:
+            rows = [
+                ("KOPĀ (bez PVN un atlaides)", f"{self.subtotal} €"),
+                (f"Atlaides apjoms ({self.discount_percent}%)", f"-{self.discount_eur} €"),
+                ("Kopā ar atlaidi (bez PVN)", f"{self.subtotal_after_discount} €"),
+                ("PVN", f"{self.vat} €"),
+                ("KOPUMĀ APMAKSAI", f"{self.total} €"),
+            ]
+        else:
+            rows = [("KOPĀ", f"{self.subtotal} €"), ("PVN", f"{self.vat} €"), ("Kopumā", f"{self.total} €")]
+        # Avansa rēķinā kopsummas ir parastā rakstā; citos uzraksti un gala summa — treknrakstā
+        last = len(rows) - 1
+        return [(label, value, not self.is_advance, not self.is_advance and i == last)
+                for i, (label, value) in enumerate(rows)]
+
+
+def invoice_layout(data):
+    """InvoiceLayout no rēķina vārdnīcas (vai tas pats objekts, ja tas jau ir izveidots)."""
+    return data if isinstance(data, InvoiceLayout) else InvoiceLayout(data)
+
+
+def invoice_data(data):
+    """Sākotnējā rēķina vārdnīca (arī no InvoiceLayout)."""
+    return data.data if isinstance(data, InvoiceLayout) else data
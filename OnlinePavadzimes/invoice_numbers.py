@@ -0,0 +1,259 @@
+"""
+invoice_numbers.py — dokumentu numuru piešķiršana pa sērijām ("BR", "LSEO", ...).
+
+Agrāk nākamais numurs tika aprēķināts, katrā pārzīmēšanā pārlasot visu
+vēsturi, tikai "BR" sērijai, un divas vienlaicīgas sesijas varēja saņemt
+vienu un to pašu numuru. Šeit katrai sērijai SQLite datubāzē glabājas
+pēdējais izmantotais numurs un aktīvās rezervācijas:
+
+  * reserve(sērija, turētājs) — atomāri (BEGIN IMMEDIATE) piešķir mazāko
+    numuru, kas lielāks par pēdējo izmantoto un nav rezervēts citam;
+    atkārtots izsaukums tam pašam turētājam atgriež to pašu numuru un
+    pagarina rezervāciju;
+  * claim(sērija, numurs, turētājs) — rezervē konkrētu (piem. lietotāja
+    labotu) numuru pirms saglabāšanas; False, ja to tur cits turētājs;
+  * commit(sērija, numurs, turētājs) — numurs izmantots (dokuments saglabāts);
+  * release(sērija, numurs, turētājs) — rezervācija atcelta, numurs brīvs.
+
+Neizmantotas rezervācijas beidzas pēc RESERVATION_TTL sekundēm (sesija
+aizvērta). Skaitītāji tiek aizpildīti no vēstures tikai pirmajā lietošanas
+reizē (rebuild); pēc tam nākamā numura nolasīšana nav atkarīga no vēstures
+apjoma.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+NUMBERS_DB = os.environ.get("INVOICE_NUMBERS_DB", os.path.join(CURRENT_DIR, "invoice_numbers.db"))
+RESERVATION_TTL = float(os.environ.get("INVOICE_NUMBER_TTL", 3600))
+
+DEFAULT_SERIES = "BR"
+# Ja vēsture ir tukša, "BR" sērija sākas ar šo numuru (tāpat kā iepriekš)
+DEFAULT_FIRST_NUMBER = 49
+
+_DOC_ID_RE = re.compile(r'^\s*(.*?)\s*(\d+)\s*$')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    prefix         TEXT PRIMARY KEY,
+    last_committed INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS reservations (
+    prefix     TEXT NOT NULL,
+    number     INTEGER NOT NULL,
+    holder     TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (prefix, number)
+);
+CREATE INDEX IF NOT EXISTS idx_reservations_holder ON reservations (prefix, holder);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def parse_doc_id(doc_id):
+    """Sērija un numurs: "LSEO 0002" -> ("LSEO", 2); bez numura -> (teksts, None)."""
+    match = _DOC_ID_RE.match(str(doc_id or ''))
+    if not match or not match.group(1):
+        return str(doc_id or '').strip(), None
+    return match.group(1), int(match.group(2))
+
+
+def format_doc_id(prefix, number):
+    return f"{prefix} {number:04d}"
+
+
+def series_maxima(doc_ids):
+    """Lielākais numurs katrai sērijai: {"BR": 122, "LSEO": 2}."""
+    maxima = {}
+    for doc_id in doc_ids:
+        prefix, number = parse_doc_id(doc_id)
+        if number is not None and number > maxima.get(prefix, 0):
+            maxima[prefix] = number
+    return maxima
+
+
+class InvoiceNumbers:
+    def __init__(self, db_path=NUMBERS_DB, ttl=RESERVATION_TTL):
+        self.db_path = db_path
+        self.ttl = ttl
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _transaction(self, conn):
+        conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    # --- Inicializācija no vēstures ---
+
+    def initialized(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM meta WHERE key = 'initialized'").fetchone() is not None
+
+    def rebuild(self, doc_ids, reset=False):
+        """
+        Aizpilda skaitītājus no vēstures numuriem. Esošie skaitītāji netiek
+        samazināti (piem. pēc sinhronizācijas no GitHub), ja vien nav reset=True
+        (vēsturē dzēsti ieraksti).
+        """
+        maxima = series_maxima(doc_ids)
+        maxima.setdefault(DEFAULT_SERIES, DEFAULT_FIRST_NUMBER - 1)
+        with self._connect() as conn:
+            self._transaction(conn)
+            try:
+                if reset:
+                    conn.execute("DELETE FROM series")
+                conn.executemany(
+                    "INSERT INTO series (prefix, last_committed) VALUES (?, ?) "
+                    "ON CONFLICT (prefix) DO UPDATE SET last_committed = MAX(last_committed, excluded.last_committed)",
+                    list(maxima.items())
+                )
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('initialized', ?)", (str(time.time()),))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def ensure_initialized(self, load_doc_ids):
+        """Pirmajā lietošanas reizē aizpilda skaitītājus; `load_doc_ids()` tiek izsaukts tikai tad."""
+        if not self.initialized():
+            self.rebuild(load_doc_ids())
+
+    # --- Nolasīšana ---
+
+    def series(self):
+        """Zināmās sērijas (DEFAULT_SERIES vienmēr pirmā)."""
+        with self._connect() as conn:
+            prefixes = [row[0] for row in conn.execute("SELECT prefix FROM series ORDER BY prefix")]
+        return [DEFAULT_SERIES] + [p for p in prefixes if p != DEFAULT_SERIES]
+
+    def last(self, prefix):
+        """Pēdējais izmantotais numurs sērijā (0, ja sērijā vēl nav dokumentu)."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT last_committed FROM series WHERE prefix = ?", (prefix,)).fetchone()
+        return row[0] if row else 0
+
+    def _free_number(self, conn, prefix, holder, now):
+        row = conn.execute("SELECT last_committed FROM series WHERE prefix = ?", (prefix,)).fetchone()
+        number = (row[0] if row else 0) + 1
+        taken = {r[0] for r in conn.execute(
+            "SELECT number FROM reservations WHERE prefix = ? AND number >= ? AND holder != ? AND expires_at > ?",
+            (prefix, number, holder, now)
+        )}
+        while number in taken:
+            number += 1
+        return number
+
+    def peek(self, prefix, holder=""):
+        """Nākamais brīvais numurs (bez rezervēšanas)."""
+        with self._connect() as conn:
+            return self._free_number(conn, prefix, holder, time.time())
+
+    # --- Rezervācijas ---
+
+    def reserve(self, prefix, holder):
+        """Rezervē (vai pagarina esošo) numuru turētājam; atgriež numuru."""
+        now = time.time()
+        with self._connect() as conn:
+            self._transaction(conn)
+            try:
+                row = conn.execute(
+                    "SELECT r.number FROM reservations r LEFT JOIN series s ON s.prefix = r.prefix "
+                    "WHERE r.prefix = ? AND r.holder = ? AND r.number > COALESCE(s.last_committed, 0) "
+                    "ORDER BY r.number LIMIT 1",
+                    (prefix, holder)
+                ).fetchone()
+                number = row[0] if row else self._free_number(conn, prefix, holder, now)
+                # Turētājam sērijā ir ne vairāk kā viena rezervācija
+                conn.execute("DELETE FROM reservations WHERE prefix = ? AND (holder = ? OR expires_at <= ?)",
+                             (prefix, holder, now))
+                conn.execute("INSERT OR REPLACE INTO reservations (prefix, number, holder, expires_at) "
+                             "VALUES (?, ?, ?, ?)", (prefix, number, holder, now + self.ttl))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return number
+
+    def claim(self, prefix, number, holder):
+        """
+        Rezervē konkrētu numuru turētājam (aizstājot tā iepriekšējo rezervāciju
+        sērijā). Atgriež False, ja numurs ir aktīvi rezervēts citam turētājam.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            self._transaction(conn)
+            try:
+                taken = conn.execute(
+                    "SELECT 1 FROM reservations WHERE prefix = ? AND number = ? AND holder != ? AND expires_at > ?",
+                    (prefix, number, holder, now)
+                ).fetchone() is not None
+                if not taken:
+                    conn.execute("DELETE FROM reservations WHERE prefix = ? AND (holder = ? OR expires_at <= ?)",
+                                 (prefix, holder, now))
+                    conn.execute("INSERT OR REPLACE INTO reservations (prefix, number, holder, expires_at) "
+                                 "VALUES (?, ?, ?, ?)", (prefix, number, holder, now + self.ttl))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return not taken
+
+    def commit(self, prefix, number, holder=""):
+        """Atzīmē numuru kā izmantotu (dokuments saglabāts vēsturē)."""
+        with self._connect() as conn:
+            self._transaction(conn)
+            try:
+                conn.execute(
+                    "INSERT INTO series (prefix, last_committed) VALUES (?, ?) "
+                    "ON CONFLICT (prefix) DO UPDATE SET last_committed = MAX(last_committed, excluded.last_committed)",
+                    (prefix, number)
+                )
+                conn.execute("DELETE FROM reservations WHERE prefix = ? AND (number = ? OR holder = ?)",
+                             (prefix, number, holder))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def release(self, prefix, number, holder):
+        """Atceļ turētāja rezervāciju; numurs atkal brīvs citiem."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM reservations WHERE prefix = ? AND number = ? AND holder = ?",
+                         (prefix, number, holder))
+
+    def clear(self):
+        """Izdzēš skaitītājus un rezervācijas (nākamajā lietošanā tiks aizpildīti no vēstures)."""
+        with self._connect() as conn:
+            self._transaction(conn)
+            conn.execute("DELETE FROM series")
+            conn.execute("DELETE FROM reservations")
+            conn.execute("DELETE FROM meta WHERE key = 'initialized'")
+            conn.execute("COMMIT")
+
+
+_numbers = {}
+_numbers_lock = threading.Lock()
+
+
+def get_invoice_numbers(db_path=NUMBERS_DB):
+    """Procesa kopīgais numuru piešķīrējs."""
+    key = os.path.abspath(db_path)
+    with _numbers_lock:
+        numbers = _numbers.get(key)
+        if numbers is None:
+            numbers = _numbers[key] = InvoiceNumbers(db_path)
+        return numbers
@@ -6,10 +6,15 @@ Ieliek šo failu mapē: OnlinePavadzimes/pages/viewer.py
 import streamlit as st
 import pandas as pd
 import json
-import requests
-import base64
 import os
-from io import StringIO
+import sys
+
+# history_store atrodas vienu līmeni augstāk (blakus app.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from history_store import get_history_store
+from github_sync import (fetch_file, forget_etag, history_path,
+                         FETCH_OK, FETCH_NOT_MODIFIED, FETCH_MISSING, FETCH_ERROR)
+from history_shards import get_history_shards
 
 st.set_page_config(page_title="Pavadzīmju Uzskaitīšana", layout="wide")
 
@@ -18,8 +23,8 @@ st.set_page_config(page_title="Pavadzīmju Uzskaitīšana", layout="wide")
 # ---------------------------------------------------------------------------
 
 GITHUB_REPO           = "Andzhss/OnlinePavadzimes"
-GITHUB_HISTORY_PATH   = "OnlinePavadzimes/invoice_history.csv"
-GITHUB_TEST_HIST_PATH = "OnlinePavadzimes/test_invoice_history.csv"
+GITHUB_HISTORY_PATH   = history_path("OnlinePavadzimes/invoice_history.csv")
+GITHUB_TEST_HIST_PATH = history_path("OnlinePavadzimes/test_invoice_history.csv")
 
 # Lokālie faili (divi līmeņi augstāk no pages/)
 BASE_DIR              = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -34,43 +39,39 @@ def get_github_token():
     token = st.secrets.get("GITHUB_TOKEN", "")
     return token.strip().strip('"').strip("'") if token else ""
 
-def fetch_history_from_github(github_path):
-    """Lejupielādē history CSV no GitHub, atgriež DataFrame vai None."""
-    token = get_github_token()
-    url   = f"https://api.github.com/repos/{GITHUB_REPO}/contents/{github_path}"
-    headers = {"Accept": "application/vnd.github.v3+json"}
-    if token:
-        headers["Authorization"] = f"Bearer {token}"
-    try:
-        r = requests.get(url, headers=headers, timeout=10)
-        if r.status_code == 200:
-            content_b64 = r.json().get("content", "")
-            if content_b64:
-                content_str = base64.b64decode(content_b64).decode("utf-8")
-                if "doc_id" in content_str:
-                    return pd.read_csv(StringIO(content_str), dtype=str)
-    except Exception as e:
-        st.error(f"Kļūda ielādējot no GitHub: {e}")
-    return None
-
-def fetch_history_local(local_path):
-    """Ielādē history CSV lokāli."""
-    if os.path.exists(local_path):
-        try:
-            return pd.read_csv(local_path, dtype=str)
-        except Exception:
-            pass
-    return None
-
-def load_best_available(github_path, local_path, label=""):
-    """Mēģina GitHub, ja neizdevās — lokālo failu."""
-    df = fetch_history_from_github(github_path)
-    if df is not None and not df.empty:
-        return df, "github"
-    df = fetch_history_local(local_path)
-    if df is not None and not df.empty:
-        return df, "local"
-    return None, None
+def fetch_history_from_github(github_path, local_path=None):
+    """
+    Lejupielādē history CSV no GitHub. Atgriež (statuss, teksts); ja lokālā
+    kopija jau atbilst GitHub versijai, statuss ir FETCH_NOT_MODIFIED.
+    """
+    status, content = fetch_file(GITHUB_REPO, github_path, get_github_token(), local_path=local_path)
+    if status == FETCH_ERROR:
+        st.error(f"Kļūda ielādējot no GitHub: {content}")
+    elif status == FETCH_OK and not ("doc_id" in content or "kartas_nr" in content):
+        forget_etag(GITHUB_REPO, github_path)
+        return FETCH_ERROR, None
+    return status, content
+
+def sync_from_github(github_path, local_path):
+    """Atjauno vēsturi no GitHub (tikai mainītos mēnešus). Atgriež True, ja izdevās."""
+    status = get_history_shards(local_path, github_path).pull(
+        lambda path, local: fetch_file(GITHUB_REPO, path, get_github_token(), local_path=local)
+    )
+    if status in (FETCH_OK, FETCH_NOT_MODIFIED):
+        return True
+    if status != FETCH_MISSING:
+        return False
+    # GitHub vēl nav mēnešu daļu — vecais viena faila CSV
+    status, content = fetch_history_from_github(github_path, local_path)
+    if status == FETCH_NOT_MODIFIED:
+        # Nekas nav mainījies — netiek ne pārrakstīts fails, ne pārlasīta vēsture
+        return True
+    if status != FETCH_OK:
+        return False
+    with open(local_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    get_history_store(local_path).import_csv(local_path, replace=True)
+    return True
 
 def parse_items_summary(items_str):
     """No JSON stringa izveido īsu produktu kopsavilkumu."""
@@ -107,7 +108,7 @@ st.title("📋 Pavadzīmju Uzskaitīšanas Sistēma")
 st.caption("SIA BRATUS — visu izrakstīto dokumentu pārskats")
 
 # --- Izvēle: īstā vai testa vēsture ---
-col_tabs_l, col_tabs_r = st.columns([2, 1])
+col_tabs_l, col_tabs_m, col_tabs_r = st.columns([2, 1, 1])
 with col_tabs_l:
     view_mode = st.radio(
         "Skatīt:",
@@ -127,19 +128,23 @@ else:
     cache_key  = "viewer_df_test"
 
 # --- Datu ielāde ---
+# Sesijā pirmo reizi (vai pēc pogas) tiek mēģināts atjaunot no GitHub; dati
+# vienmēr tiek lasīti no kopīgās vēstures glabātuves (tās pašas, ko app.py).
 if sync_btn or cache_key not in st.session_state:
     with st.spinner("Ielādē datus..."):
-        df, source = load_best_available(gh_path, local_path)
-        if df is not None:
-            st.session_state[cache_key] = df
-            if source == "github" and sync_btn:
-                st.success("✅ Dati atjaunoti no GitHub")
-            elif source == "local":
-                st.info("ℹ️ Dati ielādēti lokāli (GitHub nav pieejams vai nav Token)")
-        else:
-            st.session_state[cache_key] = None
-
-df = st.session_state.get(cache_key)
+        synced = sync_from_github(gh_path, local_path)
+        st.session_state[cache_key] = "github" if synced else "local"
+        if synced and sync_btn:
+            st.success("✅ Dati atjaunoti no GitHub")
+        elif not synced:
+            st.info("ℹ️ Dati ielādēti lokāli (GitHub nav pieejams vai nav Token)")
+
+# Kešots procesa līmenī visām sesijām; pārlasīts tikai pēc vēstures faila izmaiņām.
+# Izvēloties mēnesi, tiek nolasīti tikai šī mēneša ieraksti.
+store = get_history_store(local_path)
+with col_tabs_m:
+    filter_month = st.selectbox("Mēnesis", ["Visi"] + store.months()[::-1])
+df = store.frame(None if filter_month == "Visi" else [filter_month])
 
 # ---------------------------------------------------------------------------
 # Galvenais saturs
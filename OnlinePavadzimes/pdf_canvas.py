@@ -0,0 +1,342 @@
+"""
+pdf_canvas.py — ātrais PDF ģenerators standarta rēķiniem.
+
+Zīmē to pašu izkārtojumu kā pdf_generator 'flow' režīms, bet tieši uz
+reportlab Canvas ar iepriekš aprēķinātām koordinātām (bez platypus
+Table/Paragraph izkārtošanas). Koordinātas atkārto platypus noteikumus:
+rāmja atkāpe 6 pt, šūnu atkāpes no TableStyle, pirmās rindas bāzes līnija
+= bloka augša - fonta izmērs.
+
+render_canvas() atgriež False, ja rēķins neder ātrajam ceļam (E-rēķins,
+HTML zīmes tekstā, pārāk garš teksts šūnā vai saturs neietilpst vienā
+lapā) — tad izsaucējs izmanto parasto platypus ceļu.
+"""
+
+import threading
+
+from reportlab.lib import colors
+from reportlab.lib.units import mm
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas as rl_canvas
+from reportlab.platypus import Paragraph
+
+from pdf_generator import (
+    THEME_COLOR, TEXT_COLOR, REGULAR_FONT, BOLD_FONT, ITALIC_FONT, BOLD_ITALIC_FONT,
+    style_normal, style_table_header,
+)
+from assets import logo_image_reader
+from invoice_model import (
+    invoice_layout, SUPPLIER_NAME, SUPPLIER_DETAILS, BANK_NAME, BANK_DETAILS, BANK_ACCOUNT_LABEL, BANK_ACCOUNT,
+)
+
+# Ja kāda šūna jālauž vairāk nekā tik rindās, izmantojam platypus
+MAX_WRAP_LINES = 3
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+FRAME_PAD = 6
+X0 = 20*mm                              # lapas kreisā mala (tabulas)
+PX = X0 + FRAME_PAD                     # rindkopu kreisā mala
+AVAIL_WIDTH = PAGE_WIDTH - 40*mm - 2*FRAME_PAD
+TABLE_WIDTH = 170*mm
+TOP = PAGE_HEIGHT - 15*mm - FRAME_PAD
+BOTTOM = 15*mm + FRAME_PAD
+
+LEADING = 13
+FONT_SIZE = 10
+
+ITEM_COLS = [65*mm, 25*mm, 25*mm, 25*mm, 30*mm]
+ITEM_ALIGN = ['left', 'center', 'center', 'right', 'right']
+ITEM_PAD = 5
+ITEM_VPAD = 6
+HEADER_LEADING = 11
+HEADERS = ["NOSAUKUMS", "Mērvienība", "DAUDZUMS", "CENA (EUR)", "KOPĀ (EUR)"]
+
+TOTALS_COLS = [80*mm, 60*mm, 30*mm]
+TOTALS_ROW_HEIGHT = 18
+
+SENDER_LINES = [[(BOLD_FONT, SUPPLIER_NAME)]] + [[(ITALIC_FONT, line)] for line in SUPPLIER_DETAILS]
+BANK_LINES = (
+    [[(BOLD_ITALIC_FONT, BANK_NAME)]]
+    + [[(ITALIC_FONT, line)] for line in BANK_DETAILS]
+    + [[(ITALIC_FONT, BANK_ACCOUNT_LABEL)], [(BOLD_ITALIC_FONT, BANK_ACCOUNT)]]
+)
+
+
+class _NotFastPath(Exception):
+    """Rēķins neder ātrajam ceļam."""
+
+
+def _clean(text):
+    text = str(text)
+    if '<' in text or '&' in text:
+        raise _NotFastPath()
+    return " ".join(text.split())
+
+
+# Paragraph ļauj rindai būt nedaudz platākai par kolonnu, saspiežot atstarpes
+SPACE_SHRINKAGE = style_normal.spaceShrinkage
+
+
+def _wrap(text, font, width, size):
+    space = stringWidth(' ', font, size)
+    shrink = SPACE_SHRINKAGE * space
+    lines, line, current = [], [], -space
+    for word in text.split(' '):
+        word_w = stringWidth(word, font, size)
+        if word_w > width:
+            raise _NotFastPath()
+        new_w = current + space + word_w
+        if line and new_w > width + shrink * len(line):
+            lines.append(' '.join(line))
+            line, current = [word], word_w
+        else:
+            line.append(word)
+            current = new_w
+    lines.append(' '.join(line))
+    return lines
+
+
+def _split(text, font, width, size=FONT_SIZE):
+    """Lauž tekstu rindās tāpat kā Paragraph; garus vārdus neatbalstām."""
+    lines = []
+    for raw in str(text).split('\n'):
+        raw = _clean(raw)
+        lines.extend(_wrap(raw, font, width, size) if raw else [''])
+    if len(lines) > MAX_WRAP_LINES and width < AVAIL_WIDTH:
+        raise _NotFastPath()
+    return lines
+
+
+_static = threading.local()
+
+def _header_lines():
+    """Tabulas galvenes rindas (platypus lauž arī garus vārdus, piem. 'DAUDZUM' / 'S')."""
+    cached = getattr(_static, 'headers', None)
+    if cached is None:
+        cached = []
+        for text, col_w in zip(HEADERS, ITEM_COLS):
+            para = Paragraph(text, style_table_header)
+            para.wrap(col_w - 2*ITEM_PAD, PAGE_HEIGHT)
+            cached.append([" ".join(words) for _, words in para.blPara.lines])
+        _static.headers = cached
+    return cached
+
+
+def _draw_line(c, x, y, text, font, align='left', width=0, size=FONT_SIZE):
+    c.setFont(font, size)
+    if width and ' ' in text:
+        # Rinda, kas platāka par kolonnu, tiek saspiesta atstarpēs (kā Paragraph)
+        overflow = stringWidth(text, font, size) - width
+        if overflow > 0:
+            c.drawString(x, y, text, wordSpace=-overflow / text.count(' '))
+            return
+    if align == 'right':
+        c.drawRightString(x + width, y, text)
+    elif align == 'center':
+        c.drawCentredString(x + width / 2.0, y, text)
+    else:
+        c.drawString(x, y, text)
+
+
+def _draw_lines(c, lines, x, top, font, align='left', width=0, leading=LEADING, size=FONT_SIZE):
+    """Zīmē rindkopu; atgriež tās augstumu."""
+    y = top - size
+    for line in lines:
+        _draw_line(c, x, y, line, font, align, width, size)
+        y -= leading
+    return len(lines) * leading
+
+
+def _layout_items(inv):
+    items = inv.items or [('', '', '', '', '')] * 3
+    fonts = [REGULAR_FONT] * 5
+    rows = []
+    for cells in items:
+        wrapped = [_split(text, fonts[i], ITEM_COLS[i] - 2*ITEM_PAD) for i, text in enumerate(cells)]
+        height = max(len(w) for w in wrapped) * LEADING + 2*ITEM_VPAD
+        rows.append((wrapped, height))
+    return rows
+
+
+def _totals_rows(inv):
+    return [(_clean(label), _clean(value),
+             (BOLD_FONT if label_bold else REGULAR_FONT, BOLD_FONT if value_bold else REGULAR_FONT))
+            for label, value, label_bold, value_bold in inv.totals]
+
+
+def _hline(c, x1, x2, y, color, width):
+    c.setStrokeColor(color)
+    c.setLineWidth(width)
+    c.line(x1, y, x2, y)
+
+
+def render_canvas(data, buffer):
+    """Ģenerē PDF buferī. Atgriež False, ja jāizmanto platypus ceļš."""
+    inv = invoice_layout(data)
+    if inv.is_e_invoice:
+        return False
+    try:
+        return _render(inv, buffer)
+    except _NotFastPath:
+        return False
+
+
+def _render(inv, buffer):
+    # --- Viss teksts tiek salauzts rindās pirms zīmēšanas ---
+    title_lines = _split(inv.title, BOLD_FONT, 85*mm, size=14)
+    date_line = _clean(f"Datums: {inv.date}")
+    due_line = _clean(f"Apmaksāt līdz: {inv.due_date}")
+    client_lines = [
+        (BOLD_FONT, _split(inv.client_name, BOLD_FONT, AVAIL_WIDTH)),
+        (ITALIC_FONT, _split(f"Adrese: {inv.client_address}", ITALIC_FONT, AVAIL_WIDTH)),
+        (ITALIC_FONT, _split(f"Reģ. Nr.: {inv.client_reg_no}", ITALIC_FONT, AVAIL_WIDTH)),
+        (ITALIC_FONT, _split(f"PVN Nr.: {inv.client_vat_no}", ITALIC_FONT, AVAIL_WIDTH)),
+    ]
+    item_rows = _layout_items(inv)
+    header_lines = _header_lines()
+    totals = _totals_rows(inv)
+    words_lines = _split(inv.words_text, ITALIC_FONT, AVAIL_WIDTH)
+    advance_lines = _split(inv.advance_text, BOLD_FONT, AVAIL_WIDTH) if inv.advance_text else None
+    comment_lines = _split(inv.comments, REGULAR_FONT, AVAIL_WIDTH) if inv.comments else None
+    prepared, received = inv.prepared_label + inv.signatory, inv.received_label
+    sig_width = 100*mm - 2*FRAME_PAD
+    prepared_lines = _split(prepared, ITALIC_FONT, sig_width)
+    received_lines = _split(received, ITALIC_FONT, sig_width)
+
+    # --- Kopējais augstums: ja neietilpst vienā lapā, izmantojam platypus ---
+    header_row_h = max(len(l) for l in header_lines) * HEADER_LEADING + 2*ITEM_VPAD
+    logo = logo_image_reader()
+    if logo is not None:
+        iw, ih = logo.getSize()
+        scale = min(35*mm / iw, 26*mm / ih)
+        logo_w, logo_h = iw * scale, ih * scale
+    else:
+        logo_w, logo_h = 0, LEADING
+    header_text_h = len(title_lines) * 18 + 2*mm + 24
+    header_h = max(logo_h, header_text_h) + 6
+    client_h = LEADING + 2*mm + sum(len(l) for _, l in client_lines) * LEADING
+    info_h = max(len(SENDER_LINES), len(BANK_LINES)) * LEADING + 6
+    items_h = header_row_h + sum(h for _, h in item_rows)
+    totals_h = len(totals) * TOTALS_ROW_HEIGHT
+    words_h = 5*mm + len(words_lines) * LEADING
+    if advance_lines:
+        words_h += len(advance_lines) * LEADING + 2*mm
+    comments_h = 10*mm + LEADING + len(comment_lines) * LEADING if comment_lines else 0
+    sig_row1 = len(prepared_lines) * LEADING + 13
+    sig_row2 = len(received_lines) * LEADING + 13
+    total_h = (header_h + 3*mm + 5*mm + client_h + 3*mm + 5*mm + info_h + 10*mm + items_h
+               + 2*mm + totals_h + words_h + comments_h + 5*mm + 2*mm + sig_row1 + sig_row2)
+    if TOP - total_h < BOTTOM:
+        raise _NotFastPath()
+
+    c = rl_canvas.Canvas(buffer, pagesize=A4)
+    c.setFillColor(TEXT_COLOR)
+    y = TOP
+
+    # 1. Logo un dokumenta info
+    if logo is not None:
+        c.drawImage(logo, X0, y - 3 - logo_h, width=logo_w, height=logo_h, mask='auto')
+    else:
+        _draw_lines(c, ["LOGO"], X0, y - 3, BOLD_FONT)
+    right_x, right_w = X0 + 85*mm, 85*mm
+    ty = y - 3
+    ty -= _draw_lines(c, title_lines, right_x, ty, BOLD_FONT, 'right', right_w, leading=18, size=14)
+    ty -= 2*mm
+    ty -= _draw_lines(c, [date_line], right_x, ty, REGULAR_FONT, 'right', right_w, leading=12)
+    _draw_lines(c, [due_line], right_x, ty, REGULAR_FONT, 'right', right_w, leading=12)
+    y -= header_h + 3*mm
+    _hline(c, PX, PX + TABLE_WIDTH, y, THEME_COLOR, 0.5)
+    y -= 5*mm
+
+    # 2. Klients
+    c.setFillColor(TEXT_COLOR)
+    y -= _draw_lines(c, ["KLIENTS"], PX, y, BOLD_FONT)
+    y -= 2*mm
+    for font, lines in client_lines:
+        y -= _draw_lines(c, lines, PX, y, font)
+    y -= 3*mm
+    _hline(c, PX, PX + TABLE_WIDTH, y, THEME_COLOR, 0.2)
+    y -= 5*mm
+
+    # 3. Piegādātājs un banka
+    for col_x, block in ((X0, SENDER_LINES), (X0 + 85*mm, BANK_LINES)):
+        ly = y - 3 - FONT_SIZE
+        for parts in block:
+            _draw_line(c, col_x, ly, parts[0][1], parts[0][0])
+            ly -= LEADING
+    y -= info_h + 10*mm
+
+    # 4. Preču tabula
+    col_x = [X0]
+    for w in ITEM_COLS:
+        col_x.append(col_x[-1] + w)
+    table_top = y
+    row_tops = [table_top, table_top - header_row_h]
+    for _, h in item_rows:
+        row_tops.append(row_tops[-1] - h)
+    table_bottom = row_tops[-1]
+
+    c.setFillColor(THEME_COLOR)
+    c.rect(X0, row_tops[1], TABLE_WIDTH, header_row_h, stroke=0, fill=1)
+    c.setStrokeColor(colors.white)
+    c.setLineWidth(1)
+    for x in col_x[1:-1]:
+        c.line(x, row_tops[1], x, table_top)
+    c.setStrokeColor(THEME_COLOR)
+    c.setLineWidth(0.5)
+    for ry in row_tops:
+        c.line(X0, ry, X0 + TABLE_WIDTH, ry)
+    for x in col_x:
+        c.line(x, table_bottom, x, table_top)
+
+    c.setFillColor(colors.white)
+    for i, lines in enumerate(header_lines):
+        text_h = len(lines) * HEADER_LEADING
+        top = table_top - ITEM_VPAD - (header_row_h - 2*ITEM_VPAD - text_h) / 2.0
+        _draw_lines(c, lines, col_x[i] + ITEM_PAD, top, BOLD_FONT, 'center',
+                    ITEM_COLS[i] - 2*ITEM_PAD, leading=HEADER_LEADING)
+    c.setFillColor(TEXT_COLOR)
+    for (wrapped, _), row_top in zip(item_rows, row_tops[1:]):
+        for i, lines in enumerate(wrapped):
+            _draw_lines(c, lines, col_x[i] + ITEM_PAD, row_top - ITEM_VPAD, REGULAR_FONT,
+                        ITEM_ALIGN[i], ITEM_COLS[i] - 2*ITEM_PAD)
+    y = table_bottom - 2*mm
+
+    # 5. Kopsummas (virknes tabulā: VALIGN BOTTOM, atkāpes 3/6 pt, rindstarpa 12)
+    right_edge = X0 + TABLE_WIDTH - 6
+    label_right = X0 + TOTALS_COLS[0] + TOTALS_COLS[1] - 6
+    for label, value, (label_font, value_font) in totals:
+        base = y - TOTALS_ROW_HEIGHT + 3 + 12 - FONT_SIZE
+        _draw_line(c, 0, base, label, label_font, 'right', label_right)
+        _draw_line(c, 0, base, value, value_font, 'right', right_edge)
+        y -= TOTALS_ROW_HEIGHT
+
+    # 6. Summa vārdiem un avanss
+    y -= 5*mm
+    if advance_lines:
+        y -= _draw_lines(c, advance_lines, PX, y, BOLD_FONT, 'right', AVAIL_WIDTH)
+        y -= 2*mm
+    y -= _draw_lines(c, words_lines, PX, y, ITALIC_FONT, 'right', AVAIL_WIDTH)
+
+    # 7. Papildinformācija
+    if comment_lines:
+        y -= 10*mm
+        y -= _draw_lines(c, ["Papildus informācija:"], PX, y, BOLD_FONT)
+        y -= _draw_lines(c, comment_lines, PX, y, REGULAR_FONT)
+
+    # 8. Paraksti (VALIGN BOTTOM, apakšējā atkāpe 10 pt)
+    y -= 5*mm
+    _hline(c, PX, PX + TABLE_WIDTH, y, THEME_COLOR, 0.2)
+    y -= 2*mm
+    c.setFillColor(TEXT_COLOR)
+    for lines, row_h in ((prepared_lines, sig_row1), (received_lines, sig_row2)):
+        row_bottom = y - row_h
+        _draw_lines(c, lines, PX, row_bottom + 10 + len(lines) * LEADING, ITALIC_FONT)
+        _draw_line(c, 0, row_bottom + 10 + 12 - FONT_SIZE, "__________________________",
+                   'Helvetica', 'right', X0 + TABLE_WIDTH - 6)
+        y = row_bottom
+
+    c.showPage()
+    c.save()
+    return True
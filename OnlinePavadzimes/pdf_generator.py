@@ -1,19 +1,29 @@
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.lib.units import mm
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image as RLImage, Flowable
+from reportlab.platypus import SimpleDocTemplate, Table, LongTable, TableStyle, Paragraph, Spacer, Image as RLImage, Flowable
+from reportlab.platypus import BaseDocTemplate, PageTemplate, Frame, NextPageTemplate
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfgen import canvas
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.enums import TA_RIGHT, TA_LEFT, TA_CENTER
 import urllib.request
+import threading
 import io
 import os
 
+from assets import logo_image_reader, logo_stream
+from invoice_model import (
+    invoice_layout, SUPPLIER_NAME, SUPPLIER_DETAILS, BANK_NAME, BANK_DETAILS, BANK_ACCOUNT_LABEL, BANK_ACCOUNT,
+)
+
 # --- Krāsu definīcijas ---
 THEME_COLOR = colors.HexColor("#CDBF96")
 TEXT_COLOR = colors.black
 
+PAGE_WIDTH, PAGE_HEIGHT = A4
+
 # --- Fontu ielāde ---
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 FONTS_DIR = os.path.join(CURRENT_DIR, "fonts")
@@ -64,128 +74,115 @@ class HorizontalLine(Flowable):
         self.canv.setLineWidth(self.thickness)
         self.canv.line(0, 0, self.width, 0)
 
-def fmt_curr(val):
-    return f"{val:,.2f}".replace(",", "X").replace(".", ",").replace("X", " ")
+# --- Stilu definīcijas (vienreiz moduļa ielādē, nevis katrā generate_pdf izsaukumā) ---
+_styles = getSampleStyleSheet()
 
-def generate_pdf(data):
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4,
-                            rightMargin=20*mm, leftMargin=20*mm,
-                            topMargin=15*mm, bottomMargin=15*mm)
-    
-    styles = getSampleStyleSheet()
-    
-    # --- Stilu definīcijas ---
-    style_normal = ParagraphStyle(
-        'CustomNormal',
-        parent=styles['Normal'],
-        fontName=REGULAR_FONT,
-        fontSize=10,
-        leading=13,
-        textColor=TEXT_COLOR
-    )
-    style_bold = ParagraphStyle(
-        'CustomBold',
-        parent=styles['Normal'],
-        fontName=BOLD_FONT,
-        fontSize=10,
-        leading=13,
-        textColor=TEXT_COLOR
-    )
-    style_italic = ParagraphStyle(
-        'CustomItalic',
-        parent=styles['Normal'],
-        fontName=ITALIC_FONT,
-        fontSize=10,
-        leading=13,
-        textColor=TEXT_COLOR
-    )
-    
-    style_header_title = ParagraphStyle(
-        'HeaderTitle',
-        parent=styles['Normal'],
-        fontName=BOLD_FONT,
-        fontSize=14,
-        alignment=TA_RIGHT,
-        leading=18,
-        textColor=TEXT_COLOR
-    )
-    style_header_info = ParagraphStyle(
-        'HeaderInfo',
-        parent=styles['Normal'],
-        fontName=REGULAR_FONT,
-        fontSize=10,
-        alignment=TA_RIGHT,
-        leading=12,
-        textColor=TEXT_COLOR
-    )
-
-    style_table_header = ParagraphStyle(
-        'TableHeader',
-        parent=styles['Normal'],
-        fontName=BOLD_FONT,
-        fontSize=10,
-        alignment=TA_CENTER,
-        textColor=colors.white,
-        leading=11
-    )
-    
-    style_cell_left = ParagraphStyle('CellLeft', parent=style_normal, alignment=TA_LEFT)
-    style_cell_center = ParagraphStyle('CellCenter', parent=style_normal, alignment=TA_CENTER)
-    style_cell_right = ParagraphStyle('CellRight', parent=style_normal, alignment=TA_RIGHT)
+style_normal = ParagraphStyle(
+    'CustomNormal',
+    parent=_styles['Normal'],
+    fontName=REGULAR_FONT,
+    fontSize=10,
+    leading=13,
+    textColor=TEXT_COLOR
+)
+style_bold = ParagraphStyle(
+    'CustomBold',
+    parent=_styles['Normal'],
+    fontName=BOLD_FONT,
+    fontSize=10,
+    leading=13,
+    textColor=TEXT_COLOR
+)
+style_italic = ParagraphStyle(
+    'CustomItalic',
+    parent=_styles['Normal'],
+    fontName=ITALIC_FONT,
+    fontSize=10,
+    leading=13,
+    textColor=TEXT_COLOR
+)
 
-    elements = []
-    
-    # ==========================================
-    # 1. LOGO UN DOKUMENTA INFO
-    # ==========================================
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    logo_filename = "BRATUS MELNS LOGO PNG.png"
-    logo_path = os.path.join(current_dir, logo_filename)
-    
-    if os.path.exists(logo_path):
-        logo = RLImage(logo_path, width=35*mm, height=26*mm, kind='proportional') 
+style_header_title = ParagraphStyle(
+    'HeaderTitle',
+    parent=_styles['Normal'],
+    fontName=BOLD_FONT,
+    fontSize=14,
+    alignment=TA_RIGHT,
+    leading=18,
+    textColor=TEXT_COLOR
+)
+style_header_info = ParagraphStyle(
+    'HeaderInfo',
+    parent=_styles['Normal'],
+    fontName=REGULAR_FONT,
+    fontSize=10,
+    alignment=TA_RIGHT,
+    leading=12,
+    textColor=TEXT_COLOR
+)
+
+style_table_header = ParagraphStyle(
+    'TableHeader',
+    parent=_styles['Normal'],
+    fontName=BOLD_FONT,
+    fontSize=10,
+    alignment=TA_CENTER,
+    textColor=colors.white,
+    leading=11
+)
+
+style_cell_left = ParagraphStyle('CellLeft', parent=style_normal, alignment=TA_LEFT)
+style_cell_center = ParagraphStyle('CellCenter', parent=style_normal, alignment=TA_CENTER)
+style_cell_right = ParagraphStyle('CellRight', parent=style_normal, alignment=TA_RIGHT)
+style_words = ParagraphStyle('Words', parent=style_italic, alignment=TA_RIGHT)
+
+
+# --- Nemainīgie bloki: logo, SIA Bratus rekvizīti un banka ---
+# Flowable objekti glabā izkārtojuma stāvokli (wrap), tāpēc tos nedrīkst
+# vienlaikus lietot vairāki pavedieni — katram pavedienam sava kopija.
+_static = threading.local()
+
+def _build_static_flowables():
+    logo_file = logo_stream()
+    if logo_file is not None:
+        logo = RLImage(logo_file, width=35*mm, height=26*mm, kind='proportional')
     else:
         logo = Paragraph("LOGO", style_bold)
-    
-    doc_type = data.get('doc_type', 'Pavadzīme')
-    display_doc_type = "Pavadzīme" if "e-rēķins" in doc_type.lower() else doc_type
 
-    doc_id = data.get('doc_id', 'BR 0000')
-    date = data.get('date', '')
-    due_date = data.get('due_date', '')
-    
-    header_text = [
-        Paragraph(f"{display_doc_type} Nr. {doc_id}", style_header_title),
-        Spacer(1, 2*mm),
-        Paragraph(f"Datums: {date}", style_header_info),
-        Paragraph(f"Apmaksāt līdz: {due_date}", style_header_info),
-    ]
-    
-    header_table = Table([[logo, header_text]], colWidths=[85*mm, 85*mm])
-    header_table.setStyle(TableStyle([
+    sender_data = [Paragraph(f"<b>{SUPPLIER_NAME}</b>", style_normal)]
+    sender_data += [Paragraph(f"<i>{line}</i>", style_normal) for line in SUPPLIER_DETAILS]
+
+    bank_data = [Paragraph(f"<b><i>{BANK_NAME}</i></b>", style_normal)]
+    bank_data += [Paragraph(f"<i>{line}</i>", style_normal) for line in BANK_DETAILS]
+    bank_data.append(Paragraph(f"<i>{BANK_ACCOUNT_LABEL} <b>{BANK_ACCOUNT}</b></i>", style_normal))
+
+    info_table = Table([[sender_data, bank_data]], colWidths=[85*mm, 85*mm])
+    info_table.setStyle(TableStyle([
         ('VALIGN', (0,0), (-1,-1), 'TOP'),
-        ('ALIGN', (0,0), (0,0), 'LEFT'),
-        ('ALIGN', (1,0), (1,0), 'RIGHT'),
         ('LEFTPADDING', (0,0), (-1,-1), 0),
-        ('RIGHTPADDING', (0,0), (-1,-1), 0),
     ]))
-    elements.append(header_table)
-    elements.append(Spacer(1, 3*mm))
-    elements.append(HorizontalLine()) 
-    elements.append(Spacer(1, 5*mm))
-    
-    # ==========================================
-    # 2. KLIENTS VAI E-RĒĶINA INFO
-    # ==========================================
-    if "e-rēķins" in doc_type.lower():
-        rec_name = data.get('receiver_name', '')
-        rec_reg = data.get('receiver_reg_no', '')
-        rec_addr = data.get('receiver_address', '')
-        
-        cus_name = data.get('customer_name', '')
-        cus_reg = data.get('customer_reg_no', '')
-        cus_addr = data.get('customer_address', '')
+    return {'logo': logo, 'info_table': info_table}
+
+def _static_flowables():
+    cached = getattr(_static, 'flowables', None)
+    if cached is None:
+        cached = _static.flowables = _build_static_flowables()
+    return cached
+
+def _header_text(inv):
+    return [
+        Paragraph(inv.title, style_header_title),
+        Spacer(1, 2*mm),
+        Paragraph(f"Datums: {inv.date}", style_header_info),
+        Paragraph(f"Apmaksāt līdz: {inv.due_date}", style_header_info),
+    ]
+
+def _client_flowables(inv):
+    """Klienta (vai e-rēķina saņēmēja/pasūtītāja) bloks bez noslēdzošās līnijas."""
+    elements = []
+    if inv.is_e_invoice:
+        rec_name, rec_reg, rec_addr = inv.receiver_name, inv.receiver_reg_no, inv.receiver_address
+        cus_name, cus_reg, cus_addr = inv.customer_name, inv.customer_reg_no, inv.customer_address
 
         # Izmantojam vienu HTML stila Paragraph katram, lai garantētu lauku neizzušanu
         rec_text = f"<b>Saņēmējs</b><br/><br/><b>{rec_name}</b><br/><b>Reģ. Nr.:</b> {rec_reg}<br/><b>Juridiskā adrese:</b> {rec_addr}"
@@ -201,55 +198,97 @@ def generate_pdf(data):
             ('RIGHTPADDING', (0,0), (-1,-1), 0),
         ]))
         elements.append(e_invoice_table)
-        elements.append(Spacer(1, 5*mm))
-        elements.append(HorizontalLine(thickness=0.2))
-        elements.append(Spacer(1, 5*mm))
-
-        elements.append(Paragraph("<b>Nosūtītājs</b>", style_normal))
-        elements.append(Spacer(1, 3*mm))
     else:
         elements.append(Paragraph("KLIENTS", style_bold))
         elements.append(Spacer(1, 2*mm))
 
-        elements.append(Paragraph(f"<b>{data.get('client_name', '')}</b>", style_normal))
-        elements.append(Paragraph(f"<i>Adrese: {data.get('client_address', '')}</i>", style_normal))
-        elements.append(Paragraph(f"<i>Reģ. Nr.: {data.get('client_reg_no', '')}</i>", style_normal))
-        elements.append(Paragraph(f"<i>PVN Nr.: {data.get('client_vat_no', '')}</i>", style_normal))
+        elements.append(Paragraph(f"<b>{inv.client_name}</b>", style_normal))
+        elements.append(Paragraph(f"<i>Adrese: {inv.client_address}</i>", style_normal))
+        elements.append(Paragraph(f"<i>Reģ. Nr.: {inv.client_reg_no}</i>", style_normal))
+        elements.append(Paragraph(f"<i>PVN Nr.: {inv.client_vat_no}</i>", style_normal))
+    return elements
 
-        elements.append(Spacer(1, 3*mm))
-        elements.append(HorizontalLine(thickness=0.2))
-        elements.append(Spacer(1, 5*mm))
-    
-    # ==========================================
-    # 3. PIEGĀDĀTĀJS UN BANKA
-    # ==========================================
-    sender_data = [
-        Paragraph("<b>SIA Bratus</b>", style_normal),
-        Paragraph(f"<i>Adrese: Ķekavas nov., Ķekava,</i>", style_normal),
-        Paragraph(f"<i>Dārzenieku iela 42, LV-2123</i>", style_normal),
-        Paragraph(f"<i>Reģ. Nr.: 40203628316</i>", style_normal),
-        Paragraph(f"<i>PVN Nr.: LV40203628316</i>", style_normal),
-        Paragraph(f"<i>Tālrunis: +371 24424434</i>", style_normal),
-    ]
-    
-    bank_data = [
-        Paragraph("<b><i>AS Swedbank</i></b>", style_normal),
-        Paragraph(f"<i>SWIFT/BIC: HABALV22</i>", style_normal),
-        Paragraph(f"<i>Bankas konta numurs: <b>LV64HABA0551060367591</b></i>", style_normal),
-    ]
-    
-    info_table = Table([[sender_data, bank_data]], colWidths=[85*mm, 85*mm])
-    info_table.setStyle(TableStyle([
-        ('VALIGN', (0,0), (-1,-1), 'TOP'),
-        ('LEFTPADDING', (0,0), (-1,-1), 0),
-    ]))
-    elements.append(info_table)
-    
-    elements.append(Spacer(1, 10*mm))
-    
-    # ==========================================
-    # 4. PREČU TABULA
-    # ==========================================
+ITEM_COL_WIDTHS = [65*mm, 25*mm, 25*mm, 25*mm, 30*mm]
+
+# Rēķinā bez pozīcijām tabulā tiek parādītas trīs tukšas rindas
+BLANK_ITEM_ROWS = [('', '', '', '', '')] * 3
+
+def _item_rows(inv):
+    return inv.items or BLANK_ITEM_ROWS
+
+def _plain_name(name_str):
+    """Nosaukums kā vienkārša virkne, ja to nav jālauž un tajā nav marķējuma."""
+    if '<' in name_str or '&' in name_str or '\n' in name_str:
+        return None
+    if pdfmetrics.stringWidth(name_str, REGULAR_FONT, 10) > ITEM_COL_WIDTHS[0] - 10:
+        return None
+    return name_str
+
+class _PagedItemsTable(Flowable):
+    """
+    Lielā preču tabula, kas tiek sadalīta pa lapām pati: katrai lapai tiek
+    izveidota atsevišķa LongTable tikai ar tajā ietilpstošajām rindām (un
+    galveni). Vienas LongTable dalīšana katrā lapā kopē un pārrēķina visas
+    atlikušās rindas, tāpēc tūkstošiem pozīciju laiks auga kvadrātiski.
+    Rindu augstumi ir zināmi iepriekš, tāpēc dalīšanas vieta ir aprēķināma.
+    """
+
+    def __init__(self, header, rows, row_heights, style, start=0, header_height=None):
+        Flowable.__init__(self)
+        self.hAlign = 'CENTER'  # kā Table
+        self.header = header
+        self.rows = rows
+        self.row_heights = row_heights
+        self.style = style
+        self.start = start
+        if header_height is None:
+            header_height = max(p.wrap(w - 10, PAGE_HEIGHT)[1]
+                                for p, w in zip(header, ITEM_COL_WIDTHS)) + 12
+        self.header_height = header_height
+        self._table = None
+
+    def _page_table(self, end):
+        t = LongTable([self.header] + self.rows[self.start:end], colWidths=ITEM_COL_WIDTHS,
+                      rowHeights=[self.header_height] + self.row_heights[self.start:end], repeatRows=1)
+        t.setStyle(self.style)
+        return t
+
+    def _fit(self, avail_height):
+        """Indekss aiz pēdējās rindas, kas ietilpst augstumā avail_height."""
+        used = self.header_height
+        end = self.start
+        while end < len(self.rows) and used + self.row_heights[end] <= avail_height:
+            used += self.row_heights[end]
+            end += 1
+        return end
+
+    def wrap(self, availWidth, availHeight):
+        if self._fit(availHeight) == len(self.rows):
+            self._table = self._page_table(len(self.rows))
+            self.width, self.height = self._table.wrap(availWidth, availHeight)
+        else:
+            self._table = None
+            self.width = sum(ITEM_COL_WIDTHS)
+            self.height = self.header_height + sum(self.row_heights[self.start:])
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        end = self._fit(availHeight)
+        if end == self.start:
+            return []
+        rest = _PagedItemsTable(self.header, self.rows, self.row_heights, self.style,
+                                start=end, header_height=self.header_height)
+        return [self._page_table(end), rest]
+
+    def draw(self):
+        self._table.drawOn(self.canv, 0, 0)
+
+def _items_table(inv, large=False):
+    """
+    Preču tabula. Lielajos rēķinos (large=True) tabula tiek dalīta pa lapām
+    ar galveni katrā lapā (_PagedItemsTable), un skaitļu kolonnas (un īsie
+    nosaukumi) ir vienkāršas virknes, nevis Paragraph — tās nav jāizkārto.
+    """
     headers = [
         Paragraph("NOSAUKUMS", style_table_header),
         Paragraph("Mērvienība", style_table_header),
@@ -259,28 +298,26 @@ def generate_pdf(data):
     ]
     
     table_data = [headers]
-    items = data.get('items', [])
-    
-    if not items:
-        for _ in range(3):
-            items.append({'name': '', 'unit': '', 'qty': '', 'price': '', 'total': ''})
-
-    for item in items:
-        seq_num = item.get('seq', '')
-        name_str = f"{seq_num}. {item['name']}" if seq_num else item['name']
-        table_data.append([
-            Paragraph(name_str, style_cell_left),
-            Paragraph(item['unit'], style_cell_center),
-            Paragraph(str(item['qty']), style_cell_center),
-            Paragraph(item['price'], style_cell_right),
-            Paragraph(item['total'], style_cell_right)
-        ])
-        
-    col_widths = [65*mm, 25*mm, 25*mm, 25*mm, 30*mm]
-    
-    t = Table(table_data, colWidths=col_widths)
-    
-    t.setStyle(TableStyle([
+    row_heights = [None]
+    for name_str, unit, qty, price, total in _item_rows(inv):
+        if large:
+            name_cell = _plain_name(name_str)
+            if name_cell is None:
+                name_cell = Paragraph(name_str, style_cell_left)
+                row_heights.append(name_cell.wrap(ITEM_COL_WIDTHS[0] - 10, PAGE_HEIGHT)[1] + 12)
+            else:
+                row_heights.append(13 + 12)
+            table_data.append([name_cell, unit, qty, price, total])
+        else:
+            table_data.append([
+                Paragraph(name_str, style_cell_left),
+                Paragraph(unit, style_cell_center),
+                Paragraph(qty, style_cell_center),
+                Paragraph(price, style_cell_right),
+                Paragraph(total, style_cell_right)
+            ])
+
+    style = [
         ('BACKGROUND', (0,0), (-1,0), THEME_COLOR),
         ('VALIGN', (0,0), (-1,0), 'MIDDLE'),
         ('LINEBEFORE', (1,0), (-1,0), 1, colors.white), 
@@ -290,53 +327,49 @@ def generate_pdf(data):
         ('BOTTOMPADDING', (0,0), (-1,-1), 6),
         ('LEFTPADDING', (0,0), (-1,-1), 5),
         ('RIGHTPADDING', (0,0), (-1,-1), 5),
-    ]))
-    elements.append(t)
+    ]
+    if large:
+        style += [
+            ('FONTNAME', (0,1), (-1,-1), REGULAR_FONT),
+            ('FONTSIZE', (0,1), (-1,-1), 10),
+            ('LEADING', (0,1), (-1,-1), 13),
+            ('TEXTCOLOR', (0,1), (-1,-1), TEXT_COLOR),
+            ('ALIGN', (1,1), (2,-1), 'CENTER'),
+            ('ALIGN', (3,1), (4,-1), 'RIGHT'),
+        ]
+        return _PagedItemsTable(table_data[0], table_data[1:], row_heights[1:], TableStyle(style))
+    else:
+        t = Table(table_data, colWidths=ITEM_COL_WIDTHS)
+    t.setStyle(TableStyle(style))
+    return t
+
+def _body_flowables(inv, large=False):
+    """Preču tabula, kopsummas, summa vārdiem, komentāri un paraksti."""
+    elements = []
+
+    # ==========================================
+    # 4. PREČU TABULA
+    # ==========================================
+    elements.append(_items_table(inv, large))
     
     # ==========================================
     # 5. KOPSUMMAS
     # ==========================================
     elements.append(Spacer(1, 2*mm))
     
-    subtotal = data.get('subtotal', '0.00')
-    vat = data.get('vat', '0.00')
-    total = data.get('total', '0.00')
-    
-    raw_discount_eur = data.get('raw_discount_eur', 0.0)
-
-    totals_data = []
-
-    if raw_discount_eur > 0:
-        totals_data.append(["", "KOPĀ (bez PVN un atlaides)", f"{subtotal} €"])
-        discount_str = f"Atlaides apjoms ({data.get('discount_percent', 0):g}%)"
-        totals_data.append(["", discount_str, f"-{data.get('discount_eur', '0.00')} €"])
-        totals_data.append(["", "Kopā ar atlaidi (bez PVN)", f"{data.get('subtotal_after_discount', '0.00')} €"])
-        totals_data.append(["", "PVN", f"{vat} €"])
-        totals_data.append(["", "KOPUMĀ APMAKSAI", f"{total} €"])
-        last_row_idx = 4
-    else:
-        totals_data.append(["", "KOPĀ", f"{subtotal} €"])
-        totals_data.append(["", "PVN", f"{vat} €"])
-        totals_data.append(["", "Kopumā", f"{total} €"])
-        last_row_idx = 2
-    
+    totals_data = [["", label, value] for label, value, _, _ in inv.totals]
     totals_table = Table(totals_data, colWidths=[80*mm, 60*mm, 30*mm])
     
-    if "avansa" in doc_type.lower():
-        totals_style_cmds = [
-            ('ALIGN', (1,0), (-1,-1), 'RIGHT'),
-            ('TEXTCOLOR', (0,0), (-1,-1), TEXT_COLOR),
-            ('FONTNAME', (0,0), (-1,-1), REGULAR_FONT),
-        ]
-    else:
-        totals_style_cmds = [
-            ('ALIGN', (1,0), (-1,-1), 'RIGHT'),
-            ('TEXTCOLOR', (0,0), (-1,-1), TEXT_COLOR),
-            ('FONTNAME', (1,0), (1,last_row_idx), BOLD_FONT),
-            ('FONTNAME', (2,0), (2,last_row_idx), REGULAR_FONT),
-            ('FONTNAME', (1,last_row_idx), (2,last_row_idx), BOLD_FONT),
-            ('FONTNAME', (2,last_row_idx), (2,last_row_idx), BOLD_FONT),
-        ]
+    totals_style_cmds = [
+        ('ALIGN', (1,0), (-1,-1), 'RIGHT'),
+        ('TEXTCOLOR', (0,0), (-1,-1), TEXT_COLOR),
+        ('FONTNAME', (0,0), (-1,-1), REGULAR_FONT),
+    ]
+    for row, (_, _, label_bold, value_bold) in enumerate(inv.totals):
+        if label_bold:
+            totals_style_cmds.append(('FONTNAME', (1,row), (1,row), BOLD_FONT))
+        if value_bold:
+            totals_style_cmds.append(('FONTNAME', (2,row), (2,row), BOLD_FONT))
     
     totals_table.setStyle(TableStyle(totals_style_cmds))
     elements.append(totals_table)
@@ -346,28 +379,20 @@ def generate_pdf(data):
     # ==========================================
     elements.append(Spacer(1, 5*mm))
     
-    if "avansa" in doc_type.lower():
-        raw_advance = data.get('raw_advance', 0.0)
-        formatted_advance = fmt_curr(raw_advance)
-        percent_val = int(round(data.get('advance_percent', 0)))
-        
-        bold_text = f'<font name="{BOLD_FONT}">APMAKSĀJAMAIS AVANSS ({percent_val}%): {formatted_advance} €</font>'
+    if inv.advance_text:
+        bold_text = f'<font name="{BOLD_FONT}">{inv.advance_text}</font>'
         elements.append(Paragraph(bold_text, style_cell_right))
         elements.append(Spacer(1, 2*mm))
 
-    amount_words = data.get('amount_words', '')
-    prefix = "Vārdiem: "
-    elements.append(Paragraph(f"<i>{prefix}{amount_words}</i>", 
-                              ParagraphStyle('Words', parent=style_italic, alignment=TA_RIGHT)))
+    elements.append(Paragraph(f"<i>{inv.words_text}</i>", style_words))
     
     # ==========================================
     # 7. PAPILDINFO (Komentāri)
     # ==========================================
-    comments = data.get('comments', '').strip()
-    if comments:
+    if inv.comments:
         elements.append(Spacer(1, 10*mm))
         elements.append(Paragraph(f"<font name='{BOLD_FONT}'>Papildus informācija:</font>", style_bold))
-        comments_html = comments.replace('\n', '<br/>')
+        comments_html = inv.comments.replace('\n', '<br/>')
         elements.append(Paragraph(comments_html, style_normal))
 
     # ==========================================
@@ -377,17 +402,8 @@ def generate_pdf(data):
     elements.append(HorizontalLine(thickness=0.2))
     elements.append(Spacer(1, 2*mm))
     
-    signatory = data.get('signatory', 'SIA Bratus valdes loceklis Adrians Stankevičs')
-    
-    if "pavadzīme" in doc_type.lower():
-        prepared_text = f"Pavadzīmi sagatavoja: <i>{signatory}</i>"
-        received_text = "Pavadzīmi saņēma:"
-    elif "avansa rēķins" in doc_type.lower():
-        prepared_text = f"Avansa rēķinu sagatavoja: <i>{signatory}</i>"
-        received_text = "Avansa rēķinu saņēma:"
-    else:
-        prepared_text = f"Rēķinu sagatavoja: <i>{signatory}</i>"
-        received_text = "Rēķinu saņēma:"
+    prepared_text = f"{inv.prepared_label}<i>{inv.signatory}</i>"
+    received_text = inv.received_label
     
     sig_table_data = [
         [Paragraph(prepared_text, style_italic), "__________________________"],
@@ -401,7 +417,246 @@ def generate_pdf(data):
         ('ALIGN', (1,0), (1,1), 'RIGHT'),
     ]))
     elements.append(sig_table)
+    return elements
+
+class _NumberedCanvas(canvas.Canvas):
+    """Canvas, kas lapu kājenē ieraksta "Lapa X no Y" (kopējais skaits zināms tikai beigās)."""
+
+    def __init__(self, *args, **kwargs):
+        canvas.Canvas.__init__(self, *args, **kwargs)
+        self._page_states = []
+
+    def showPage(self):
+        self._page_states.append(dict(self.__dict__))
+        self._startPage()
+
+    def save(self):
+        total = len(self._page_states)
+        for state in self._page_states:
+            self.__dict__.update(state)
+            self.setFont(REGULAR_FONT, 8)
+            self.setFillColor(colors.grey)
+            self.drawCentredString(PAGE_WIDTH / 2.0, 8*mm, f"Lapa {self._pageNumber} no {total}")
+            canvas.Canvas.showPage(self)
+        canvas.Canvas.save(self)
+
+def _build_flow(inv, buffer, large=False):
+    """
+    Klasiskais izkārtojums: viss dokuments ir viena platypus plūsma.
+    large=True — lielo rēķinu variants (LongTable, lapu numuri kājenē).
+    """
+    doc = SimpleDocTemplate(buffer, pagesize=A4,
+                            rightMargin=20*mm, leftMargin=20*mm,
+                            topMargin=15*mm, bottomMargin=15*mm)
     
-    doc.build(elements)
+    elements = []
+    static = _static_flowables()
+    
+    # ==========================================
+    # 1. LOGO UN DOKUMENTA INFO
+    # ==========================================
+    header_table = Table([[static['logo'], _header_text(inv)]], colWidths=[85*mm, 85*mm])
+    header_table.setStyle(TableStyle([
+        ('VALIGN', (0,0), (-1,-1), 'TOP'),
+        ('ALIGN', (0,0), (0,0), 'LEFT'),
+        ('ALIGN', (1,0), (1,0), 'RIGHT'),
+        ('LEFTPADDING', (0,0), (-1,-1), 0),
+        ('RIGHTPADDING', (0,0), (-1,-1), 0),
+    ]))
+    elements.append(header_table)
+    elements.append(Spacer(1, 3*mm))
+    elements.append(HorizontalLine()) 
+    elements.append(Spacer(1, 5*mm))
+    
+    # ==========================================
+    # 2. KLIENTS VAI E-RĒĶINA INFO
+    # ==========================================
+    elements.extend(_client_flowables(inv))
+    if inv.is_e_invoice:
+        elements.append(Spacer(1, 5*mm))
+        elements.append(HorizontalLine(thickness=0.2))
+        elements.append(Spacer(1, 5*mm))
+
+        elements.append(Paragraph("<b>Nosūtītājs</b>", style_normal))
+        elements.append(Spacer(1, 3*mm))
+    else:
+        elements.append(Spacer(1, 3*mm))
+        elements.append(HorizontalLine(thickness=0.2))
+        elements.append(Spacer(1, 5*mm))
+    
+    # ==========================================
+    # 3. PIEGĀDĀTĀJS UN BANKA
+    # ==========================================
+    elements.append(static['info_table'])
+    elements.append(Spacer(1, 10*mm))
+    
+    elements.extend(_body_flowables(inv, large))
+    if large:
+        doc.build(elements, canvasmaker=_NumberedCanvas)
+    else:
+        doc.build(elements)
+
+# ==========================================
+# "Template overlay" režīms
+# ==========================================
+# Nemainīgā lapas daļa (logo, līnijas, SIA Bratus un bankas rekvizīti) tiek
+# uzzīmēta vienu reizi kā PDF Form XObject un lapā tikai atsaukta ar doForm.
+# Mainīgie bloki (virsraksts, klients) tiek zīmēti virs tās, bet plūsmā paliek
+# tikai preču tabula un kopsummas. Ģeometrija atkārto 'flow' izkārtojumu
+# (rāmja un tabulas šūnu atkāpes, tās pašas atstarpes), un rekvizītu bloks
+# tiek novietots zem izmērītā klienta bloka, tāpēc preču tabula sākas tajā
+# pašā vietā un lapu skaits abos režīmos sakrīt.
+
+LEFT_MARGIN = 20*mm
+CONTENT_WIDTH = 170*mm
+FRAME_PAD = 6                            # platypus Frame noklusētā atkāpe
+CELL_PAD = 3                             # Table šūnas noklusētā augšējā/apakšējā atkāpe
+LINE_X = LEFT_MARGIN + FRAME_PAD         # rindkopu un līniju kreisā mala
+TEXT_WIDTH = CONTENT_WIDTH - 2*FRAME_PAD
+TOP_Y = PAGE_HEIGHT - 15*mm - FRAME_PAD
+HEADER_HEIGHT = 26*mm
+RULE_Y = TOP_Y - HEADER_HEIGHT - 2*CELL_PAD - 3*mm
+CLIENT_TOP_Y = RULE_Y - 5*mm
+LETTERHEAD_FORM = "BratusLetterhead"
+SENDER_FORM = "BratusSender"
+
+def _overlay_static():
+    """Iepriekš izkārtota (wrap) rekvizītu tabula — tikai zīmēšana katram rēķinam."""
+    cached = getattr(_static, 'overlay', None)
+    if cached is None:
+        info_table = _build_static_flowables()['info_table']
+        _, info_height = info_table.wrap(TEXT_WIDTH, PAGE_HEIGHT)
+        cached = _static.overlay = {'info_table': info_table, 'info_height': info_height}
+    return cached
+
+def _sender_layout(inv, client_height):
+    """
+    Tievās līnijas, "Nosūtītājs" virsraksta (e-rēķinam) un rekvizītu tabulas
+    augšmalas y koordinātas zem klienta bloka — atstarpes kā _build_flow.
+    """
+    y = CLIENT_TOP_Y - client_height
+    if inv.is_e_invoice:
+        thin_rule_y = y - 5*mm
+        label_y = thin_rule_y - 5*mm
+        label_height = Paragraph("<b>Nosūtītājs</b>", style_normal).wrap(TEXT_WIDTH, PAGE_HEIGHT)[1]
+        return thin_rule_y, label_y, label_y - label_height - 3*mm
+    thin_rule_y = y - 3*mm
+    return thin_rule_y, None, thin_rule_y - 5*mm
+
+def _overlay_main_top(sender_top):
+    """Pirmās lapas preču rāmja augšmala (ieskaitot rāmja atkāpi)."""
+    return sender_top - _overlay_static()['info_height'] - 10*mm + FRAME_PAD
+
+def _draw_letterhead(canv, sender_top):
+    """
+    Definē nemainīgo lapas daļu kā Form XObject (vienreiz dokumentā) un to
+    uzzīmē. Rekvizītu tabula ir atsevišķa forma, ko novieto zem klienta bloka.
+    """
+    if not getattr(canv, '_bratus_letterhead', False):
+        canv.beginForm(LETTERHEAD_FORM)
+        logo_reader = logo_image_reader()
+        if logo_reader is not None:
+            canv.drawImage(logo_reader, LEFT_MARGIN, TOP_Y - CELL_PAD - HEADER_HEIGHT, width=35*mm, height=HEADER_HEIGHT,
+                           preserveAspectRatio=True, anchor='nw', mask='auto')
+        canv.setStrokeColor(THEME_COLOR)
+        canv.setLineWidth(0.5)
+        canv.line(LINE_X, RULE_Y, LINE_X + CONTENT_WIDTH, RULE_Y)
+        canv.endForm()
+        canv.beginForm(SENDER_FORM)
+        overlay = _overlay_static()
+        overlay['info_table'].drawOn(canv, LEFT_MARGIN, 0)
+        canv.endForm()
+        canv._bratus_letterhead = True
+    canv.doForm(LETTERHEAD_FORM)
+    canv.saveState()
+    canv.translate(0, sender_top - _overlay_static()['info_height'])
+    canv.doForm(SENDER_FORM)
+    canv.restoreState()
+
+def _stack_height(flowables, width):
+    return sum(f.wrap(width, PAGE_HEIGHT)[1] for f in flowables)
+
+def _draw_stack(canv, flowables, x, top_y, width):
+    y = top_y
+    for f in flowables:
+        _, h = f.wrap(width, PAGE_HEIGHT)
+        y -= h
+        f.drawOn(canv, x, y)
+
+def _draw_framed(canv, flowables, top_y):
+    """Zīmē blokus platypus rāmī (tās pašas atkāpes un līdzinājums kā 'flow')."""
+    Frame(LEFT_MARGIN, 0, CONTENT_WIDTH, top_y + FRAME_PAD).addFromList(list(flowables), canv)
+
+def _build_overlay(inv, buffer):
+    """Overlay izkārtojums. Atgriež False, ja mainīgais saturs neietilpst pirmajā lapā."""
+    header = _header_text(inv)
+    client = _client_flowables(inv)
+    if _stack_height(header, 85*mm) > HEADER_HEIGHT:
+        return False
+    thin_rule_y, label_y, sender_top = _sender_layout(inv, _stack_height(client, TEXT_WIDTH))
+
+    doc = BaseDocTemplate(buffer, pagesize=A4,
+                          rightMargin=20*mm, leftMargin=20*mm,
+                          topMargin=15*mm, bottomMargin=15*mm)
+    main_top = _overlay_main_top(sender_top)
+    if main_top - 2*FRAME_PAD <= doc.bottomMargin:
+        return False
+
+    def first_page(canv, doc):
+        canv.saveState()
+        _draw_letterhead(canv, sender_top)
+        _draw_stack(canv, header, LEFT_MARGIN + 85*mm, TOP_Y - CELL_PAD, 85*mm)
+        _draw_framed(canv, client, CLIENT_TOP_Y)
+        canv.setStrokeColor(THEME_COLOR)
+        canv.setLineWidth(0.2)
+        canv.line(LINE_X, thin_rule_y, LINE_X + CONTENT_WIDTH, thin_rule_y)
+        if label_y is not None:
+            _draw_framed(canv, [Paragraph("<b>Nosūtītājs</b>", style_normal)], label_y)
+        canv.restoreState()
+
+    first_frame = Frame(LEFT_MARGIN, doc.bottomMargin, CONTENT_WIDTH, main_top - doc.bottomMargin, id='first')
+    later_frame = Frame(doc.leftMargin, doc.bottomMargin, doc.width, doc.height, id='later')
+    doc.addPageTemplates([
+        PageTemplate(id='First', frames=[first_frame], onPage=first_page),
+        PageTemplate(id='Later', frames=[later_frame]),
+    ])
+    doc.build([NextPageTemplate('Later')] + _body_flowables(inv))
+    return True
+
+PDF_MODES = ('flow', 'overlay', 'canvas', 'large')
+# Noklusētais režīms visiem izsaukumiem (app.py, server.py); var mainīt ar PDF_MODE
+DEFAULT_PDF_MODE = os.environ.get("PDF_MODE", "flow")
+# No tik daudz pozīcijām rēķins vienmēr tiek ģenerēts 'large' režīmā
+LARGE_INVOICE_ITEMS = int(os.environ.get("PDF_LARGE_ITEMS", 100))
+
+def generate_pdf(data, mode=None):
+    """
+    Ģenerē PDF un atgriež BytesIO. `data` — rēķina vārdnīca vai InvoiceLayout.
+    mode: 'flow' — klasiskais izkārtojums, 'overlay' — nemainīgā lapas daļa
+    kā Form XObject ar mainīgo saturu virsū (skat. augstāk), 'canvas' — ātrais
+    ceļš standarta rēķiniem, zīmējot tieši uz Canvas (pdf_canvas.py),
+    'large' — daudzlapu rēķiniem (LongTable, lapu numuri).
+    Ja izvēlētais režīms konkrētajam rēķinam neder, tiek izmantots 'flow';
+    rēķini ar vismaz LARGE_INVOICE_ITEMS pozīcijām vienmēr ir 'large'.
+    """
+    mode = mode or DEFAULT_PDF_MODE
+    if mode not in PDF_MODES:
+        raise ValueError(f"Nezināms PDF režīms: {mode}")
+    inv = invoice_layout(data)
+    buffer = io.BytesIO()
+    if mode == 'large' or len(inv.items) >= LARGE_INVOICE_ITEMS:
+        _build_flow(inv, buffer, large=True)
+        buffer.seek(0)
+        return buffer
+    if mode == 'overlay' and _build_overlay(inv, buffer):
+        buffer.seek(0)
+        return buffer
+    if mode == 'canvas':
+        from pdf_canvas import render_canvas  # pdf_canvas importē šo moduli
+        if render_canvas(inv, buffer):
+            buffer.seek(0)
+            return buffer
+    buffer = io.BytesIO()
+    _build_flow(inv, buffer)
     buffer.seek(0)
     return buffer
@@ -0,0 +1,66 @@
+"""
+render.py — kopīgā dokumentu ģenerēšanas ieeja serverim un fona procesiem.
+
+Funkcijas šeit ir moduļa līmenī, lai tās varētu nodot ProcessPoolExecutor
+(pickle), un atgriež tīrus baitus, nevis BytesIO. `data` var būt rēķina
+vārdnīca vai jau sagatavots InvoiceLayout — ģenerējot vairākus formātus
+vienam rēķinam, izkārtojums tiek aprēķināts vienreiz.
+"""
+
+import io
+import os
+import zipfile
+
+from pdf_generator import generate_pdf
+from docx_generator import generate_docx
+from invoice_model import invoice_layout, invoice_data
+
+MIME_TYPES = {
+    'pdf':  "application/pdf",
+    'docx': "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+
+GENERATORS = {
+    'pdf':  generate_pdf,
+    'docx': generate_docx,
+}
+
+# Formāti, ko ģenerē "abi dokumenti" pieprasījums (/generate/bundle, app)
+BUNDLE_FORMATS = ('pdf', 'docx')
+
+
+def document_filename(data, file_type):
+    """Faila nosaukums, piem. 'Pavadzīme_BR_0049.pdf'."""
+    data = invoice_data(data)
+    doc_id = data.get('doc_id', 'BR_0000').replace(" ", "_")
+    doc_type_name = data.get('doc_type', 'Pavadzime').replace(" ", "_")
+    return f"{doc_type_name}_{doc_id}.{file_type}"
+
+
+def render_document(file_type, data):
+    """Ģenerē vienu dokumentu. Atgriež (baiti, faila nosaukums, mime)."""
+    if file_type not in GENERATORS:
+        raise ValueError(f"Nezināms formāts: {file_type}")
+    buffer = GENERATORS[file_type](invoice_layout(data))
+    return buffer.getvalue(), document_filename(data, file_type), MIME_TYPES[file_type]
+
+
+def unique_name(filename, used):
+    """Nosaukums, kura vēl nav kopā `used` (dublētam tiek pievienots _2, _3 ...); pievieno to kopai."""
+    base, ext = os.path.splitext(filename)
+    name, n = filename, 2
+    while name in used:
+        name = f"{base}_{n}{ext}"
+        n += 1
+    used.add(name)
+    return name
+
+
+def bundle_zip(documents):
+    """ZIP arhīvs no [(baiti, faila nosaukums), ...]; dublētiem nosaukumiem tiek pievienots _2, _3 ..."""
+    buffer = io.BytesIO()
+    used = set()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for content, filename in documents:
+            zf.writestr(unique_name(filename, used), content)
+    return buffer.getvalue()
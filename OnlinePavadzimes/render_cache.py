@@ -0,0 +1,273 @@
+"""
+render_cache.py — ģenerēto dokumentu kešatmiņa.
+
+Atslēga ir rēķina datu kanoniskais SHA-256 (sakārtotas atslēgas) kopā ar
+formātu un veidņu/fontu versiju, tāpēc vienādi dati vienmēr dod to pašu
+atslēgu. Divi līmeņi:
+  * atmiņā — LRU ar kopējā izmēra ierobežojumu;
+  * diskā (pēc izvēles, RENDER_CACHE_DIR) — faili, vecākie tiek dzēsti,
+    kad pārsniegts RENDER_CACHE_DISK_BYTES.
+Trāpījuma gadījumā ReportLab / python-docx netiek izsaukti vispār.
+Vienlaicīgi pieprasījumi tam pašam rēķinam (piem. lejupielāde un Drive
+augšupielāde) gaida viens otru — dokuments tiek ģenerēts vienreiz.
+"""
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from render import render_document, document_filename, MIME_TYPES, BUNDLE_FORMATS
+from invoice_model import invoice_data
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Palielināt, ja mainās dokumentu izkārtojums un vecie faili vairs neder
+TEMPLATE_VERSION = "1"
+
+MEMORY_MAX_BYTES = int(os.environ.get("RENDER_CACHE_MEM_BYTES", 64 * 1024 * 1024))
+DISK_DIR = os.environ.get("RENDER_CACHE_DIR", "")
+DISK_MAX_BYTES = int(os.environ.get("RENDER_CACHE_DISK_BYTES", 512 * 1024 * 1024))
+
+# Faili, kuru izmaiņas maina gala dokumentu (fonti, logo, ģeneratori)
+_ASSET_FILES = [
+    os.path.join(CURRENT_DIR, "BRATUS MELNS LOGO PNG.png"),
+    os.path.join(CURRENT_DIR, "invoice_model.py"),
+    os.path.join(CURRENT_DIR, "pdf_generator.py"),
+    os.path.join(CURRENT_DIR, "pdf_canvas.py"),
+    os.path.join(CURRENT_DIR, "docx_generator.py"),
+    os.environ.get("DOCX_TEMPLATE", os.path.join(CURRENT_DIR, "templates", "invoice_template.docx")),
+    os.path.join(CURRENT_DIR, "assets.py"),
+]
+_FONTS_DIR = os.path.join(CURRENT_DIR, "fonts")
+
+
+def _asset_fingerprint():
+    paths = list(_ASSET_FILES)
+    if os.path.isdir(_FONTS_DIR):
+        paths += [os.path.join(_FONTS_DIR, f) for f in sorted(os.listdir(_FONTS_DIR))]
+    h = hashlib.sha256(TEMPLATE_VERSION.encode())
+    for var in ("LOGO_DPI", "PDF_MODE", "PDF_LARGE_ITEMS"):
+        h.update(os.environ.get(var, "").encode())
+    for path in paths:
+        try:
+            st = os.stat(path)
+            h.update(f"{os.path.basename(path)}:{st.st_size}:{int(st.st_mtime)}".encode())
+        except OSError:
+            h.update(f"{os.path.basename(path)}:missing".encode())
+    return h.hexdigest()[:16]
+
+
+ASSET_FINGERPRINT = _asset_fingerprint()
+
+
+def cache_key(file_type, data):
+    """Kanoniska atslēga: formāts + veidņu versija + sakārtoti rēķina dati."""
+    canonical = json.dumps(invoice_data(data), sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    h = hashlib.sha256()
+    h.update(f"{file_type}:{ASSET_FINGERPRINT}:".encode())
+    h.update(canonical.encode("utf-8"))
+    return h.hexdigest()
+
+
+class RenderCache:
+    def __init__(self, memory_max_bytes=MEMORY_MAX_BYTES, disk_dir=DISK_DIR, disk_max_bytes=DISK_MAX_BYTES):
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._mem = OrderedDict()
+        self._mem_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    # --- Atmiņas līmenis ---
+
+    def _mem_get(self, key):
+        with self._lock:
+            content = self._mem.get(key)
+            if content is not None:
+                self._mem.move_to_end(key)
+            return content
+
+    def _mem_put(self, key, content):
+        if len(content) > self.memory_max_bytes:
+            return
+        with self._lock:
+            old = self._mem.pop(key, None)
+            if old is not None:
+                self._mem_bytes -= len(old)
+            self._mem[key] = content
+            self._mem_bytes += len(content)
+            while self._mem_bytes > self.memory_max_bytes:
+                _, evicted = self._mem.popitem(last=False)
+                self._mem_bytes -= len(evicted)
+
+    # --- Diska līmenis ---
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key)
+
+    def _disk_get(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+            os.utime(path)  # LRU: atzīmējam kā nesen lietotu
+            return content
+        except OSError:
+            return None
+
+    def _disk_put(self, key, content):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Kešatmiņas kļūda: {e}")
+            return
+        self._disk_evict()
+
+    def _disk_evict(self):
+        entries, total = [], 0
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        if total <= self.disk_max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.disk_max_bytes:
+                break
+
+    # --- Publiskais API ---
+
+    def get(self, key):
+        content = self._mem_get(key)
+        if content is None:
+            content = self._disk_get(key)
+            if content is not None:
+                self._mem_put(key, content)
+        if content is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return content
+
+    def put(self, key, content):
+        self._mem_put(key, content)
+        self._disk_put(key, content)
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            self._mem_bytes = 0
+
+
+render_cache = RenderCache()
+
+_inflight = {}              # atslēga -> [slēdzene, gaidītāju skaits]
+_inflight_lock = threading.Lock()
+
+
+@contextmanager
+def _single_flight(key):
+    """Vienai atslēgai vienlaikus ģenerē tikai viens pavediens; pārējie pēc tam atrod kešā."""
+    with _inflight_lock:
+        entry = _inflight.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _inflight_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _inflight[key]
+
+
+def cached_render(file_type, data, key=None, renderer=render_document):
+    """
+    Kā render_document, bet ar kešatmiņu.
+    `renderer` ļauj ģenerēšanu veikt citur (piem. render_pool baseinā).
+    Atgriež (baiti, faila nosaukums, mime, vai_trāpījums).
+    """
+    if file_type not in MIME_TYPES:
+        raise ValueError(f"Nezināms formāts: {file_type}")
+    key = key or cache_key(file_type, data)
+    content = render_cache.get(key)
+    if content is not None:
+        return content, document_filename(data, file_type), MIME_TYPES[file_type], True
+    with _single_flight(key):
+        # Kamēr gaidījām, cits pavediens varēja šo dokumentu jau uzģenerēt
+        content = render_cache.get(key)
+        if content is not None:
+            return content, document_filename(data, file_type), MIME_TYPES[file_type], True
+        content, filename, mime = renderer(file_type, data)
+        render_cache.put(key, content)
+    return content, filename, mime, False
+
+
+def cached_render_bundle(data, file_types=BUNDLE_FORMATS, submit=None):
+    """
+    Vairāki formāti vienam rēķinam ar kešatmiņu.
+    Kešatmiņā neatrastie formāti tiek nodoti `submit(file_type, data)`, kas
+    atgriež Future (piem. RenderPool.submit) — tā tie tiek ģenerēti vienlaikus
+    un kopējais laiks ir tuvs lēnākajam formātam. Bez `submit` ģenerē secīgi.
+    Atgriež {formāts: (baiti, faila nosaukums, mime, vai_trāpījums)} file_types secībā.
+    """
+    for file_type in file_types:
+        if file_type not in MIME_TYPES:
+            raise ValueError(f"Nezināms formāts: {file_type}")
+    keys = {file_type: cache_key(file_type, data) for file_type in file_types}
+    with _single_flight(tuple(keys.values())):
+        return _render_bundle(data, file_types, keys, submit)
+
+
+def _render_bundle(data, file_types, keys, submit):
+    results, futures = {}, {}
+    try:
+        for file_type in file_types:
+            content = render_cache.get(keys[file_type])
+            if content is not None:
+                results[file_type] = (content, document_filename(data, file_type), MIME_TYPES[file_type], True)
+            elif submit is not None:
+                futures[file_type] = submit(file_type, data)
+    except Exception:
+        # Piem. PoolSaturated otrajam formātam — pirmo vairs negaidām
+        for future in futures.values():
+            future.cancel()
+        raise
+    for file_type in file_types:
+        if file_type in results:
+            continue
+        if file_type in futures:
+            content, filename, mime = futures[file_type].result()
+        else:
+            content, filename, mime = render_document(file_type, data)
+        render_cache.put(keys[file_type], content)
+        results[file_type] = (content, filename, mime, False)
+    return {file_type: results[file_type] for file_type in file_types}
@@ -0,0 +1,171 @@
+"""
+render_pool.py — iepriekš palaists (pre-fork) dokumentu ģenerēšanas procesu baseins.
+
+Ģeneratoru moduļi (reportlab, python-docx, Montserrat TTF fonti) tiek
+ielādēti forkserver procesā vienreiz (preload), pēc tam darba procesi no tā
+tiek "forkoti" un koplieto jau parsētos fontus copy-on-write režīmā.
+Forkserver pats ir viena pavediena process, tāpēc fork ir drošs neatkarīgi
+no tā, kad baseins tiek izveidots (arī pēc augšupielāžu pavediena palaišanas
+vai pieprasījumu pavedienos).
+
+Vienlaicīgo ģenerēšanu skaits ir ierobežots: izpildē var būt `size` darbi
+un rindā vēl `queue_depth`. Ja viss ir aizņemts, `submit` uzreiz izmet
+PoolSaturated, un serveris atbild ar 429 + Retry-After. Paketes
+(/generate/batch) gaida brīvu vietu tajā pašā limitā, bet visas kopā aizņem
+ne vairāk kā `batch_slots` vietas — pārējās paliek atsevišķiem pieprasījumiem.
+
+Baseinu izmanto gan Flask serveris (server.py), gan Streamlit lietotne
+(ZIP lejupielāde) — abos procesos jau darbojas pavedieni, tāpēc darba
+procesi netiek forkoti no tiem (skat. _mp_context).
+
+Konfigurācija (vides mainīgie):
+  RENDER_POOL_MODE    — "1", lai /generate izmantotu baseinu
+  RENDER_POOL_SIZE    — darba procesu skaits (noklusēti CPU skaits)
+  RENDER_QUEUE_DEPTH  — cik darbi drīkst gaidīt rindā (noklusēti 2 x SIZE)
+  RENDER_BATCH_SLOTS  — cik vietas drīkst aizņemt paketes (noklusēti SIZE / 2)
+  RENDER_RETRY_AFTER  — Retry-After vērtība sekundēs
+"""
+
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Ģeneratori tiek ielādēti importā (fonti tiek reģistrēti) — arī forkserver
+# procesā, kas šo moduli ielādē iepriekš
+import pdf_generator
+import docx_generator
+from render import render_document, BUNDLE_FORMATS
+from render_cache import cached_render_bundle
+
+POOL_MODE = os.environ.get("RENDER_POOL_MODE", "0") == "1"
+POOL_SIZE = int(os.environ.get("RENDER_POOL_SIZE", os.cpu_count() or 2))
+QUEUE_DEPTH = int(os.environ.get("RENDER_QUEUE_DEPTH", 2 * POOL_SIZE))
+BATCH_SLOTS = int(os.environ.get("RENDER_BATCH_SLOTS", max(POOL_SIZE // 2, 1)))
+RETRY_AFTER = int(os.environ.get("RENDER_RETRY_AFTER", 2))
+
+
+def _mp_context():
+    """
+    Darba procesi tiek forkoti no atsevišķa forkserver procesa, kurā ģeneratori
+    ir ielādēti iepriekš (preload) — nevis no servera/Streamlit procesa, kurā
+    jau darbojas pavedieni un atvērti SQLite savienojumi.
+    """
+    try:
+        ctx = multiprocessing.get_context("forkserver")
+    except ValueError:
+        return multiprocessing.get_context("spawn")  # Windows: forkserver nav pieejams
+    ctx.set_forkserver_preload(["render_pool"])
+    return ctx
+
+
+class PoolSaturated(Exception):
+    """Baseins un rinda ir pilni — jāmēģina vēlāk."""
+
+
+def _warm_up():
+    # Darba procesā pieskaramies fontiem, lai pirmais īstais pieprasījums nemaksā par to
+    from reportlab.pdfbase import pdfmetrics
+    for name in (pdf_generator.REGULAR_FONT, pdf_generator.BOLD_FONT):
+        pdfmetrics.getFont(name)
+    return os.getpid()
+
+
+class RenderPool:
+    def __init__(self, size=POOL_SIZE, queue_depth=QUEUE_DEPTH, batch_slots=BATCH_SLOTS):
+        self.size = size
+        self.queue_depth = queue_depth
+        self.pid = os.getpid()
+        self.executor = ProcessPoolExecutor(max_workers=size, mp_context=_mp_context())
+        self._slots = threading.BoundedSemaphore(size + queue_depth)
+        self._batch_slots = threading.BoundedSemaphore(min(batch_slots, size + queue_depth))
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        # Darba process nomiris (piem. OOM) — get_render_pool izveidos jaunu baseinu
+        self.broken = False
+
+    def start(self):
+        """Palaiž visus darba procesus uzreiz (nevis pie pirmā pieprasījuma)."""
+        futures = [self.executor.submit(_warm_up) for _ in range(self.size)]
+        return sorted({f.result() for f in futures})
+
+    def _release(self, _future):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def _submit(self, file_type, data, release):
+        with self._lock:
+            self.in_flight += 1
+        try:
+            future = self.executor.submit(render_document, file_type, data)
+        except Exception as e:
+            self.broken = self.broken or isinstance(e, BrokenProcessPool)
+            release(None)
+            raise
+        future.add_done_callback(self._check_broken)
+        future.add_done_callback(release)
+        return future
+
+    def _check_broken(self, future):
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self.broken = True
+
+    def submit(self, file_type, data):
+        """Ieliek ģenerēšanu rindā; ja nav brīvu vietu, izmet PoolSaturated."""
+        if not self._slots.acquire(blocking=False):
+            raise PoolSaturated()
+        return self._submit(file_type, data, self._release)
+
+    def _release_batch(self, future):
+        self._release(future)
+        self._batch_slots.release()
+
+    def submit_batch(self, file_type, data):
+        """Kā submit, bet gaida brīvu vietu (paketēm), nepārsniedzot `batch_slots`."""
+        self._batch_slots.acquire()
+        self._slots.acquire()
+        return self._submit(file_type, data, self._release_batch)
+
+    def render(self, file_type, data):
+        """Sinhrona ģenerēšana caur baseinu (tāds pats rezultāts kā render_document)."""
+        return self.submit(file_type, data).result()
+
+    def queue_depth_now(self):
+        """Cik darbu šobrīd gaida rindā (neskaitot tos, kas jau tiek izpildīti)."""
+        with self._lock:
+            return max(self.in_flight - self.size, 0)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_render_pool():
+    """
+    Procesa kopīgais baseins; pēc fork (piem. gunicorn) vai ja kāds darba
+    process nomiris (BrokenProcessPool), tiek izveidots no jauna.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid() or _pool.broken:
+            if _pool is not None and _pool.pid == os.getpid():
+                _pool.shutdown()
+            pool = RenderPool()
+            pool.start()
+            _pool = pool
+        return _pool
+
+
+def render_bundle(data, file_types=BUNDLE_FORMATS, pool=None):
+    """
+    Ģenerē vairākus formātus vienam rēķinam vienlaikus — katru savā baseina
+    procesā (ar kešatmiņu). Ja baseins ir pilns, izmet PoolSaturated.
+    Atgriež {formāts: (baiti, faila nosaukums, mime, vai_trāpījums)}.
+    """
+    pool = pool or get_render_pool()
+    return cached_render_bundle(data, file_types, submit=pool.submit)
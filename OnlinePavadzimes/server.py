@@ -1,14 +1,23 @@
-from flask import Flask, request, send_file, jsonify
+from flask import Flask, request, send_file, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
+from concurrent.futures import FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
 import io
+import json
+import zipfile
 import datetime
+import hashlib
 import os
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
+import time
+import uuid
+from urllib.parse import quote
 
-from pdf_generator import generate_pdf
-from docx_generator import generate_docx
+from render import render_document, bundle_zip, unique_name, MIME_TYPES, BUNDLE_FORMATS
+from render_cache import cached_render, cache_key
+from render_pool import get_render_pool, render_bundle, PoolSaturated, POOL_MODE, RETRY_AFTER
+from drive_queue import DriveUploadQueue
+from drive_client import get_drive_client
+import metrics
 
 app = Flask(__name__)
 # Atļaujam Shopify lapai sūtīt pieprasījumus uz šo serveri
@@ -18,58 +27,351 @@ GOOGLE_DRIVE_FOLDER_ID = "1vqhkHGH9WAMaFnXtduyyjYdEzHMx0iX9"
 TOKEN_FILE = "token.json"
 SCOPES = ['https://www.googleapis.com/auth/drive.file']
 
+# Paketes ģenerēšana: maksimālais dokumentu skaits vienā pieprasījumā
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", 200))
+
+# ---------------------------------------------------------------------------
+# Metrikas (/metrics)
+# ---------------------------------------------------------------------------
+
+REQUESTS = metrics.Counter(
+    "invoice_http_requests_total", "HTTP pieprasījumi pēc galapunkta, formāta un statusa",
+    ("endpoint", "file_type", "status"))
+REQUEST_SECONDS = metrics.Histogram(
+    "invoice_http_request_seconds", "Kopējais pieprasījuma apstrādes laiks", ("endpoint",))
+STAGE_SECONDS = metrics.Histogram(
+    "invoice_stage_seconds", "Laiks pa posmiem: parse, render, upload, send", ("stage", "file_type"))
+RENDER_BYTES = metrics.Histogram(
+    "invoice_render_bytes", "Ģenerēto dokumentu izmērs baitos", ("file_type",), buckets=metrics.SIZE_BUCKETS)
+RENDER_CACHE = metrics.Counter(
+    "invoice_render_cache_total", "Ģenerēšanas kešatmiņas trāpījumi un netrāpījumi", ("result",))
+DRIVE_UPLOADS = metrics.Counter(
+    "invoice_drive_uploads_total", "Google Drive augšupielādes mēģinājumi pēc rezultāta", ("result",))
+metrics.Gauge(
+    "invoice_drive_queue_jobs", "Drive augšupielāžu rindas darbi pēc statusa", ("status",),
+    callback=lambda: {(status,): n for status, n in upload_queue.stats().items()})
+metrics.Gauge(
+    "invoice_render_pool_queue_depth", "Ģenerēšanas darbi, kas gaida brīvu procesu",
+    callback=lambda: get_render_pool().queue_depth_now() if POOL_MODE else 0)
+
 def get_drive_service():
-    if os.path.exists(TOKEN_FILE):
-        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-        if creds and creds.valid:
-            return build('drive', 'v3', credentials=creds)
-    return None
+    return get_drive_client(TOKEN_FILE, SCOPES).get_service()
 
 def upload_to_drive(file_buffer, filename, mime_type):
+    """Augšupielādē failu Drive un atgriež faila ID. Kļūdas gadījumā izmet izņēmumu."""
+    file_type = os.path.splitext(filename)[1].lstrip('.')
+    start = time.perf_counter()
     try:
-        service = get_drive_service()
-        if not service: return False
-        file_metadata = {'name': filename, 'parents': [GOOGLE_DRIVE_FOLDER_ID]}
-        file_buffer.seek(0)
-        media = MediaIoBaseUpload(file_buffer, mimetype=mime_type, resumable=True)
-        service.files().create(body=file_metadata, media_body=media, fields='id').execute()
-        file_buffer.seek(0)
-        return True
-    except Exception as e:
-        print(f"Drive Error: {e}")
-        return False
+        file_id = get_drive_client(TOKEN_FILE, SCOPES).upload(file_buffer, filename, mime_type, GOOGLE_DRIVE_FOLDER_ID)
+    except Exception:
+        DRIVE_UPLOADS.inc(result="failure")
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage="upload", file_type=file_type)
+    DRIVE_UPLOADS.inc(result="success")
+    return file_id
+
+# Augšupielādes notiek fonā, lai atbilde negaidītu uz Drive. Fona pavediens
+# netiek palaists importā: to dara start_background() (pirmajā pieprasījumā
+# vai __main__). Baseina darba procesi tiek forkoti no forkserver, nevis no
+# šī procesa, tāpēc /generate/bundle un /generate/batch to drīkst izveidot vēlāk.
+upload_queue = DriveUploadQueue(upload_to_drive)
+
+def enqueue_uploads(files):
+    """
+    Ieliek failus [(dati, nosaukums, mime), ...] Drive rindā un atgriež darbu ID.
+    Ja Drive nav pieslēgts, faili netiek glabāti rindā (augšupielāde izlaista).
+    """
+    if not get_drive_service():
+        return []
+    return upload_queue.enqueue_many(files)
+
+def start_background():
+    """Palaiž procesu baseinu (ja ieslēgts) un pēc tam augšupielāžu pavedienu."""
+    if POOL_MODE:
+        get_render_pool()
+    upload_queue.start()
+
+@app.before_request
+def _start_background():
+    start_background()
+
+@app.before_request
+def _start_timer():
+    g.request_start = time.perf_counter()
+
+def metric_file_type(file_type):
+    """Formāts metriku etiķetei: nezināmas URL vērtības apvieno, lai etiķešu skaits būtu ierobežots."""
+    return file_type if not file_type or file_type in MIME_TYPES else "unknown"
+
+@app.after_request
+def _record_request(response):
+    endpoint = request.endpoint or "unknown"
+    if endpoint != "metrics_endpoint" and hasattr(g, "request_start"):
+        file_type = metric_file_type((request.view_args or {}).get("file_type", ""))
+        REQUESTS.inc(endpoint=endpoint, file_type=file_type, status=response.status_code)
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, endpoint=endpoint)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render_latest(), content_type=metrics.CONTENT_TYPE)
+
+def _timed(renderer):
+    """Ietin ģeneratoru, lai mērītu tikai reālu ģenerēšanu (ne kešatmiņas trāpījumus)."""
+    def run(file_type, data):
+        with STAGE_SECONDS.time(stage="render", file_type=file_type):
+            result = renderer(file_type, data)
+        RENDER_BYTES.observe(len(result[0]), file_type=file_type)
+        return result
+    return run
+
+def _not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+def _pool_saturated():
+    response = jsonify({"error": "Serveris ir pārslogots, mēģiniet vēlreiz"})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(RETRY_AFTER)
+    return response
 
 @app.route('/generate/<file_type>', methods=['POST'])
 def generate_doc(file_type):
-    data = request.json
-
-    # Ģenerējam faila nosaukumu
-    doc_id = data.get('doc_id', 'BR_0000').replace(" ", "_")
-    doc_type_name = data.get('doc_type', 'Pavadzime').replace(" ", "_")
-
-    if file_type == 'pdf':
-        buffer = generate_pdf(data)
-        filename = f"{doc_type_name}_{doc_id}.pdf"
-        mime = "application/pdf"
-    elif file_type == 'docx':
-        buffer = generate_docx(data)
-        filename = f"{doc_type_name}_{doc_id}.docx"
-        mime = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-    else:
+    if file_type not in MIME_TYPES:
         return jsonify({"error": "Nezināms formāts"}), 400
 
-    # Augšupielādējam Google Drive
-    upload_to_drive(buffer, filename, mime)
+    with STAGE_SECONDS.time(stage="parse", file_type=file_type):
+        data = request.json
+
+    # Vienādi dati => vienāds ETag; atkārtots pieprasījums saņem 304 bez ģenerēšanas
+    etag = cache_key(file_type, data)
+    if request.if_none_match.contains(etag):
+        return _not_modified(etag)
+
+    # RENDER_POOL_MODE=1: ģenerējam siltajā procesu baseinā ar ierobežotu rindu
+    renderer = get_render_pool().render if POOL_MODE else render_document
+    try:
+        content, filename, mime, cache_hit = cached_render(file_type, data, key=etag, renderer=_timed(renderer))
+    except PoolSaturated:
+        return _pool_saturated()
+    buffer = io.BytesIO(content)
+
+    # Ieliekam Google Drive augšupielādes rindā (notiek fonā). Rinda atpazīst
+    # failu pēc satura hash, tāpēc jau ielikts vai augšupielādēts fails (arī
+    # kešatmiņas trāpījums) netiek dublēts.
+    upload_ids = enqueue_uploads([(content, filename, mime)])
+
+    RENDER_CACHE.inc(result="hit" if cache_hit else "miss")
 
     # Nosūtām atpakaļ lietotājam lejupielādei
-    return send_file(
-        buffer,
-        as_attachment=True,
-        download_name=filename,
-        mimetype=mime
+    with STAGE_SECONDS.time(stage="send", file_type=file_type):
+        response = send_file(
+            buffer,
+            as_attachment=True,
+            download_name=filename,
+            mimetype=mime
+        )
+    response.set_etag(etag)
+    response.headers['X-Cache'] = "HIT" if cache_hit else "MISS"
+    if upload_ids:
+        response.headers['X-Upload-Id'] = str(upload_ids[0])
+    return response
+
+# ---------------------------------------------------------------------------
+# Viena rēķina visi formāti vienā pieprasījumā (PDF + DOCX)
+# ---------------------------------------------------------------------------
+
+def _multipart_response(documents):
+    """multipart/mixed atbilde ar katru dokumentu savā daļā."""
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for content, filename, mime in documents:
+        body.write(f"--{boundary}\r\n".encode())
+        body.write(f"Content-Type: {mime}\r\n".encode())
+        body.write(f"Content-Disposition: attachment; filename*=UTF-8''{quote(filename)}\r\n".encode())
+        body.write(f"Content-Length: {len(content)}\r\n\r\n".encode())
+        body.write(content)
+        body.write(b"\r\n")
+    body.write(f"--{boundary}--\r\n".encode())
+    return Response(body.getvalue(), mimetype=f"multipart/mixed; boundary={boundary}")
+
+@app.route('/generate/bundle', methods=['POST'])
+def generate_bundle():
+    """
+    Ģenerē vairākus formātus (noklusēti PDF un DOCX) vienlaikus atsevišķos
+    baseina procesos. Atbilde ir ZIP vai, ja Accept prasa multipart/mixed,
+    multipart atbilde. Visi faili tiek ielikti Drive rindā kopā (jau rindā
+    esošie vai augšupielādētie netiek dublēti).
+    """
+    with STAGE_SECONDS.time(stage="parse", file_type="bundle"):
+        data = request.json
+    file_types = tuple(request.args.get('formats', ",".join(BUNDLE_FORMATS)).split(','))
+    for file_type in file_types:
+        if file_type not in MIME_TYPES:
+            return jsonify({"error": f"Nezināms formāts: {file_type}"}), 400
+
+    etag = hashlib.sha256(":".join(cache_key(ft, data) for ft in file_types).encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        return _not_modified(etag)
+
+    try:
+        with STAGE_SECONDS.time(stage="render", file_type="bundle"):
+            results = render_bundle(data, file_types)
+    except PoolSaturated:
+        return _pool_saturated()
+
+    for file_type, (content, filename, mime, cache_hit) in results.items():
+        RENDER_CACHE.inc(result="hit" if cache_hit else "miss")
+        if not cache_hit:
+            RENDER_BYTES.observe(len(content), file_type=file_type)
+    upload_ids = enqueue_uploads(
+        [(content, filename, mime) for content, filename, mime, _ in results.values()])
+
+    documents = [(content, filename, mime) for content, filename, mime, _ in results.values()]
+    with STAGE_SECONDS.time(stage="send", file_type="bundle"):
+        if request.accept_mimetypes.best_match(['application/zip', 'multipart/mixed']) == 'multipart/mixed':
+            response = _multipart_response(documents)
+        else:
+            doc_id = str(data.get('doc_id', 'BR_0000')).replace(" ", "_")
+            response = send_file(
+                io.BytesIO(bundle_zip([(content, filename) for content, filename, _ in documents])),
+                as_attachment=True,
+                download_name=f"{doc_id}.zip",
+                mimetype='application/zip'
+            )
+    response.set_etag(etag)
+    response.headers['X-Cache'] = ", ".join(
+        f"{file_type}={'HIT' if result[3] else 'MISS'}" for file_type, result in results.items())
+    if upload_ids:
+        response.headers['X-Upload-Id'] = ",".join(str(i) for i in upload_ids)
+    return response
+
+# ---------------------------------------------------------------------------
+# Paketes ģenerēšana (vairāki dokumenti vienā pieprasījumā)
+# ---------------------------------------------------------------------------
+
+def _read_batch_payloads():
+    """Nolasa rēķinu sarakstu no JSON masīva, {"invoices": [...]} vai NDJSON."""
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        lines = request.get_data(as_text=True).splitlines()
+        return [json.loads(line) for line in lines if line.strip()]
+    body = request.get_json()
+    if isinstance(body, dict):
+        body = body.get('invoices', [])
+    return body
+
+class _ZipStream(io.RawIOBase):
+    """Neatgriežama (non-seekable) izvade ZipFile, kuru varam iztukšot pa gabaliem."""
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+@app.route('/generate/batch', methods=['POST'])
+def generate_batch():
+    try:
+        payloads = _read_batch_payloads()
+    except ValueError:
+        return jsonify({"error": "Nederīgs JSON"}), 400
+    if not isinstance(payloads, list) or not payloads:
+        return jsonify({"error": "Nav neviena rēķina"}), 400
+    if len(payloads) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"Pārāk daudz rēķinu (max {BATCH_MAX_ITEMS})"}), 413
+
+    # Vispirms pārbaudām visu paketi — nederīgs ieraksts netiek klusi izlaists
+    default_formats = request.args.get('formats', 'pdf').split(',')
+    jobs, invalid = [], []
+    for idx, data in enumerate(payloads):
+        if not isinstance(data, dict):
+            invalid.append({"index": idx, "error": "Rēķinam jābūt JSON objektam"})
+            continue
+        formats = data.get('formats', default_formats)
+        if not isinstance(formats, list) or not formats:
+            invalid.append({"index": idx, "error": "formats jābūt formātu sarakstam"})
+            continue
+        unknown = [file_type for file_type in formats if file_type not in MIME_TYPES]
+        if unknown:
+            invalid.append({"index": idx, "error": f"Nezināms formāts: {', '.join(map(str, unknown))}"})
+            continue
+        jobs.extend((idx, file_type, data) for file_type in formats)
+    if invalid:
+        return jsonify({"error": "Nederīgi rēķini paketē", "invalid": invalid}), 400
+
+    # Paketes izmanto to pašu silto baseinu un tā vietu limitu: darbi tiek
+    # iesniegti pa vienam, gaidot brīvu vietu, un visas paketes kopā aizņem
+    # ne vairāk kā RENDER_BATCH_SLOTS vietas. Baseins tiek paņemts katram
+    # darbam, lai pēc nomiruša darba procesa pakete turpinātos jaunajā baseinā
+    drive_connected = get_drive_service() is not None
+
+    def generate():
+        stream = _ZipStream()
+        used, errors = set(), []
+        futures = {}
+
+        def write(future):
+            idx, file_type = futures.pop(future)
+            try:
+                content, filename, mime = future.result()
+            except Exception as e:
+                errors.append({"index": idx, "format": file_type, "error": str(e)})
+                return
+            RENDER_BYTES.observe(len(content), file_type=file_type)
+            if drive_connected:
+                upload_queue.enqueue(content, filename, mime)
+            zf.writestr(unique_name(filename, used), content)
+
+        with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            # Ierakstām failus tādā secībā, kādā tie tiek pabeigti
+            for idx, file_type, data in jobs:
+                try:
+                    futures[get_render_pool().submit_batch(file_type, data)] = (idx, file_type)
+                except BrokenProcessPool as e:
+                    errors.append({"index": idx, "format": file_type, "error": str(e)})
+                for future in [f for f in futures if f.done()]:
+                    write(future)
+                yield stream.drain()
+            while futures:
+                done, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+                for future in done:
+                    write(future)
+                yield stream.drain()
+            if errors:
+                zf.writestr("errors.json", json.dumps(errors, ensure_ascii=False, indent=2))
+        yield stream.drain()
+
+    download_name = f"rekini_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{download_name}"'}
     )
 
+@app.route('/uploads', methods=['GET'])
+def uploads_overview():
+    return jsonify(upload_queue.stats())
+
+@app.route('/uploads/<int:upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    status = upload_queue.status(upload_id)
+    if status is None:
+        return jsonify({"error": "Augšupielāde nav atrasta"}), 404
+    return jsonify(status)
+
 if __name__ == '__main__':
     # Serveris klausās uz portu
     port = int(os.environ.get("PORT", 5000))
+    # Palaižam darba procesus pirms servera, lai pirmais pieprasījums nav lēns
+    start_background()
     app.run(host='0.0.0.0', port=port)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Moduļi atrodas OnlinePavadzimes mapē (tāpat kā app.py tos importē)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
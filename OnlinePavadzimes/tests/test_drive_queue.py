@@ -0,0 +1,149 @@
+import sqlite3
+import types
+
+import pytest
+
+import drive_queue
+from drive_queue import DriveUploadQueue, backoff_delay, LEASE_SECONDS
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+class FakeUploader:
+    """Pirmās `failures` augšupielādes neizdodas, pēc tam atgriež faila ID."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+
+    def __call__(self, file_buffer, filename, mime_type):
+        self.calls.append((file_buffer.getvalue(), filename, mime_type))
+        if len(self.calls) <= self.failures:
+            raise ConnectionError("Drive nav pieejams")
+        return f"drive-{len(self.calls)}"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(drive_queue, "time", types.SimpleNamespace(time=clock.time))
+    return clock
+
+
+def make_queue(tmp_path, uploader, **kwargs):
+    return DriveUploadQueue(uploader, db_path=str(tmp_path / "queue.db"), **kwargs)
+
+
+def test_backoff_delay_doubles_up_to_cap():
+    assert [backoff_delay(n, 2, 20) for n in range(1, 6)] == [2, 4, 8, 16, 20]
+
+
+def test_failed_upload_is_retried_with_backoff(tmp_path, clock):
+    uploader = FakeUploader(failures=2)
+    queue = make_queue(tmp_path, uploader, backoff_base=2, backoff_max=300)
+    job_id = queue.enqueue(b"%PDF", "Rēķins_BR_0001.pdf", "application/pdf")
+
+    assert queue.process_once()
+    status = queue.status(job_id)
+    assert (status["status"], status["attempts"]) == ("pending", 1)
+    assert status["next_attempt_at"] == clock.now + 2
+    assert "Drive nav pieejams" in status["last_error"]
+
+    # Pirms pauzes beigām darbs netiek ņemts
+    clock.now += 1
+    assert not queue.process_once()
+
+    clock.now += 1
+    assert queue.process_once()
+    assert queue.status(job_id)["next_attempt_at"] == clock.now + 4
+
+    clock.now += 4
+    assert queue.process_once()
+    status = queue.status(job_id)
+    assert (status["status"], status["attempts"], status["file_id"]) == ("done", 3, "drive-3")
+    assert status["last_error"] is None
+    assert uploader.calls == [(b"%PDF", "Rēķins_BR_0001.pdf", "application/pdf")] * 3
+    assert queue.stats()["done"] == 1
+
+
+def test_upload_fails_after_max_attempts(tmp_path, clock):
+    queue = make_queue(tmp_path, FakeUploader(failures=10), max_attempts=2, backoff_base=1)
+    job_id = queue.enqueue(b"docx", "Rēķins_BR_0002.docx", "application/octet-stream")
+
+    assert queue.process_once()
+    clock.now += 1
+    assert queue.process_once()
+
+    assert queue.status(job_id)["status"] == "failed"
+    clock.now += 1000
+    assert not queue.process_once()
+
+    # Galīgi neizdevušās augšupielādes saturs netiek glabāts
+    with sqlite3.connect(queue.db_path) as conn:
+        assert conn.execute("SELECT payload FROM uploads WHERE id = ?", (job_id,)).fetchone() == (None,)
+
+
+def test_expired_lease_is_reclaimed(tmp_path, clock):
+    uploader = FakeUploader()
+    queue = make_queue(tmp_path, uploader)
+    job_id = queue.enqueue(b"%PDF", "Rēķins_BR_0003.pdf", "application/pdf")
+
+    # Process paņēma darbu un nomira augšupielādes laikā
+    assert queue._claim_next()["id"] == job_id
+    assert queue.status(job_id)["status"] == "uploading"
+
+    clock.now += LEASE_SECONDS - 1
+    assert not queue.process_once()
+    assert uploader.calls == []
+
+    clock.now += 2
+    assert queue.process_once()
+    status = queue.status(job_id)
+    assert (status["status"], status["attempts"]) == ("done", 2)
+    assert len(uploader.calls) == 1
+
+
+def test_enqueue_is_idempotent_by_content(tmp_path, clock):
+    queue = make_queue(tmp_path, FakeUploader(failures=1), max_attempts=1)
+    job_id = queue.enqueue(b"%PDF", "Rēķins_BR_0004.pdf", "application/pdf")
+
+    assert queue.enqueue(b"%PDF", "Rēķins_BR_0004.pdf", "application/pdf") == job_id
+    assert queue.enqueue_many([(b"%PDF", "Rēķins_BR_0004.pdf", "application/pdf"),
+                               (b"%PDF", "Rēķins_BR_0005.pdf", "application/pdf")])[0] == job_id
+    assert queue.stats()["pending"] == 2
+
+    # Galīgi neizdevusies augšupielāde tiek ielikta rindā no jauna
+    assert queue.process_once()
+    assert queue.status(job_id)["status"] == "failed"
+    retry_id = queue.enqueue(b"%PDF", "Rēķins_BR_0004.pdf", "application/pdf")
+    assert retry_id != job_id
+
+    # Augšupielādēts fails netiek dublēts
+    queue.max_attempts = 2
+    while queue.process_once():
+        pass
+    assert queue.status(retry_id)["status"] == "done"
+    assert queue.enqueue(b"%PDF", "Rēķins_BR_0004.pdf", "application/pdf") == retry_id
+
+
+def test_queue_without_content_hash_column_is_migrated(tmp_path, clock):
+    db_path = tmp_path / "queue.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.executescript(drive_queue._SCHEMA.replace("    content_hash    TEXT,\n", ""))
+        conn.execute("INSERT INTO uploads (filename, mime_type, payload, status, next_attempt_at, created_at, "
+                     "updated_at) VALUES ('vecs.pdf', 'application/pdf', x'00', 'pending', 0, 0, 0)")
+
+    uploader = FakeUploader()
+    queue = DriveUploadQueue(uploader, db_path=str(db_path))
+    job_id = queue.enqueue(b"%PDF", "Rēķins_BR_0006.pdf", "application/pdf")
+
+    assert queue.enqueue(b"%PDF", "Rēķins_BR_0006.pdf", "application/pdf") == job_id
+    while queue.process_once():
+        pass
+    assert [name for _, name, _ in uploader.calls] == ["vecs.pdf", "Rēķins_BR_0006.pdf"]
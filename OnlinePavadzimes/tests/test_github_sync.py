@@ -0,0 +1,231 @@
+import base64
+import hashlib
+import json
+import time
+
+import pytest
+
+import github_sync
+from github_sync import GithubSync, git_blob_sha
+
+REPO = "bratus/rekini"
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self._payload = payload or {}
+
+    def json(self):
+        return self._payload
+
+
+class FakeGithub:
+    """
+    `requests.Session` aizstājējs ar minimālu Git Data API: blobi, koki,
+    commit un zara ref ar fast-forward pārbaudi (citādi 422).
+    """
+
+    def __init__(self, files=None):
+        self.headers = {}
+        self.calls = []
+        self.blobs = {}
+        self.trees = {}
+        self.commits = {}
+        self.head = None
+        self.advance(files or {}, "Sākums")
+
+    # --- Testa palīgi ---
+
+    def _put_tree(self, files):
+        sha = hashlib.sha1(json.dumps(sorted(files.items())).encode()).hexdigest()
+        self.trees[sha] = dict(files)
+        return sha
+
+    def _put_blob(self, data):
+        sha = git_blob_sha(data)
+        self.blobs[sha] = data
+        return sha
+
+    def advance(self, changes, message):
+        """Cits rakstītājs pavirza zaru (None — izdzēš failu)."""
+        files = dict(self.trees[self.commits[self.head]["tree"]]) if self.head else {}
+        for path, data in changes.items():
+            if data is None:
+                files.pop(path, None)
+            else:
+                files[path] = self._put_blob(data)
+        tree = self._put_tree(files)
+        sha = hashlib.sha1(f"{self.head}:{tree}:{message}".encode()).hexdigest()
+        self.commits[sha] = {"tree": tree, "parent": self.head, "message": message}
+        self.head = sha
+
+    def files(self):
+        tree = self.trees[self.commits[self.head]["tree"]]
+        return {path: self.blobs[sha] for path, sha in tree.items()}
+
+    def endpoints(self):
+        return [f"{method} {endpoint}" for method, endpoint in self.calls]
+
+    # --- requests.Session API ---
+
+    def request(self, method, url, timeout=None, json=None, params=None):
+        endpoint = url.split(f"/repos/{REPO}/", 1)[1]
+        self.calls.append((method, endpoint))
+        if method == "GET" and endpoint == "branches/main":
+            tree = self.commits[self.head]["tree"]
+            return FakeResponse(200, {"commit": {"sha": self.head, "commit": {"tree": {"sha": tree}}}})
+        if method == "GET" and endpoint.startswith("git/trees/"):
+            tree = self.trees[endpoint.rsplit("/", 1)[1]]
+            return FakeResponse(200, {"tree": [{"path": p, "type": "blob", "sha": s} for p, s in tree.items()]})
+        if method == "GET" and endpoint.startswith("git/blobs/"):
+            data = self.blobs[endpoint.rsplit("/", 1)[1]]
+            return FakeResponse(200, {"content": base64.b64encode(data).decode("ascii")})
+        if method == "POST" and endpoint == "git/blobs":
+            return FakeResponse(201, {"sha": self._put_blob(base64.b64decode(json["content"]))})
+        if method == "POST" and endpoint == "git/trees":
+            files = dict(self.trees[json["base_tree"]])
+            for entry in json["tree"]:
+                if entry["sha"] is None:
+                    files.pop(entry["path"], None)
+                else:
+                    assert entry["sha"] in self.blobs
+                    files[entry["path"]] = entry["sha"]
+            return FakeResponse(201, {"sha": self._put_tree(files)})
+        if method == "POST" and endpoint == "git/commits":
+            parent, = json["parents"]
+            sha = hashlib.sha1(f"{parent}:{json['tree']}:{json['message']}".encode()).hexdigest()
+            self.commits[sha] = {"tree": json["tree"], "parent": parent, "message": json["message"]}
+            return FakeResponse(201, {"sha": sha})
+        if method == "PATCH" and endpoint == "git/refs/heads/main":
+            if self.commits[json["sha"]]["parent"] != self.head:
+                return FakeResponse(422)
+            self.head = json["sha"]
+            return FakeResponse(200, {"object": {"sha": self.head}})
+        return FakeResponse(404)
+
+
+@pytest.fixture(autouse=True)
+def fresh_bases(monkeypatch):
+    monkeypatch.setattr(github_sync, "_bases", {})
+
+
+def make_sync(remote):
+    sync = GithubSync(REPO, "token", debounce=60, max_delay=60, api_url="http://github.test")
+    sync._session = remote
+    return sync
+
+
+def test_flush_commits_batch_via_git_data_api():
+    remote = FakeGithub({"README.md": b"Bratus\n"})
+    sync = make_sync(remote)
+
+    sync.schedule("invoice_history.csv", "BR 0001\n", "Vēsture: BR 0001")
+    sync.schedule("presets.csv", lambda: "Preces\n", "Sagataves")
+    assert sync.flush() == (True, "Veiksmīgi saglabāts GitHub!")
+
+    assert remote.endpoints() == [
+        "GET branches/main", "POST git/blobs", "POST git/blobs",
+        "POST git/trees", "POST git/commits", "PATCH git/refs/heads/main",
+    ]
+    assert remote.files() == {"README.md": b"Bratus\n", "invoice_history.csv": b"BR 0001\n",
+                              "presets.csv": b"Preces\n"}
+    assert remote.commits[remote.head]["message"].splitlines()[2:] == ["Vēsture: BR 0001", "Sagataves"]
+    assert sync.last_commit == remote.head
+
+    # Zara gals ir kešots (bez GET), nemainītais fails netiek sūtīts
+    remote.calls.clear()
+    sync.schedule("invoice_history.csv", "BR 0001\nBR 0002\n", "Vēsture: BR 0002")
+    sync.schedule("presets.csv", "Preces\n", "Sagataves")
+    assert sync.flush()[0]
+    assert remote.endpoints() == [
+        "POST git/blobs", "POST git/trees", "POST git/commits", "PATCH git/refs/heads/main",
+    ]
+    assert remote.commits[remote.head]["message"] == "Vēsture: BR 0002"
+
+
+def test_ref_conflict_refetches_head_and_retries():
+    remote = FakeGithub()
+    sync = make_sync(remote)
+    sync.schedule("invoice_history.csv", "BR 0001\n", "Vēsture: BR 0001")
+    assert sync.flush()[0]
+
+    remote.advance({"templates.csv": b"Veidne\n"}, "Cits process")
+    their_tree = remote.commits[remote.head]["tree"]
+    remote.calls.clear()
+
+    def merge(base, ours, theirs):
+        raise AssertionError("attālais fails nav mainīts")
+
+    sync.schedule("invoice_history.csv", "BR 0001\nBR 0002\n", "Vēsture: BR 0002", merge=merge)
+    assert sync.flush()[0]
+
+    assert remote.endpoints() == [
+        "POST git/blobs", "POST git/trees", "POST git/commits", "PATCH git/refs/heads/main",
+        "GET branches/main", f"GET git/trees/{their_tree}",
+        "POST git/trees", "POST git/commits", "PATCH git/refs/heads/main",
+    ]
+    assert remote.files() == {"invoice_history.csv": b"BR 0001\nBR 0002\n", "templates.csv": b"Veidne\n"}
+
+
+def test_merge_remote_three_way():
+    remote = FakeGithub()
+    sync = make_sync(remote)
+    sync.schedule("invoice_history.csv", "BR 0001\n", "Vēsture: BR 0001")
+    assert sync.flush()[0]
+
+    remote.advance({"invoice_history.csv": b"BR 0001\nBR 0002\n"}, "Cits process")
+    calls = []
+
+    def merge(base, ours, theirs):
+        calls.append((base, ours, theirs))
+        return b"".join(sorted(set((base or b"").splitlines(True) + ours.splitlines(True) + theirs.splitlines(True))))
+
+    sync.schedule("invoice_history.csv", "BR 0001\nBR 0003\n", "Vēsture: BR 0003", merge=merge)
+    assert sync.flush()[0]
+
+    assert calls == [(b"BR 0001\n", b"BR 0001\nBR 0003\n", b"BR 0001\nBR 0002\n")]
+    assert remote.files() == {"invoice_history.csv": b"BR 0001\nBR 0002\nBR 0003\n"}
+    assert ("PATCH", "git/refs/heads/main") in remote.calls
+
+    # Apvienotā versija kļūst par jauno bāzi: nākamā izmaiņa vairs neapvieno
+    calls.clear()
+    sync.schedule("invoice_history.csv", "BR 0001\nBR 0002\nBR 0003\nBR 0004\n", "Vēsture: BR 0004", merge=merge)
+    assert sync.flush()[0]
+    assert calls == []
+    assert remote.files()["invoice_history.csv"].endswith(b"BR 0004\n")
+
+
+def test_failed_push_keeps_changes_pending():
+    remote = FakeGithub()
+    sync = make_sync(remote)
+    remote.request = lambda *args, **kwargs: FakeResponse(500)
+
+    sync.schedule("invoice_history.csv", "BR 0001\n", "Vēsture: BR 0001")
+    assert sync.flush() == (False, "GitHub kļūda (500)")
+    assert sync.pending_paths() == ["invoice_history.csv"]
+
+
+def test_unexpected_error_requeues_batch_and_keeps_thread_alive():
+    remote = FakeGithub()
+    sync = GithubSync(REPO, "token", debounce=0, max_delay=0, api_url="http://github.test")
+    sync._session = remote
+    reads = []
+
+    def shard():
+        reads.append(1)
+        if len(reads) == 1:
+            raise OSError("daļas fails nav nolasāms")
+        return "BR 0001\n"
+
+    sync.schedule("invoice_history/2026/05.csv", shard, "Vēsture: BR 0001")
+    deadline = time.monotonic() + 10
+    while not (sync.last_error and sync.pending_paths()) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert sync._thread.is_alive()
+    assert sync.pending_paths() == ["invoice_history/2026/05.csv"]
+    assert sync.last_error.startswith("GitHub sinhronizācija neizdevās (OSError")
+
+    assert sync.flush() == (True, "Veiksmīgi saglabāts GitHub!")
+    assert remote.files() == {"invoice_history/2026/05.csv": b"BR 0001\n"}
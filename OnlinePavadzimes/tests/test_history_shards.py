@@ -0,0 +1,54 @@
+import shutil
+
+import pytest
+
+from history_shards import HistoryShards, shards_root
+from history_store import CsvHistoryStore, SqliteHistoryStore, history_to_df
+from invoice_numbers import InvoiceNumbers
+
+STORES = {"sqlite": SqliteHistoryStore, "csv": CsvHistoryStore}
+
+
+def invoice(doc_id, date):
+    return {'doc_id': doc_id, 'doc_type': 'Rēķins', 'date': date, 'client_name': 'SIA Klients',
+            'items': [], 'total': '12,10', 'raw_subtotal': 10.0, 'raw_vat': 2.1, 'raw_total': 12.1}
+
+
+def deploy(tmp_path, backend, with_shards=True):
+    """
+    Vecā izvietošana: vecais CSV satur tikai pirmo rēķinu (pēc sharding tas
+    vairs netiek atjaunināts), mēnešu daļās ir visi. Jaunajā mapē ir tikai
+    šie faili (bez datubāzes un žurnāla), kā pēc git checkout.
+    """
+    old, new = tmp_path / "old", tmp_path / "new"
+    old.mkdir()
+    new.mkdir()
+    store = STORES[backend](str(old / "invoice_history.csv"))
+    store.save(invoice("BR 0049", "05.05.2026"))
+    history_to_df(store.load()).to_csv(new / "invoice_history.csv", index=False)
+    store.save(invoice("BR 0050", "02.06.2026"))
+    store.save(invoice("BR 0051", "03.06.2026"))
+    HistoryShards(store, shards_root(str(old / "invoice_history.csv")), "P/invoice_history").update()
+    if with_shards:
+        shutil.copytree(old / "invoice_history", new / "invoice_history")
+    return STORES[backend](str(new / "invoice_history.csv"))
+
+
+@pytest.mark.parametrize("backend", sorted(STORES))
+def test_restart_with_empty_db_loads_shards(tmp_path, backend):
+    store = deploy(tmp_path, backend)
+
+    assert sorted(e['pr_numurs'] for e in store.load()) == ["BR 0049", "BR 0050", "BR 0051"]
+    assert store.months() == ["2026/05", "2026/06"]
+
+    numbers = InvoiceNumbers(str(tmp_path / "numbers.db"))
+    numbers.ensure_initialized(lambda: [e['pr_numurs'] for e in store.load()])
+    assert numbers.last("BR") == 51
+    assert numbers.reserve("BR", "sesija") == 52
+
+
+@pytest.mark.parametrize("backend", sorted(STORES))
+def test_restart_without_shards_loads_csv(tmp_path, backend):
+    store = deploy(tmp_path, backend, with_shards=False)
+
+    assert [e['pr_numurs'] for e in store.load()] == ["BR 0049"]
@@ -0,0 +1,114 @@
+import threading
+
+import pytest
+
+from history_store import InterProcessLock, merge_history, fcntl
+
+
+def row(pr_numurs, kartas_nr, created_at="2026-06-01 10:00:00", **fields):
+    return dict({'pr_numurs': pr_numurs, 'kartas_nr': str(kartas_nr), 'created_at': created_at,
+                 'kopeja_summa': '12,10'}, **fields)
+
+
+def summary(records):
+    return [(r['kartas_nr'], r['pr_numurs'], r['kopeja_summa']) for r in records]
+
+
+def test_merge_takes_one_sided_changes():
+    base = [row("BR 0001", 1), row("BR 0002", 2)]
+    ours = [row("BR 0001", 1, kopeja_summa='20,00'), row("BR 0002", 2)]
+    theirs = [row("BR 0001", 1), row("BR 0002", 2, kopeja_summa='30,00')]
+
+    assert summary(merge_history(base, ours, theirs)) == [("1", "BR 0001", "20,00"), ("2", "BR 0002", "30,00")]
+
+
+def test_merge_takes_one_sided_deletes():
+    base = [row("BR 0001", 1), row("BR 0002", 2), row("BR 0003", 3)]
+    ours = [row("BR 0002", 2), row("BR 0003", 3)]
+    theirs = [row("BR 0001", 1), row("BR 0002", 2)]
+
+    assert summary(merge_history(base, ours, theirs)) == [("2", "BR 0002", "12,10")]
+
+
+def test_merge_keeps_record_deleted_on_one_side_and_changed_on_other():
+    base = [row("BR 0001", 1)]
+    ours = [row("BR 0001", 1, kopeja_summa='20,00')]
+
+    assert summary(merge_history(base, ours, [])) == [("1", "BR 0001", "20,00")]
+
+
+def test_merge_both_sided_change_takes_newest_by_created_at():
+    base = [row("BR 0001", 1), row("BR 0002", 2)]
+    ours = [row("BR 0001", 1, "2026-06-02 09:00:00", kopeja_summa='20,00'),
+            row("BR 0002", 2, "2026-06-02 09:00:00", kopeja_summa='21,00')]
+    theirs = [row("BR 0001", 1, "2026-06-03 09:00:00", kopeja_summa='30,00'),
+              row("BR 0002", 2, "2026-06-01 09:00:00", kopeja_summa='31,00')]
+
+    assert summary(merge_history(base, ours, theirs)) == [("1", "BR 0001", "30,00"), ("2", "BR 0002", "21,00")]
+
+
+def test_merge_renumbers_our_new_records_on_collision():
+    base = [row("BR 0001", 1)]
+    ours = [row("BR 0001", 1), row("BR 0002", 2), row("BR 0004", 3)]
+    theirs = [row("BR 0001", 1), row("BR 0003", 2)]
+
+    assert summary(merge_history(base, ours, theirs)) == [
+        ("1", "BR 0001", "12,10"), ("2", "BR 0003", "12,10"), ("3", "BR 0004", "12,10"), ("4", "BR 0002", "12,10"),
+    ]
+    # Viena mēneša apvienošana: numuri turpinās no `next_number`
+    assert summary(merge_history(base, ours[:2], theirs, next_number=10))[-1] == ("10", "BR 0002", "12,10")
+
+
+def test_merge_without_base_keeps_both_sides():
+    ours = [row("BR 0002", 1)]
+    theirs = [row("BR 0001", 1)]
+
+    assert summary(merge_history(None, ours, theirs)) == [("1", "BR 0001", "12,10"), ("2", "BR 0002", "12,10")]
+
+
+def test_interprocess_lock_is_reentrant_and_excludes_threads(tmp_path):
+    lock = InterProcessLock(str(tmp_path / "history.lock"))
+    events = []
+
+    def other():
+        with lock:
+            events.append("other")
+
+    with lock:
+        with lock:
+            thread = threading.Thread(target=other)
+            thread.start()
+            thread.join(0.2)
+            events.append("nested")
+        assert thread.is_alive()
+        events.append("outer")
+    thread.join(5)
+
+    assert events == ["nested", "outer", "other"]
+
+
+@pytest.mark.skipif(fcntl is None, reason="flock nav pieejams")
+def test_interprocess_lock_holds_flock_until_outermost_exit(tmp_path):
+    path = str(tmp_path / "history.lock")
+    lock = InterProcessLock(path)
+
+    def locked_by_other_process():
+        # Cits atvērts fails uzvedas kā cits process (flock ir uz atvērto failu)
+        with open(path, 'a') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            fcntl.flock(f, fcntl.LOCK_UN)
+            return False
+
+    with lock:
+        with lock:
+            assert locked_by_other_process()
+        assert locked_by_other_process()
+    assert not locked_by_other_process()
+
+    with pytest.raises(RuntimeError):
+        with lock:
+            raise RuntimeError("kļūda")
+    assert not locked_by_other_process()
@@ -0,0 +1,38 @@
+from invoice_numbers import InvoiceNumbers
+
+
+def make_numbers(tmp_path, last=51):
+    numbers = InvoiceNumbers(str(tmp_path / "numbers.db"))
+    numbers.ensure_initialized(lambda: [f"BR {last:04d}"])
+    return numbers
+
+
+def test_claim_rejects_number_reserved_by_another_session(tmp_path):
+    numbers = make_numbers(tmp_path)
+    assert numbers.reserve("BR", "a") == 52
+
+    assert not numbers.claim("BR", 52, "b")
+    assert numbers.claim("BR", 52, "a")
+
+
+def test_claim_replaces_own_reservation(tmp_path):
+    numbers = make_numbers(tmp_path)
+    assert numbers.reserve("BR", "a") == 52
+
+    # Sesija "a" saglabā labotu numuru — sākotnēji rezervētais kļūst brīvs
+    assert numbers.claim("BR", 60, "a")
+    assert numbers.reserve("BR", "b") == 52
+    assert not numbers.claim("BR", 60, "b")
+
+    numbers.commit("BR", 60, "a")
+    assert numbers.last("BR") == 60
+    assert numbers.reserve("BR", "a") == 61
+
+
+def test_release_frees_number_for_other_sessions(tmp_path):
+    numbers = make_numbers(tmp_path)
+    assert numbers.reserve("BR", "a") == 52
+    assert numbers.reserve("BR", "b") == 53
+
+    numbers.release("BR", 52, "a")
+    assert numbers.reserve("BR", "c") == 52
@@ -0,0 +1,45 @@
+import re
+
+import pytest
+
+from pdf_generator import generate_pdf
+
+
+def invoice(doc_type, items, discount=False, comments=''):
+    data = {
+        'doc_type': doc_type, 'doc_id': 'BR 0052', 'date': '01.10.2026', 'due_date': '15.10.2026',
+        'client_name': 'SIA Klients', 'client_address': 'Rīga, Brīvības iela 1',
+        'client_reg_no': '40000000000', 'client_vat_no': 'LV40000000000',
+        'receiver_name': 'SIA Saņēmējs', 'receiver_reg_no': '40000000001', 'receiver_address': 'Rīga',
+        'customer_name': 'SIA Pasūtītājs', 'customer_reg_no': '40000000002', 'customer_address': 'Ķekava',
+        'items': [{'seq': i + 1, 'name': f'Prece {i + 1}', 'unit': 'gab.', 'qty': '2',
+                   'price': '10,00', 'total': '20,00'} for i in range(items)],
+        'subtotal': '60,00', 'vat': '12,60', 'total': '72,60',
+        'amount_words': 'Septiņdesmit divi eiro 60 centi', 'comments': comments,
+    }
+    if discount:
+        data.update(raw_discount_eur=6.0, discount_percent=10, discount_eur='6,00', subtotal_after_discount='54,00')
+    if 'avansa' in doc_type.lower():
+        data.update(advance_percent=50, raw_advance=36.3)
+    return data
+
+
+def page_count(buffer):
+    return len(re.findall(rb"/Type /Page\b(?!s)", buffer.getvalue()))
+
+
+CASES = [
+    ("Rēķins", True, ''),
+    ("Avansa rēķins", False, ''),
+    ("E-rēķins", True, ''),
+    ("Pavadzīme", False, 'Piegāde līdz objektam'),
+]
+
+
+@pytest.mark.parametrize("doc_type,discount,comments", CASES)
+@pytest.mark.parametrize("items", range(1, 16))
+def test_overlay_matches_flow_page_count(doc_type, discount, comments, items):
+    data = invoice(doc_type, items, discount, comments)
+
+    assert page_count(generate_pdf(data, 'overlay')) == page_count(generate_pdf(data, 'flow'))
+
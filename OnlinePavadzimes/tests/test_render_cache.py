@@ -0,0 +1,76 @@
+import os
+import threading
+import time
+
+import pytest
+
+import render_cache
+from render_cache import RenderCache, cache_key, cached_render
+
+INVOICE = {'doc_type': 'Rēķins', 'doc_id': 'BR 0001', 'items': []}
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = RenderCache(memory_max_bytes=1024)
+    monkeypatch.setattr(render_cache, "render_cache", cache)
+    return cache
+
+
+def test_concurrent_misses_render_once(cache):
+    calls = []
+
+    def slow_renderer(file_type, data):
+        calls.append(file_type)
+        time.sleep(0.2)
+        return b"%PDF", "Rēķins_BR_0001.pdf", "application/pdf"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cached_render('pdf', INVOICE, renderer=slow_renderer)))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == ['pdf']
+    assert sorted(hit for *_, hit in results) == [False, True, True, True, True]
+    assert all(content == b"%PDF" for content, *_ in results)
+    assert not render_cache._inflight
+
+
+def test_cache_key_is_canonical():
+    reordered = dict(reversed(list(INVOICE.items())))
+
+    assert cache_key('pdf', INVOICE) == cache_key('pdf', reordered)
+    assert cache_key('pdf', INVOICE) != cache_key('docx', INVOICE)
+    assert cache_key('pdf', INVOICE) != cache_key('pdf', dict(INVOICE, doc_id='BR 0002'))
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = RenderCache(memory_max_bytes=10, disk_dir="")
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    assert cache.get("a") == b"aaaa"
+
+    cache.put("c", b"cccc")
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (b"aaaa", None, b"cccc")
+
+    # Par limitu lielāks dokuments atmiņā netiek glabāts vispār
+    cache.put("d", b"d" * 11)
+    assert cache.get("d") is None and cache.get("c") == b"cccc"
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    cache = RenderCache(memory_max_bytes=0, disk_dir=str(tmp_path), disk_max_bytes=10)
+    for age, key in ((30, "aa1"), (20, "bb2")):
+        cache.put(key, b"1234")
+        os.utime(cache._disk_path(key), (time.time() - age, time.time() - age))
+    assert cache.get("aa1") == b"1234"
+
+    cache.put("cc3", b"5678")
+    assert (cache.get("aa1"), cache.get("bb2"), cache.get("cc3")) == (b"1234", None, b"5678")
+    assert not os.path.exists(cache._disk_path("bb2"))
+
+    # Diska līmenis saglabājas starp procesiem
+    assert RenderCache(memory_max_bytes=0, disk_dir=str(tmp_path)).get("cc3") == b"5678"
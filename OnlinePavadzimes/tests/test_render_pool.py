@@ -0,0 +1,34 @@
+import os
+import signal
+
+import pytest
+
+import render_pool
+from render_pool import BrokenProcessPool, get_render_pool
+
+INVOICE = {'doc_type': 'Rēķins', 'doc_id': 'BR 0001', 'items': []}
+
+
+@pytest.fixture
+def fresh_pool(monkeypatch):
+    monkeypatch.setattr(render_pool, "_pool", None)
+    yield
+    if render_pool._pool is not None:
+        render_pool._pool.shutdown()
+
+
+def test_pool_is_rebuilt_after_worker_dies(fresh_pool):
+    pool = get_render_pool()
+    assert pool.render('pdf', INVOICE)[0].startswith(b"%PDF")
+
+    for pid in pool.start():
+        os.kill(pid, signal.SIGKILL)
+    with pytest.raises(BrokenProcessPool):
+        pool.render('pdf', INVOICE)
+    assert pool.broken
+
+    rebuilt = get_render_pool()
+    assert rebuilt is not pool
+    content, filename, mime = rebuilt.render('pdf', INVOICE)
+    assert content.startswith(b"%PDF") and filename == "Rēķins_BR_0001.pdf"
+    assert rebuilt.in_flight == 0
@@ -0,0 +1,104 @@
+import io
+import json
+import zipfile
+
+import pytest
+
+import render_cache
+import render_pool
+import server
+from drive_queue import DriveUploadQueue
+from render_cache import RenderCache
+
+INVOICE = {'doc_type': 'Rēķins', 'doc_id': 'BR 0001', 'items': []}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "start_background", lambda: None)
+    monkeypatch.setattr(server, "get_drive_service", lambda: None)
+    monkeypatch.setattr(server, "POOL_MODE", False)
+    monkeypatch.setattr(server, "upload_queue", DriveUploadQueue(server.upload_to_drive,
+                                                                 db_path=str(tmp_path / "queue.db")))
+    monkeypatch.setattr(render_cache, "render_cache", RenderCache(disk_dir=""))
+    return server.app.test_client()
+
+
+def test_generate_etag_and_not_modified(client, monkeypatch):
+    renders = []
+    render_document = server.render_document
+
+    def counting_render(file_type, data):
+        renders.append(file_type)
+        return render_document(file_type, data)
+
+    monkeypatch.setattr(server, "render_document", counting_render)
+    first = client.post('/generate/pdf', json=INVOICE)
+    assert first.status_code == 200 and first.headers['X-Cache'] == "MISS"
+    assert first.data.startswith(b"%PDF")
+    assert 'X-Upload-Id' not in first.headers  # Drive nav pieslēgts
+    etag = first.headers['ETag']
+
+    again = client.post('/generate/pdf', json=INVOICE)
+    assert again.headers['X-Cache'] == "HIT" and again.headers['ETag'] == etag
+
+    cached = client.post('/generate/pdf', json=INVOICE, headers={'If-None-Match': etag})
+    assert cached.status_code == 304 and cached.data == b""
+
+    changed = client.post('/generate/pdf', json=dict(INVOICE, doc_id='BR 0002'), headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+    assert renders == ['pdf', 'pdf']
+
+
+def test_unknown_file_type_is_not_a_metric_label(client):
+    assert client.post('/generate/x<script>', json=INVOICE).status_code == 400
+
+    exposition = client.get('/metrics').get_data(as_text=True)
+    assert 'script' not in exposition
+    assert 'endpoint="generate_doc",file_type="unknown",status="400"' in exposition
+
+
+@pytest.fixture
+def fresh_pool(monkeypatch):
+    monkeypatch.setattr(render_pool, "_pool", None)
+    yield
+    if render_pool._pool is not None:
+        render_pool._pool.shutdown()
+
+
+def zip_names(response):
+    assert response.status_code == 200 and response.mimetype == 'application/zip'
+    return sorted(zipfile.ZipFile(io.BytesIO(response.data)).namelist())
+
+
+def test_batch_from_json_dedupes_file_names(client, fresh_pool):
+    invoices = [INVOICE, dict(INVOICE, formats=['pdf', 'docx']), dict(INVOICE, doc_id='BR 0002')]
+
+    for body in (invoices, {"invoices": invoices}):
+        response = client.post('/generate/batch', json=body)
+        assert zip_names(response) == ["Rēķins_BR_0001.docx", "Rēķins_BR_0001.pdf",
+                                        "Rēķins_BR_0001_2.pdf", "Rēķins_BR_0002.pdf"]
+
+
+def test_batch_from_ndjson(client, fresh_pool):
+    lines = [json.dumps(INVOICE), "", json.dumps(dict(INVOICE, doc_id='BR 0002'))]
+    response = client.post('/generate/batch?formats=docx', data="\n".join(lines),
+                           content_type='application/x-ndjson')
+
+    assert zip_names(response) == ["Rēķins_BR_0001.docx", "Rēķins_BR_0002.docx"]
+
+
+def test_batch_rejects_invalid_items(client, fresh_pool):
+    invoices = [INVOICE, "BR 0002", dict(INVOICE, formats='pdf'), dict(INVOICE, formats=['pdf', 'xls'])]
+    response = client.post('/generate/batch', json=invoices)
+
+    assert response.status_code == 400
+    assert [(item["index"], item["error"]) for item in response.json["invalid"]] == [
+        (1, "Rēķinam jābūt JSON objektam"),
+        (2, "formats jābūt formātu sarakstam"),
+        (3, "Nezināms formāts: xls"),
+    ]
+    assert render_pool._pool is None  # nekas netika ģenerēts
+
+    assert client.post('/generate/batch', json=[]).status_code == 400
+    assert client.post('/generate/batch', data="{", content_type='application/json').status_code == 400